@@ -1,11 +1,12 @@
 from abc import ABC, abstractmethod
 import configparser
 import os
-from typing import Iterator, Optional
+from typing import Any, Dict, Iterator, Optional
 
 from lxml import etree
 
 from perfectextractor.apps.extractor.utils import CachedConfig, TXT, CSV
+from perfectextractor.apps.extractor.xpath import XPathRegistry
 
 
 class BaseWorker(ABC):
@@ -22,6 +23,9 @@ class BaseWorker(ABC):
         config.read(self.get_config())
         self.config = CachedConfig(config)
 
+        # XPath expressions (both from the code and from the config) are compiled once, on first use
+        self.xpaths = XPathRegistry(self.namespaces)
+
     def list_directories(self, path: str) -> Iterator[str]:
         directories = [os.path.join(path, directory) for directory in os.listdir(path)]
         return filter(os.path.isdir, directories)
@@ -33,6 +37,19 @@ class BaseWorker(ABC):
         """
         pass
 
+    @property
+    def namespaces(self) -> Optional[Dict[str, str]]:
+        """
+        The namespaces used in the XPath expressions for this corpus.
+        """
+        return None
+
+    def xpath(self, element: etree._Element, path: str, **variables: Any) -> Any:
+        """
+        Evaluates the (compiled) XPath expression on the given element, the variables are bound to $name.
+        """
+        return self.xpaths.evaluate(element, path, **variables)
+
     @staticmethod
     def get_text(element: etree._Element) -> str:
         return str(element.text) if element.text else ''
@@ -55,3 +72,12 @@ class BaseWorker(ABC):
         :return: the part-of-speech tag
         """
         return element.get(self.config.get(language, 'pos', fallback=self.config.get('all', 'pos')), '?')
+
+    def get_pos_xpath(self, language: str) -> str:
+        """
+        Returns the XPath expression that evaluates to the part-of-speech tag of an element, cf. get_pos.
+        Note that for a missing tag, this evaluates to an empty string instead of '?'.
+        :param language: the current language
+        :return: the XPath expression
+        """
+        return 'string(@{})'.format(self.config.get(language, 'pos', fallback=self.config.get('all', 'pos')))
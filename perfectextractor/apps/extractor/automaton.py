@@ -0,0 +1,113 @@
+from abc import ABC, abstractmethod
+import re
+import string
+from typing import Callable, List, Optional, Pattern, Tuple
+
+from .models import SentenceContext
+from .rules import ContinuousRules, PerfectRules
+
+# Classes of tokens, encoded as single characters
+GAP = 'g'
+STOP = 's'
+PERFECT = 'p'
+PPC_GAP = 'h'  # a possible Perfect continuous, that would be a gap otherwise
+PPC_STOP = 't'  # a possible Perfect continuous, that would be a stop otherwise
+GERUND = 'c'
+
+
+class Automaton(ABC):
+    """
+    Finds constructions by encoding the tokens of a sentence as a string of classes (one character per token),
+    over which the search from a starting token to the next token of the construction is a regular expression.
+    A sentence is encoded once in each direction, the searches then run in the (compiled) regular expression engine.
+    """
+    def __init__(self) -> None:
+        self._context: Optional[SentenceContext] = None
+        self._forward = ''
+        self._backward = ''
+
+    @abstractmethod
+    def classify(self, context: SentenceContext, i: int) -> str:
+        """
+        Returns the class of the token at position i.
+        """
+        pass
+
+    def encode(self, context: SentenceContext) -> None:
+        """
+        Encodes a sentence, if it is not the one encoded last.
+        """
+        if context is not self._context:
+            self._forward = ''.join([self.classify(context, i) for i in range(len(context))])
+            self._backward = self._forward[::-1]
+            self._context = context
+
+    def scan(self,
+             context: SentenceContext,
+             i: int,
+             gap: Pattern,
+             preceding: bool = False) -> Tuple[List[int], Optional[int]]:
+        """
+        Scans the siblings of position i, skipping the tokens matched by the gap pattern.
+        Returns the positions of the skipped tokens and the position of the token after the gap (or None at the end).
+        """
+        self.encode(context)
+        start, end = context.bounds[i]
+        if preceding:
+            n = len(context)
+            k = gap.match(self._backward, n - i, n - start).end()
+            return list(range(i - 1, n - 1 - k, -1)), n - 1 - k if k < n - start else None
+        k = gap.match(self._forward, i + 1, end).end()
+        return list(range(i + 1, k)), k if k < end else None
+
+
+class PerfectAutomaton(Automaton):
+    """
+    Finds the tokens that end the search for a past participle in check_perfect:
+    a perfect tag, a stop (punctuation or stop tag) or, when checking for a Perfect continuous, a ppc tag.
+    """
+    GAP_PATTERN = re.compile('[{}{}]*'.format(GAP, PPC_GAP))
+    GAP_PPC_PATTERN = re.compile('{}*'.format(GAP))
+
+    def __init__(self, rules: PerfectRules, in_lemmata_list: Callable[[str], bool]) -> None:
+        super().__init__()
+        self.rules = rules
+        self.in_lemmata_list = in_lemmata_list
+
+    def classify(self, context, i):
+        pos = context.pos_tags[i]
+        if pos in self.rules.perfect_tags:
+            return PERFECT
+        is_stop = context.texts[i] in string.punctuation or (pos and pos.startswith(self.rules.stop_tags))
+        if pos in self.rules.ppc_tags and self.in_lemmata_list(context.lemmata[i]):
+            return PPC_STOP if is_stop else PPC_GAP
+        return STOP if is_stop else GAP
+
+    def scan_perfect(self,
+                     context: SentenceContext,
+                     i: int,
+                     check_ppc: bool,
+                     preceding: bool) -> Tuple[List[int], Optional[int]]:
+        return self.scan(context, i, self.GAP_PPC_PATTERN if check_ppc else self.GAP_PATTERN, preceding)
+
+
+class ContinuousAutomaton(Automaton):
+    """
+    Finds the tokens that end the search for a gerund in check_continuous: a gerund or a stop.
+    """
+    GAP_PATTERN = re.compile('{}*'.format(GAP))
+
+    def __init__(self, rules: ContinuousRules) -> None:
+        super().__init__()
+        self.rules = rules
+
+    def classify(self, context, i):
+        pos = context.pos_tags[i]
+        if pos in self.rules.cont_gerund_pos:
+            return GERUND
+        if context.texts[i] in string.punctuation or (pos and pos.startswith(self.rules.stop_tags)):
+            return STOP
+        return GAP
+
+    def scan_continuous(self, context: SentenceContext, i: int) -> Tuple[List[int], Optional[int]]:
+        return self.scan(context, i, self.GAP_PATTERN)
@@ -1,18 +1,30 @@
 from abc import abstractmethod
 import codecs
+from contextlib import ExitStack
+from functools import partial
 import os
 import time
-from typing import Dict, Generator, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, FrozenSet, Generator, List, Optional, Tuple, TypeVar, Union
 
 import click
 from lxml import etree
 
 from perfectextractor.apps.core.base import BaseWorker
-from .models import Alignment, MultiWordExpression
-from .utils import TXT, XML, CSV, open_csv, open_xlsx
+from .models import Alignment, MultiWordExpression, SentenceContext, Token, format_offsets
+from .planner import FilterPlan
+from .tenses import get_pos_tense, label_tenses
+from .utils import TXT, XML, CSV, PYTHON, open_csv, open_xlsx
 
 LEMMATA_CONFIG = os.path.join(os.path.dirname(__file__), 'config/{language}_lemmata.txt')
 
+# The kinds of renderings of a sentence that are memoised (see BaseExtractor.render)
+RENDER_TEXT = 'text'
+RENDER_XML = 'xml'
+RENDER_METADATA = 'metadata'
+RENDER_TRANSLATIONS = 'translations'
+
+T = TypeVar('T')
+
 
 class BaseExtractor(BaseWorker):
     def __init__(self,
@@ -29,11 +41,13 @@ class BaseExtractor(BaseWorker):
                  output: str = TXT,
                  format_: str = CSV,
                  one_per_sentence: bool = False,
+                 offsets: bool = False,
                  sort_by_certainty: bool = False,
                  no_order_languages: bool = False,
                  file_limit: int = 0,
                  min_file_size: int = 0,
-                 max_file_size: int = 0) -> None:
+                 max_file_size: int = 0,
+                 engine: str = PYTHON) -> None:
         """
         Initializes the extractor for the given source and target language(s).
         :param language_from: the source language
@@ -49,11 +63,13 @@ class BaseExtractor(BaseWorker):
         :param output: whether to output the results in text or XML format
         :param format_: whether to output the file as .csv or .xlsx
         :param one_per_sentence: whether to output all lines, and allow one classification per sentence
+        :param offsets: whether to output the character offsets of the match instead of marking it in the sentence
         :param sort_by_certainty: whether to sort the files by average alignment certainty
         :param no_order_languages: whether to order the languages on alignment
         :param file_limit: whether to limit the number of files searched in
         :param min_file_size: whether to only use files larger (or equal) than a certain size
         :param max_file_size: whether to only use files smaller (or equal) than a certain size
+        :param engine: the engine to match constructions with (Python loops, compiled automata or compiled XPath)
         """
         super().__init__(language_from, outfile, format_)
 
@@ -66,20 +82,42 @@ class BaseExtractor(BaseWorker):
         self.position = position
         self.output = output
         self.one_per_sentence = one_per_sentence
+        self.offsets = offsets
         self.sort_by_certainty = sort_by_certainty
         self.no_order_languages = no_order_languages
         self.file_limit = file_limit
         self.min_file_size = min_file_size
         self.max_file_size = max_file_size
+        self.engine = engine
+
+        if offsets and output == XML:
+            raise ValueError('Character offsets can only be output for results in text format')
+
+        # The filters on sentences and words, applied before any matching
+        self.plan = FilterPlan(self.config.get('all', 'id'), sentence_ids, position)
 
         # Read in the lemmata list (if provided)
-        self.lemmata_list: List[str] = []
+        self.lemmata_list = []
         self.read_lemmata(lemmata)
 
         # Other variables
-        self.other_extractors: List[BaseExtractor] = []
+        self.other_extractors: Dict[str, BaseExtractor] = dict()
         self.alignment_xmls: Dict[str, str] = dict()
-        self._index: Dict[str, etree._Element] = dict()  # save segments indexed by id
+        self._index: Dict[etree._ElementTree, Dict[str, etree._Element]] = dict()  # save segments indexed by id
+        self._pos_tenses: Dict[Optional[str], Optional[str]] = dict()  # save the tenses of part-of-speech tags
+        self._renderings: Dict[Tuple[str, str, str], Any] = dict()  # save renderings of sentences by kind, language and id
+
+    @property
+    def lemmata_list(self) -> List[str]:
+        return self._lemmata_list
+
+    @lemmata_list.setter
+    def lemmata_list(self, lemmata: List[str]) -> None:
+        """
+        Sets the lemmata list, as well as a set of the lemmata for fast lookups.
+        """
+        self._lemmata_list = list(lemmata)
+        self.lemmata_set: FrozenSet[str] = frozenset(self._lemmata_list)
 
     def read_lemmata(self, lemmata: Optional[Union[Tuple[str], List[str], bool]]) -> None:
         """
@@ -106,23 +144,45 @@ class BaseExtractor(BaseWorker):
     def process_folder(self, dir_name: str, progress_cb=None, done_cb=None) -> None:
         """
         Creates a result file and processes each file in a folder.
+        The added Extractors (see add_extractor) process the files in the same pass, each into its own result file.
         """
         file_names = self.collect_file_names(dir_name)
         progress_total = len(file_names)
 
-        result_file = self.outfile or '-'.join([dir_name, self.l_from]) + '.' + self.format_
-        opener = open_csv if self.format_ == CSV else open_xlsx
-
-        with opener(result_file) as writer:
-            header = self.generate_header()
-            writer.writerow(header) if self.format_ == CSV else writer.writerow(header, is_header=True)
-            for i, part in enumerate(self.generate_results(dir_name, file_names)):
-                writer.writerows(part)
+        extractors = [self] + list(self.other_extractors.values())
+        result_files = [self.get_result_file(dir_name)]
+        result_files.extend(e.get_result_file(dir_name, name) for name, e in self.other_extractors.items())
+        if len(set(result_files)) != len(result_files):
+            raise ValueError('The added extractors should write to different result files')
+
+        with ExitStack() as stack:
+            writers = []
+            for extractor, result_file in zip(extractors, result_files):
+                opener = open_csv if extractor.format_ == CSV else open_xlsx
+                writer = stack.enter_context(opener(result_file))
+                header = extractor.generate_header()
+                writer.writerow(header) if extractor.format_ == CSV else writer.writerow(header, is_header=True)
+                writers.append(writer)
+
+            for i, parts in enumerate(self.generate_all_results(dir_name, file_names)):
+                for writer, part in zip(writers, parts):
+                    writer.writerows(part)
                 if progress_cb:
                     progress_cb(i + 1, progress_total)
 
             if done_cb:
-                done_cb(result_file)
+                for result_file in result_files:
+                    done_cb(result_file)
+
+    def get_result_file(self, dir_name: str, name: Optional[str] = None) -> str:
+        """
+        Returns the file to write the results to: the outfile, or a file named after the directory and language.
+        :param dir_name: The current directory
+        :param name: The name of the Extractor, if it was added to another Extractor
+        """
+        if self.outfile:
+            return self.outfile
+        return '-'.join([dir_name, self.l_from] + ([name] if name else [])) + '.' + self.format_
 
     def collect_file_names(self, dir_name: str) -> List[str]:
         """
@@ -160,6 +220,24 @@ class BaseExtractor(BaseWorker):
         for f in file_names:
             yield self.process_file(f)
 
+    def generate_all_results(self,
+                             dir_name: str,
+                             file_names: List[str] = None) -> Generator[List[List[str]], None, None]:
+        """
+        Generates the results of this and the added Extractors for a directory or a set of files.
+        Per file, the results are generated as a list with the results of each Extractor.
+        """
+        if not self.other_extractors:
+            for part in self.generate_results(dir_name, file_names):
+                yield [part]
+            return
+
+        if file_names is None:
+            file_names = self.collect_file_names(dir_name)
+
+        for f in file_names:
+            yield self.process_file_with_others(f)
+
     def process_file(self, filename: str) -> List[str]:
         """
         Processes a single file.
@@ -185,23 +263,67 @@ class BaseExtractor(BaseWorker):
         click.echo('Finished fetching results, took {:.3} seconds'.format(time.time() - t1))
 
         # Free index memory
-        self._index = dict()
+        self.free_memory()
 
         return results
 
+    def process_file_with_others(self, filename: str) -> List[List[str]]:
+        """
+        Processes a single file with this and the added Extractors.
+        The file, its alignments and its translations are parsed once, and shared by all Extractors.
+        Returns the results of each Extractor.
+        """
+        t0 = time.time()
+        click.echo('Now processing {}...'.format(filename))
+
+        # Parse the current tree completely, as each Extractor iterates over the sentences
+        sentences = list(etree.iterparse(filename, tag=self.sentence_tag))
+
+        # Parse the alignment and translation trees
+        alignment_trees, translation_trees = self.parse_alignment_trees(filename)
+
+        t1 = time.time()
+        click.echo('Finished parsing trees, took {:.3} seconds'.format(t1 - t0))
+
+        # Fetch the results, sharing the index of the translation segments
+        results = []
+        for extractor in [self] + list(self.other_extractors.values()):
+            extractor._index = self._index
+            s_trees = extractor.filter_sentences(sentences)
+            results.append(extractor.fetch_results(filename, s_trees, alignment_trees, translation_trees))
+
+        click.echo('Finished fetching results, took {:.3} seconds'.format(time.time() - t1))
+
+        # Free index memory
+        for extractor in [self] + list(self.other_extractors.values()):
+            extractor.free_memory()
+
+        return results
+
+    def free_memory(self) -> None:
+        """
+        Frees the memory kept for the current file, e.g. the index of the translation segments.
+        """
+        self._index = dict()
+        self._renderings = dict()
+
+    def _segment_by_id(self, tree: etree._ElementTree, segment_number: str) -> Optional[etree._Element]:
+        """
+        Returns the segment with the given id from a tree, or None if there is no such segment.
+        The segments of a tree are indexed on first use, and the index is freed after each file.
+        """
+        if tree not in self._index:
+            id_attr = self.config.get('all', 'id')
+            self._index[tree] = dict()
+            for segment in tree.iter(self.sentence_tag):
+                self._index[tree].setdefault(segment.get(id_attr), segment)
+        return self._index[tree].get(segment_number)
+
     def filter_sentences(self, s_trees):
         """
-        Filters the sentences based on the provided sentence_ids.
+        Filters the sentences based on the provided sentence_ids (see FilterPlan.filter_sentences).
         """
-        if self.sentence_ids:
-            # TODO: preferably, this should also return an iterparse instead of a list
-            result = []
-            for event, s in s_trees:
-                if s.get(self.config.get('all', 'id')) in self.sentence_ids:
-                    result.append((event, s))
-            return result
-        else:
-            return s_trees
+        return self.plan.filter_sentences(s_trees)
 
     @property
     def sentence_tag(self) -> str:
@@ -228,6 +350,8 @@ class BaseExtractor(BaseWorker):
             'words {}'.format(self.l_from),
             'ids {}'.format(self.l_from),
             self.l_from]
+        if self.offsets:
+            header.append('offsets {}'.format(self.l_from))
         for metadata in self.metadata.keys():
             header.append(metadata)
         for language in self.l_to:
@@ -255,7 +379,10 @@ class BaseExtractor(BaseWorker):
             result.append(mwe.construction_to_string())
             result.append(mwe.construction_ids())
             if self.output == XML:
-                result.append('<root>' + str(etree.tostring(sentence, encoding=str)) + '</root>')
+                result.append(self.render(RENDER_XML, self.l_from, sentence, partial(self.sentence_to_xml, sentence)))
+            elif self.offsets:
+                result.append(mwe.get_sentence_words())
+                result.append(format_offsets(mwe.construction_offsets()))
             else:
                 result.append(mwe.mark_sentence())
             self.append_metadata(sentence, result)
@@ -264,9 +391,11 @@ class BaseExtractor(BaseWorker):
             result.append('')
             result.append('')
             if self.output == XML:
-                result.append('<root>' + str(etree.tostring(sentence, encoding=str)) + '</root>')
+                result.append(self.render(RENDER_XML, self.l_from, sentence, partial(self.sentence_to_xml, sentence)))
             else:
-                result.append(self.mark_sentence(sentence))
+                result.append(self.render(RENDER_TEXT, self.l_from, sentence, partial(self.mark_sentence, sentence)))
+                if self.offsets:
+                    result.append('')
             self.append_metadata(sentence, result)
 
         return result
@@ -277,22 +406,69 @@ class BaseExtractor(BaseWorker):
         """
         Appends metadata for to a result line.
         """
+        if self.metadata and s is not None:
+            result.extend(self.render(RENDER_METADATA, self.l_from, s, partial(self.get_metadata_values, s)))
+        else:
+            result.extend(self.get_metadata_values(s))
+
+    def get_metadata_values(self, s: Optional[etree._Element]) -> Tuple[Optional[str], ...]:
+        """
+        Returns the values of the metadata for a sentence.
+        """
+        values = []
         for metadata, level in self.metadata.items():
             if s is not None and level == 's':
-                result.append(s.get(metadata))
+                values.append(s.get(metadata))
             elif s is not None and level == 'p':
-                result.append(s.getparent().get(metadata))
+                values.append(s.getparent().get(metadata))
             elif s is not None and level == 'text':
-                result.append(s.getparent().getparent().get(metadata))
+                values.append(s.getparent().getparent().get(metadata))
             else:
                 raise ValueError('Invalid level {}'.format(level))
+        return tuple(values)
+
+    def sentence_to_xml(self, sentence: etree._Element) -> str:
+        """
+        Returns the XML serialisation of a sentence, wrapped in a root element.
+        """
+        return '<root>' + str(etree.tostring(sentence, encoding=str)) + '</root>'
+
+    def render(self, kind: str, language: str, sentence: etree._Element, render: Callable[[], T]) -> T:
+        """
+        Returns a rendering of a sentence (e.g. its text, its XML serialisation or its translations).
+        As a sentence might contain several hits, the renderings are memoised per kind, language and sentence id,
+        and freed after each file. Sentences without an id are rendered every time.
+        :param kind: the kind of rendering
+        :param language: the language of the sentence
+        :param sentence: the sentence
+        :param render: renders the sentence
+        :return: the (memoised) rendering
+        """
+        sentence_id = sentence.get(self.config.get('all', 'id'))
+        if sentence_id is None:
+            return render()
+
+        key = (kind, language, sentence_id)
+        if key not in self._renderings:
+            self._renderings[key] = render()
+        return self._renderings[key]
 
-    def add_extractor(self, extractor: 'BaseExtractor') -> None:
+    def add_extractor(self, extractor: 'BaseExtractor', name: str) -> None:
         """
-        Adds another Extractor to this Extractor. This allows to combine Extractors.
-        The last added Extractor determines the output.
+        Adds another Extractor to this Extractor. This allows to combine Extractors:
+        the added Extractor processes the same files in a single pass (see process_file_with_others),
+        and writes its results to its own result file (see get_result_file).
+        :param extractor: the Extractor to add, for the same corpus and languages
+        :param name: the name of the Extractor, used to name its result file
         """
-        self.other_extractors.append(extractor)
+        for e in (self, extractor):
+            if type(e).process_file is not BaseExtractor.process_file:
+                raise ValueError('{} processes files on its own, and cannot be combined'.format(e.__class__.__name__))
+        if extractor.l_from != self.l_from or extractor.l_to != self.l_to:
+            raise ValueError('Combined extractors should have the same source and target languages')
+        if name in self.other_extractors:
+            raise ValueError('An extractor named {} has already been added'.format(name))
+        self.other_extractors[name] = extractor
 
     def languages_ordered(self, language_from: str, language_to: str) -> List[str]:
         return [language_from, language_to] if self.no_order_languages else sorted([language_from, language_to])
@@ -308,45 +484,18 @@ class BaseExtractor(BaseWorker):
         :param sentence: the s element
         :return: a tuple of the assigned tense and all tenses for the verbs in the sentences
         """
-        tense = 'none'
+        # The part-of-speech tags are read from the attribute, and looked up in a table of the tags seen so far
+        pos_attr = self.config.get(self.l_from, 'pos', fallback=self.config.get('all', 'pos'))
+        pos_tenses = self._pos_tenses
         tenses = []
-        for w in sentence.xpath('.//w'):
-            pos = self.get_pos(self.l_from, w)
-
-            if pos.startswith('V') and len(pos) == 3:
-                if pos.endswith('B') or pos.endswith('P') or pos.endswith('Z'):
-                    tenses.append('present')
-                elif pos.endswith('D'):
-                    tenses.append('past')
-                elif pos.endswith('N'):
-                    tenses.append('participle')
-                elif pos.endswith('G'):
-                    tenses.append('gerund')
-                elif pos.endswith('I'):
-                    tenses.append('infinitive')
-                elif pos == 'VM0':
-                    tenses.append('modal')
-            elif pos == 'MD':
-                tenses.append('modal')
-            elif pos == 'BES':
-                tenses.append('present')
-            elif pos == 'VB':
-                tenses.append('infinitive')
-
-        if tenses:
-            tenses_set = set(tenses)
-            if len(tenses_set) == 1:
-                tense = tenses[0]
-            else:
-                if tenses_set in [{'present', 'infinitive'}, {'present', 'gerund'}, {'present', 'gerund', 'infinitive'}]:
-                    tense = 'present'
-                elif tenses_set in [{'past', 'infinitive'}, {'past', 'gerund'}, {'past', 'gerund', 'infinitive'}]:
-                    tense = 'past'
-                elif tenses_set == {'modal', 'infinitive'}:
-                    tense = 'modal'
-                else:
-                    tense = 'other'
-
+        for w in self.xpath(sentence, './/w'):
+            tag = w.get(pos_attr)
+            if tag not in pos_tenses:
+                pos_tenses[tag] = get_pos_tense(self.get_pos(self.l_from, w))
+            if pos_tenses[tag] is not None:
+                tenses.append(pos_tenses[tag])
+
+        tense = label_tenses(frozenset(tenses))
         return tense, tenses
 
     @abstractmethod
@@ -411,6 +560,34 @@ class BaseExtractor(BaseWorker):
         """
         pass
 
+    @abstractmethod
+    def get_token_groups(self, sentence: etree._Element) -> List[List[etree._Element]]:
+        """
+        Returns the tokens of the given sentence, grouped such that get_siblings only looks within a group.
+        """
+        pass
+
+    def get_sibling_xpath(self) -> Optional[Tuple[str, str]]:
+        """
+        Returns the node test for the siblings of a token on the XPath sibling axes, as well as an XPath condition
+        for the sentences in which these axes select the same tokens as get_token_groups.
+        Returns None if the siblings cannot be expressed in XPath.
+        """
+        return None
+
+    def read_token(self, language: str, element: etree._Element) -> Token:
+        """
+        Reads the text, lemma, part-of-speech tag and id of the given element.
+        """
+        return Token(self.get_text(element), self.get_lemma(element), self.get_pos(language, element),
+                     self.get_id(element))
+
+    def get_sentence_context(self, sentence: etree._Element, language: str) -> SentenceContext:
+        """
+        Returns the SentenceContext for the given sentence, with the tokens read for the given language.
+        """
+        return SentenceContext(sentence, self.get_token_groups(sentence), partial(self.read_token, language))
+
     @abstractmethod
     def sort_by_alignment_certainty(self, file_names: List[str]) -> List[str]:
         """
@@ -0,0 +1,120 @@
+import configparser
+from typing import Dict, FrozenSet, List, Optional
+
+from .matcher import RegexMatcher
+
+# The options of a query in a batch query file
+LEMMATA = 'lemmata'
+POS = 'pos'
+REGEX = 'regex'
+
+
+class BatchQuery:
+    """
+    A single query in a batch: a word matches if its lemma is one of the lemmata, its part-of-speech tag
+    is one of the tags and one of the regular expressions matches (each of these conditions only if given).
+    """
+    def __init__(self,
+                 query_id: str,
+                 lemmata: Optional[List[str]] = None,
+                 pos: Optional[List[str]] = None,
+                 regex: Optional[List[str]] = None) -> None:
+        if not (lemmata or pos or regex):
+            raise ValueError('Query {} has no lemmata, part-of-speech tags or regular expressions'.format(query_id))
+
+        self.query_id = query_id
+        self.lemmata: Optional[FrozenSet[str]] = frozenset(lemmata) if lemmata else None
+        self.pos: Optional[FrozenSet[str]] = frozenset(pos) if pos else None
+        self.regex = RegexMatcher(regex) if regex else None
+
+    def matches(self, lemma: str, pos: str, value: str) -> bool:
+        """
+        Returns whether a word with the given lemma, part-of-speech tag and value (for the regular expressions)
+        matches this query.
+        """
+        return (self.lemmata is None or lemma in self.lemmata) and \
+            (self.pos is None or pos in self.pos) and \
+            (self.regex is None or self.regex.match(value) is not None)
+
+
+def read_queries(filename: str) -> List[BatchQuery]:
+    """
+    Reads a batch query file, in which every section is a query, e.g.:
+
+        [since]
+        lemmata: seit|sinds
+        pos: APPR|prep
+
+        [wh]
+        regex:
+            ^wh.*
+            ^how$
+
+    Lemmata and part-of-speech tags are separated by |, regular expressions are given one per line.
+    """
+    config = configparser.ConfigParser(interpolation=None)
+    with open(filename, encoding='utf-8') as f:
+        try:
+            config.read_file(f)
+        except configparser.Error as e:
+            raise ValueError('Invalid batch query file {}: {}'.format(filename, e))
+
+    result = []
+    for section in config.sections():
+        options = config[section]
+        unknown = set(options.keys()) - {LEMMATA, POS, REGEX}
+        if unknown:
+            raise ValueError('Unknown option(s) {} for query {}'.format(', '.join(sorted(unknown)), section))
+
+        lemmata = options.get(LEMMATA, '').split('|')
+        pos = options.get(POS, '').split('|')
+        regex = options.get(REGEX, '').splitlines()
+        result.append(BatchQuery(section,
+                                 lemmata=[v.strip() for v in lemmata if v.strip()],
+                                 pos=[v.strip() for v in pos if v.strip()],
+                                 regex=[v.strip() for v in regex if v.strip()]))
+    return result
+
+
+class BatchDispatcher:
+    """
+    Dispatches words to the queries of a batch they match, in a single pass.
+    The queries are indexed on their lemmata (or, for queries without lemmata, on their part-of-speech tags),
+    so that a word is only checked against the queries it could match, rather than against every query.
+    """
+    def __init__(self, queries: List[BatchQuery]) -> None:
+        ids = [q.query_id for q in queries]
+        if len(set(ids)) != len(ids):
+            raise ValueError('The ids of the queries should be unique')
+
+        self.queries = queries
+        self.by_lemma: Dict[str, List[int]] = dict()
+        self.by_pos: Dict[str, List[int]] = dict()
+        self.unindexed: List[int] = []
+        for i, query in enumerate(queries):
+            if query.lemmata is not None:
+                for lemma in query.lemmata:
+                    self.by_lemma.setdefault(lemma, []).append(i)
+            elif query.pos is not None:
+                for tag in query.pos:
+                    self.by_pos.setdefault(tag, []).append(i)
+            else:
+                self.unindexed.append(i)
+
+    @property
+    def is_indexed(self) -> bool:
+        """
+        Whether every query can be found by either its lemmata or its part-of-speech tags.
+        Then, only the words with these lemmata or tags have to be considered.
+        """
+        return not self.unindexed
+
+    def dispatch(self, lemma: str, pos: str, value: str) -> List[str]:
+        """
+        Returns the ids of the queries (in the order of the batch) that a word with the given lemma,
+        part-of-speech tag and value (for the regular expressions) matches.
+        """
+        candidates = self.by_lemma.get(lemma, []) + self.by_pos.get(pos, []) + self.unindexed
+        if len(candidates) > 1:
+            candidates.sort()
+        return [self.queries[i].query_id for i in candidates if self.queries[i].matches(lemma, pos, value)]
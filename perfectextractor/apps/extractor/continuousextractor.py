@@ -1,11 +1,14 @@
 from abc import ABC
 import string
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from lxml import etree
 
+from .automaton import ContinuousAutomaton
 from .base import BaseExtractor
-from .models import MultiWordExpression
+from .models import MultiWordExpression, SentenceContext
+from .rules import ContinuousRules
+from .utils import AUTOMATON
 
 
 class ContinuousExtractor(BaseExtractor, ABC):
@@ -23,34 +26,70 @@ class ContinuousExtractor(BaseExtractor, ABC):
 
         self.check_language_in_config(language_from)
 
-    def check_continuous(self, w: etree._Element, language: str) -> Optional[MultiWordExpression]:
+        # The rules (and automata) per language are compiled on first use
+        self._continuous_rules: Dict[str, ContinuousRules] = dict()
+        self._continuous_automata: Dict[str, ContinuousAutomaton] = dict()
+
+    def get_continuous_rules(self, language: str) -> ContinuousRules:
+        """
+        Returns the compiled rules to find continuous forms for the given language.
+        """
+        if language not in self._continuous_rules:
+            self._continuous_rules[language] = ContinuousRules.from_config(self.config, language)
+        return self._continuous_rules[language]
+
+    def get_continuous_automaton(self, language: str) -> ContinuousAutomaton:
+        """
+        Returns the automaton to find continuous forms for the given language.
+        """
+        if language not in self._continuous_automata:
+            self._continuous_automata[language] = ContinuousAutomaton(self.get_continuous_rules(language))
+        return self._continuous_automata[language]
+
+    def check_continuous(self,
+                         w: etree._Element,
+                         language: str,
+                         context: Optional[SentenceContext] = None) -> Optional[MultiWordExpression]:
         """
         Checks if the element w is the start of a (present/past) continuous construction
         :param w: the starting element
         :param language: the language
+        :param context: the SentenceContext of w (built from the sentence if not given)
         :return: if found, the recent past construction as a MultiWordExpression, otherwise None
         """
         is_continuous = False
 
-        # Retrieve the configuration variables
-        cont_gerund_pos = self.config.get(language, 'cont_gerund_pos').split('|')
-        stop_tags = tuple(self.config.get(language, 'stop_tags').split('|'))
+        # Retrieve the compiled rules
+        rules = self.get_continuous_rules(language)
+        cont_gerund_pos = rules.cont_gerund_pos
+        stop_tags = rules.stop_tags
 
-        sentence = self.get_sentence(w)
+        if context is None:
+            context = self.get_sentence_context(self.get_sentence(w), language)
+        texts, pos_tags = context.texts, context.pos_tags
 
         # Start a new MWE at the first word
-        mwe = MultiWordExpression(sentence)
-        mwe.add_word(self.get_text(w), self.get_lemma(w), self.get_pos(language, w), self.get_id(w))
+        i = context.positions[w]
+        mwe = MultiWordExpression(context.sentence, context)
+        mwe.add_token(i)
+
+        # Find the gerund with the automaton: the gap is part of the MWE, the token after the gap should be a gerund
+        if self.engine == AUTOMATON:
+            gap, j = self.get_continuous_automaton(language).scan_continuous(context, i)
+            for k in gap:
+                mwe.add_token(k, in_construction=False)
+            if j is not None and pos_tags[j] in cont_gerund_pos:
+                mwe.add_token(j)
+                is_continuous = True
+            return mwe if is_continuous else None
 
         # Check the siblings for the gerund of the continuous construction
-        for gerund in self.get_siblings(w, self.get_id(sentence), False):
-            gerund_text = self.get_text(gerund)
-            gerund_lem = self.get_lemma(gerund)
-            gerund_pos = self.get_pos(language, gerund)
-            gerund_id = self.get_id(gerund)
+        for j in context.following(i):
+            gerund_text = texts[j]
+            gerund_pos = pos_tags[j]
             if gerund_pos in cont_gerund_pos:
                 # We found our construction: add the word and break out of the loop
-                mwe.add_word(gerund_text, gerund_lem, gerund_pos, gerund_id)
+                mwe.add_token(j)
                 is_continuous = True
                 break
             # Stop looking when matching punctuation or stop tags
@@ -58,6 +97,6 @@ class ContinuousExtractor(BaseExtractor, ABC):
                 break
             # Otherwise: add the word to the MWE and continue searching for a gerund
             else:
-                mwe.add_word(gerund_text, gerund_lem, gerund_pos, gerund_id, in_construction=False)
+                mwe.add_token(j, in_construction=False)
 
         return mwe if is_continuous else None
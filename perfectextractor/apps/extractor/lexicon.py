@@ -0,0 +1,157 @@
+from abc import ABC, abstractmethod
+from functools import lru_cache
+import sqlite3
+from typing import FrozenSet, Iterable, Iterator, Optional, Tuple
+
+from .wiktionary import get_translations
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS words (language_from TEXT, language_to TEXT, word TEXT,
+                                  PRIMARY KEY (language_from, language_to, word)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS translations (language_from TEXT, language_to TEXT, word TEXT, translation TEXT,
+                                         PRIMARY KEY (language_from, language_to, word, translation)) WITHOUT ROWID;
+'''
+
+
+def read_dictionary(filename: str) -> Iterator[Tuple[str, str]]:
+    """
+    Reads a bilingual dictionary file, with a word and one of its translations per line, separated by a tab.
+    Empty lines and lines starting with # are skipped.
+    """
+    with open(filename, encoding='utf-8') as f:
+        for n, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.split('\t')
+            if len(parts) != 2:
+                raise ValueError('Line {} of {} should contain a word and a translation'.format(n, filename))
+            yield parts[0].strip(), parts[1].strip()
+
+
+class Lexicon(ABC):
+    """
+    Provides the translations of words (i.e. lemmata) from one language into another.
+    """
+    @abstractmethod
+    def get_translations(self, word: str, language_from: str, language_to: str) -> FrozenSet[str]:
+        """
+        Returns the translations of a word.
+        """
+        pass
+
+    def prefetch(self, words: Iterable[str], language_from: str, language_to: str) -> None:
+        """
+        Looks up the translations of the given words before these are needed.
+        """
+        for word in words:
+            self.get_translations(word, language_from, language_to)
+
+    def close(self) -> None:
+        """
+        Releases the resources (e.g. connections) held by this Lexicon.
+        """
+        pass
+
+    def __enter__(self) -> 'Lexicon':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class WiktionaryLexicon(Lexicon):
+    """
+    Retrieves the translations from Wiktionary. Every lookup is an HTTP request.
+    """
+    def get_translations(self, word, language_from, language_to):
+        return frozenset(get_translations(word, language_from, language_to))
+
+
+class LexiconStore(Lexicon):
+    """
+    Stores translations in an SQLite database, so that these persist between runs.
+    Words that are not in the store are looked up in the fallback Lexicon (if any), and their translations are stored.
+    Without a fallback, the store works offline: unknown words have no translations.
+    """
+    def __init__(self, store_file: str, fallback: Optional[Lexicon] = None) -> None:
+        self.store_file = store_file
+        self.fallback = fallback
+        self.connection = sqlite3.connect(store_file)
+        self.connection.executescript(SCHEMA)
+
+    def is_known(self, word: str, language_from: str, language_to: str) -> bool:
+        """
+        Returns whether the word has been stored (possibly without translations).
+        """
+        row = self.connection.execute('SELECT 1 FROM words WHERE language_from = ? AND language_to = ? AND word = ?',
+                                      (language_from, language_to, word)).fetchone()
+        return row is not None
+
+    def get_translations(self, word, language_from, language_to):
+        if self.fallback is not None and not self.is_known(word, language_from, language_to):
+            translations = self.fallback.get_translations(word, language_from, language_to)
+            self.import_pairs(((word, t) for t in translations), language_from, language_to, words=[word])
+            return translations
+
+        rows = self.connection.execute('SELECT translation FROM translations '
+                                       'WHERE language_from = ? AND language_to = ? AND word = ?',
+                                       (language_from, language_to, word))
+        return frozenset(translation for translation, in rows)
+
+    def prefetch(self, words, language_from, language_to):
+        if self.fallback is None:
+            return
+        for word in set(words):
+            if not self.is_known(word, language_from, language_to):
+                self.get_translations(word, language_from, language_to)
+
+    def import_pairs(self,
+                     pairs: Iterable[Tuple[str, str]],
+                     language_from: str,
+                     language_to: str,
+                     words: Iterable[str] = ()) -> None:
+        """
+        Stores the given pairs of words and translations in a single transaction.
+        :param pairs: the words and their translations
+        :param language_from: the language of the words
+        :param language_to: the language of the translations
+        :param words: other words to store, i.e. the words without translations
+        """
+        with self.connection:
+            for word in words:
+                self.connection.execute('INSERT OR IGNORE INTO words VALUES (?, ?, ?)',
+                                        (language_from, language_to, word))
+            for word, translation in pairs:
+                self.connection.execute('INSERT OR IGNORE INTO words VALUES (?, ?, ?)',
+                                        (language_from, language_to, word))
+                self.connection.execute('INSERT OR IGNORE INTO translations VALUES (?, ?, ?, ?)',
+                                        (language_from, language_to, word, translation))
+
+    def import_dictionary(self, filename: str, language_from: str, language_to: str) -> None:
+        """
+        Stores the translations of a bilingual dictionary file (see read_dictionary).
+        """
+        self.import_pairs(read_dictionary(filename), language_from, language_to)
+
+    def close(self):
+        self.connection.close()
+
+
+class CachedLexicon(Lexicon):
+    """
+    Keeps the most recently used translations of another Lexicon in memory.
+    """
+    def __init__(self, lexicon: Lexicon, maxsize: int = 4096) -> None:
+        self.lexicon = lexicon
+        self._get_translations = lru_cache(maxsize=maxsize)(lexicon.get_translations)
+
+    def get_translations(self, word, language_from, language_to):
+        return self._get_translations(word, language_from, language_to)
+
+    def prefetch(self, words, language_from, language_to):
+        self.lexicon.prefetch(words, language_from, language_to)
+
+    def close(self):
+        self._get_translations.cache_clear()
+        self.lexicon.close()
@@ -0,0 +1,136 @@
+import re
+from typing import List, Optional, Sequence
+
+# Matches a quantifier in braces, e.g. {2} or {0,3}
+BRACES = re.compile(r'\{(\d*)(?:,(\d*))?\}')
+
+# The escapes that span more than two characters: character codes, named characters, octal escapes and backreferences
+LONG_ESCAPES = frozenset('xuUN0123456789')
+
+
+def _skip_class(pattern: str, i: int) -> int:
+    """
+    Returns the position after the character class that starts at position i.
+    """
+    i += 1
+    if pattern[i:i + 1] == '^':
+        i += 1
+    if pattern[i:i + 1] == ']':
+        i += 1
+    while i < len(pattern) and pattern[i] != ']':
+        i += 2 if pattern[i] == '\\' else 1
+    return i + 1
+
+
+def _skip_group(pattern: str, i: int) -> int:
+    """
+    Returns the position after the group that starts at position i.
+    """
+    depth = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '[':
+            i = _skip_class(pattern, i)
+            continue
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+
+def required_literal(pattern: str) -> Optional[str]:
+    """
+    Returns the longest literal that every match of the regular expression contains, or None if there is none.
+    This is a conservative analysis: groups, character classes and escapes are skipped,
+    and no literal is returned for alternatives at the top level, for the verbose flag
+    or for escapes that span more than two characters (e.g. \\x41).
+    """
+    literals: List[str] = []
+    current = ''
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '|' or pattern.startswith('(?', i) and 'x' in pattern[i + 2:pattern.find(')', i)]:
+            return None
+        if c in '*+?{':
+            m = BRACES.match(pattern, i)
+            if c == '{' and not m:
+                current += c  # not a quantifier, so a literal brace
+                i += 1
+                continue
+            # The quantifier applies to the last character: drop it if it may occur zero times
+            minimum = int(m.group(1) or 0) if m else (1 if c == '+' else 0)
+            if minimum == 0:
+                current = current[:-1]
+            literals.append(current)
+            current = ''
+            i = m.end() if m else i + 1
+            if pattern[i:i + 1] in ('?', '+'):  # lazy or possessive quantifier
+                i += 1
+            continue
+
+        if c == '\\' and pattern[i + 1:i + 2] in LONG_ESCAPES:
+            return None
+        if c == '\\' and i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+            current += pattern[i + 1]  # an escaped symbol is a literal
+            i += 2
+            continue
+        if c not in '\\[(.^$':
+            current += c
+            i += 1
+            continue
+
+        # Anything else ends the run of literal characters
+        literals.append(current)
+        current = ''
+        if c == '\\':
+            i += 2
+        elif c == '[':
+            i = _skip_class(pattern, i)
+        elif c == '(':
+            i = _skip_group(pattern, i)
+        else:
+            i += 1
+    literals.append(current)
+
+    result = max(literals, key=len)
+    return result or None
+
+
+class RegexMatcher:
+    """
+    Matches values against a number of regular expressions, compiled once into a single pattern.
+    If every regular expression requires a literal, values that contain none of these literals are skipped
+    without running the (combined) regular expressions.
+    For a value that matches, the regular expression that matched is reported.
+    """
+    def __init__(self, patterns: Sequence[str], flags: int = re.IGNORECASE) -> None:
+        self.patterns = list(patterns)
+        self.compiled = [re.compile(p, flags) for p in self.patterns]
+        # Combine the patterns using OR operators and non-capturing groups
+        self.combined = re.compile('|'.join('(?:{})'.format(p) for p in self.patterns), flags)
+
+        # The literals are searched for with the same flags as the patterns, so that these ignore case alike
+        literals = [required_literal(p) for p in self.patterns]
+        self.literals: Optional[List[str]] = literals if all(literals) else None
+        self.literal_filter = re.compile('|'.join(map(re.escape, literals)), flags) if self.literals else None
+
+    def match(self, value: str) -> Optional[str]:
+        """
+        Returns the (first) regular expression that is found in the value, or None if none is.
+        """
+        if self.literal_filter is not None and self.literal_filter.search(value) is None:
+            return None
+
+        if self.combined.search(value) is None:
+            return None
+        if len(self.compiled) == 1:
+            return self.patterns[0]
+        return next(p for p, c in zip(self.patterns, self.compiled) if c.search(value))
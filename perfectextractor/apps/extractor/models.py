@@ -1,41 +1,120 @@
-from typing import List, Optional
+import sys
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
 
 from lxml import etree
 
+from .xpath import XPATHS
+
 MARKUP = u'**{}**'
 
 
+class Token(NamedTuple):
+    """
+    The text, lemma, part-of-speech tag and id of a single token, as read from the XML.
+    """
+    text: str
+    lemma: str
+    pos: str
+    xml_id: str
+
+
 class Word:
     """
     Each Word consists of a word, its lemma, and a designation if this is part of a construction.
+    If the Word was read from a SentenceContext, its position in the context is kept as well.
     """
+    __slots__ = ('word', 'lemma', 'pos', 'xml_id', 'in_construction', 'position')
+
     def __init__(self, word: str, lemma: str, pos: str, xml_id: str,
-                 in_construction: bool = True) -> None:
+                 in_construction: bool = True, position: Optional[int] = None) -> None:
         self.word = word.strip()
         self.lemma = lemma.strip()
         self.pos = pos.strip()
         self.xml_id = xml_id.strip()
         self.in_construction = in_construction
+        self.position = position
+
+
+def get_word_texts(words: Iterable[etree._Element]) -> List[str]:
+    """
+    Returns the texts of the given words, as they are rendered in a sentence.
+    """
+    return [str(w.text.strip() if w.text else ' ') for w in words]
+
+
+def get_sentence_words(xml_sentence: etree._Element) -> str:
+    """
+    Returns all words in a sentence, joined with a space.
+    """
+    # TODO: this xPath-expression might be specific for a corpus
+    return ' '.join(get_word_texts(XPATHS.evaluate(xml_sentence, './/w')))
+
+
+def mark_words(texts: Sequence[str], marked: Sequence[int], as_span: bool = False) -> str:
+    """
+    Returns the texts of the words in a sentence joined with a space, with the words at the given indexes marked.
+    :param texts: the texts of the words in the sentence
+    :param marked: the indexes of the words to mark, in ascending order
+    :param as_span: whether to mark the words as a single span (only if the words are adjacent)
+    :return: the marked sentence
+    """
+    result = list(texts)
+    if as_span and marked and marked[-1] - marked[0] == len(marked) - 1:
+        start, end = marked[0], marked[-1] + 1
+        result[start:end] = [MARKUP.format(' '.join(result[start:end]))]
+    else:
+        for i in marked:
+            result[i] = MARKUP.format(result[i])
+    return ' '.join(result)
+
+
+def get_offsets(texts: Sequence[str], indexes: Sequence[int]) -> List[Tuple[int, int]]:
+    """
+    Returns the character offsets (start and end) of the words at the given indexes,
+    in the texts of the words in a sentence joined with a space.
+    """
+    starts = []
+    start = 0
+    for text in texts:
+        starts.append(start)
+        start += len(text) + 1
+    return [(starts[i], starts[i] + len(texts[i])) for i in indexes]
+
+
+def format_offsets(offsets: Iterable[Tuple[int, int]]) -> str:
+    """
+    Returns the character offsets as a string, e.g. 3-7 8-13.
+    """
+    return ' '.join('{}-{}'.format(start, end) for start, end in offsets)
 
 
 class MultiWordExpression:
-    def __init__(self, xml_sentence: etree._Element) -> None:
+    __slots__ = ('xml_sentence', 'context', 'words')
+
+    def __init__(self, xml_sentence: etree._Element, context: Optional['SentenceContext'] = None) -> None:
         self.xml_sentence = xml_sentence
+        self.context = context
         self.words: List[Word] = []
 
     def add_word(self, word: str, lemma: str, pos: str, xml_id: str,
-                 in_construction: bool = True) -> None:
+                 in_construction: bool = True, position: Optional[int] = None) -> None:
         """
         Adds a word to the MultiWordExpression.
         """
-        self.words.append(Word(word, lemma, pos, xml_id, in_construction))
+        self.words.append(Word(word, lemma, pos, xml_id, in_construction, position))
+
+    def add_token(self, i: int, in_construction: bool = True) -> None:
+        """
+        Adds the token at position i in the SentenceContext to the MultiWordExpression.
+        """
+        self.add_word(*self.context.token(i), in_construction=in_construction, position=i)
 
     def prepend_word(self, word: str, lemma: str, pos: str, xml_id: str,
-                     in_construction: bool = True) -> None:
+                     in_construction: bool = True, position: Optional[int] = None) -> None:
         """
         Prepends a word to the MultiWordExpression.
         """
-        self.words.insert(0, Word(word, lemma, pos, xml_id, in_construction))
+        self.words.insert(0, Word(word, lemma, pos, xml_id, in_construction, position))
 
     def construction(self) -> List[str]:
         """
@@ -74,22 +153,74 @@ class MultiWordExpression:
         return result
 
     def get_sentence_words(self) -> str:
-        s = []
-        # TODO: this xPath-expression might be specific for a corpus
+        if self.context is not None:
+            return self.context.get_sentence_words()
         if self.xml_sentence is not None:
-            words: List[etree._Element] = self.xml_sentence.xpath('.//w')
-            for w in words:
-                s.append(str(w.text.strip() if w.text else ' '))
-        return ' '.join(s)
+            return get_sentence_words(self.xml_sentence)
+        return ''
+
+    def locate(self,
+               sentence_words: Optional[Sequence[etree._Element]] = None) -> Optional[Tuple[List[str], List[int]]]:
+        """
+        Locates the MultiWordExpression in its sentence.
+        Returns the texts of the words in the sentence, and the indexes of the words of the MultiWordExpression
+        in these texts (in the order of the words), or None if the words cannot be located.
+        The words are located by their positions in the SentenceContext, or otherwise by their ids.
+        :param sentence_words: the words of the sentence, if these are not the tokens of the SentenceContext
+        (e.g. if the sentence also contains punctuation)
+        """
+        if sentence_words is not None:
+            if self.context is None or any(w.position is None for w in self.words):
+                return None
+            indexes = {e: i for i, e in enumerate(sentence_words)}
+            elements = [self.context.tokens[w.position] for w in self.words]
+            if not all(e in indexes for e in elements):
+                return None
+            return get_word_texts(sentence_words), [indexes[e] for e in elements]
+
+        if self.context is not None and all(w.position is not None for w in self.words):
+            return self.context.get_word_texts(), [self.context.get_word_index(w.position) for w in self.words]
+
+        if self.xml_sentence is None or any(w.xml_id == '?' for w in self.words):
+            return None
+
+        words: List[etree._Element] = XPATHS.evaluate(self.xml_sentence, './/w')
+        indexes: Dict[str, int] = dict()
+        for i, w in enumerate(words):
+            indexes.setdefault(w.get('id'), i)
+        if not all(w.xml_id in indexes for w in self.words):
+            return None
+        return get_word_texts(words), [indexes[w.xml_id] for w in self.words]
+
+    def construction_offsets(self,
+                             sentence_words: Optional[Sequence[etree._Element]] = None) -> List[Tuple[int, int]]:
+        """
+        Returns the character offsets (start and end) of the words in the construction
+        in the full sentence (see get_sentence_words), or an empty list if the words cannot be located.
+        :param sentence_words: the words of the sentence, if these are not the tokens of the SentenceContext
+        """
+        located = self.locate(sentence_words)
+        if located is None:
+            return []
+        texts, indexes = located
+        return get_offsets(texts, sorted(i for i, w in zip(indexes, self.words) if w.in_construction))
 
     def mark_sentence(self) -> str:
         """
         Marks the MultiWordExpression in a full sentence.
+        The words are marked at their positions, which only falls back to finding the words in the sentence text
+        if the words cannot be located (see locate).
         """
         # TODO: this doesn't work if no xml_sentence is given
         if self.xml_sentence is None:
             return ''
 
+        located = self.locate()
+        if located is not None:
+            texts, indexes = located
+            marked = sorted(i for i, w in zip(indexes, self.words) if w.in_construction)
+            return mark_words(texts, marked, as_span=len(marked) == len(self.words))
+
         # TODO: this is a bit iffy, another idea could be to compose the sentence from the remaining siblings
         # To find the pp in the full text, simply join all the parts of the pp
         pp_text = ' '.join([w.word for w in self.words])
@@ -107,9 +238,10 @@ class Perfect(MultiWordExpression):
     """
     A Perfect is a special kind of MultiWordExpression, consisting of an auxiliary and one or more past participles.
     """
+    __slots__ = ('is_passive', 'is_continuous', 'is_reflexive')
 
-    def __init__(self, xml_sentence: etree._Element) -> None:
-        super().__init__(xml_sentence)
+    def __init__(self, xml_sentence: etree._Element, context: Optional['SentenceContext'] = None) -> None:
+        super().__init__(xml_sentence, context)
         self.is_passive = False
         self.is_continuous = False
         self.is_reflexive = False
@@ -121,7 +253,7 @@ class Perfect(MultiWordExpression):
         for i, w in enumerate(perfect.words):
             if i == 0:
                 continue
-            self.add_word(w.word, w.lemma, w.pos, w.xml_id, w.in_construction)
+            self.add_word(w.word, w.lemma, w.pos, w.xml_id, w.in_construction, w.position)
 
         self.is_passive = not perfect.is_continuous
         self.is_continuous = perfect.is_continuous
@@ -145,8 +277,137 @@ class Perfect(MultiWordExpression):
         return result
 
 
+class SentenceContext:
+    """
+    A sentence, with its tokens in a flat array and a lookup of their positions.
+    The tokens are divided into groups (e.g. the words under the same parent element):
+    the siblings of a token are the tokens that precede or follow it in its group.
+    A SentenceContext is built once per sentence, so that checking a candidate does not require walking the sentence.
+    If a function to read tokens is given, the text, lemma, part-of-speech tag and id of the tokens
+    are read once as well, and kept (interned) in parallel arrays.
+    """
+    __slots__ = ('sentence', 'tokens', 'positions', 'texts', 'lemmata', 'pos_tags', 'ids',
+                 'groups', 'bounds', '_sentence_words', '_word_texts', '_word_indexes')
+
+    def __init__(self,
+                 sentence: etree._Element,
+                 groups: Iterable[Iterable[etree._Element]],
+                 read_token: Optional[Callable[[etree._Element], Token]] = None) -> None:
+        self.sentence = sentence
+        self.tokens: List[etree._Element] = []
+        self.positions: Dict[etree._Element, int] = dict()
+        self.groups: List[Tuple[int, int]] = []  # the start and end of each group
+        self.bounds: List[Tuple[int, int]] = []  # the start and end of the group, per position
+        self._sentence_words: Optional[str] = None
+        self._word_texts: Optional[List[str]] = None
+        self._word_indexes: Optional[List[int]] = None
+
+        for group in groups:
+            start = len(self.tokens)
+            self.tokens.extend(group)
+            end = len(self.tokens)
+            self.groups.append((start, end))
+            for i in range(start, end):
+                self.positions.setdefault(self.tokens[i], i)
+                self.bounds.append((start, end))
+
+        self.texts: List[str] = []
+        self.lemmata: List[str] = []
+        self.pos_tags: List[str] = []
+        self.ids: List[str] = []
+        if read_token is not None:
+            for token in self.tokens:
+                text, lemma, pos, xml_id = read_token(token)
+                self.texts.append(sys.intern(text))
+                self.lemmata.append(sys.intern(lemma))
+                self.pos_tags.append(sys.intern(pos))
+                self.ids.append(xml_id)
+
+    def token(self, i: int) -> Token:
+        """
+        Returns the Token at the given position.
+        """
+        return Token(self.texts[i], self.lemmata[i], self.pos_tags[i], self.ids[i])
+
+    def following(self, i: int) -> range:
+        """
+        Returns the positions of the siblings following the given position, in reading order.
+        """
+        return range(i + 1, self.bounds[i][1])
+
+    def preceding(self, i: int) -> range:
+        """
+        Returns the positions of the siblings preceding the given position, in reverse order.
+        """
+        return range(i - 1, self.bounds[i][0] - 1, -1)
+
+    def siblings(self, element: etree._Element, preceding: bool = False) -> List[etree._Element]:
+        """
+        Returns the siblings of an element, in reading order (or in reverse order, if preceding is set).
+        """
+        i = self.positions[element]
+        positions = self.preceding(i) if preceding else self.following(i)
+        return [self.tokens[j] for j in positions]
+
+    def get_word_texts(self) -> List[str]:
+        """
+        Returns the texts of the tokens in the order of the sentence (the groups might be in another order).
+        The result is kept for subsequent calls.
+        """
+        if self._word_texts is None:
+            order = list(range(len(self.tokens)))
+            if len(self.groups) > 1:
+                order = [self.positions[e] for e in self.sentence.iter() if e in self.positions]
+            self._word_indexes = [0] * len(self.tokens)
+            for index, i in enumerate(order):
+                self._word_indexes[i] = index
+            self._word_texts = get_word_texts(self.tokens[i] for i in order)
+        return self._word_texts
+
+    def get_word_index(self, i: int) -> int:
+        """
+        Returns the index of the token at position i in the order of the sentence.
+        """
+        self.get_word_texts()
+        return self._word_indexes[i]
+
+    def get_sentence_words(self) -> str:
+        """
+        Returns all words in the sentence, joined with a space. The result is kept for subsequent calls.
+        """
+        if self._sentence_words is None:
+            self._sentence_words = ' '.join(self.get_word_texts())
+        return self._sentence_words
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+
 class Alignment:
     def __init__(self, sources: List[str], targets: List[str], certainty: Optional[float] = None) -> None:
         self.sources = sources
         self.targets = targets
         self.certainty = certainty
+
+
+class Alignments(list):
+    """
+    The Alignments for a single document, with a lookup from segment numbers to Alignments in both directions.
+    The lookup keeps the first Alignment a segment number occurs in.
+    """
+    def __init__(self, alignments: Iterable[Alignment] = ()) -> None:
+        super().__init__(alignments)
+
+        self._by_source: Dict[str, Alignment] = dict()
+        self._by_target: Dict[str, Alignment] = dict()
+        for alignment in self:
+            for segment_number in alignment.sources:
+                self._by_source.setdefault(segment_number, alignment)
+            for segment_number in alignment.targets:
+                self._by_target.setdefault(segment_number, alignment)
+
+    def find(self, segment_number: str, reverse: bool = False) -> Optional[Alignment]:
+        """
+        Returns the Alignment that contains the segment number in its sources (or targets, if reverse is set).
+        """
+        return (self._by_target if reverse else self._by_source).get(segment_number)
@@ -4,13 +4,18 @@ from abc import ABC, abstractmethod
 import codecs
 import string
 import os
-from typing import List, Optional
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
 
 from lxml import etree
 
 from .base import BaseExtractor
-from .models import Perfect
-from .wiktionary import get_translations
+from .automaton import PerfectAutomaton
+from .lexicon import CachedLexicon, Lexicon, WiktionaryLexicon
+from .models import Perfect, SentenceContext, Token
+from .prefilter import PerfectPrefilter
+from .rules import PerfectRules, split_nonempty_set
+from .utils import AUTOMATON, XPATH
+from .xpath import PerfectXPath, is_expressible
 
 # List of verbs that have BE instead of HAVE as their auxiliary
 AUX_BE_CONFIG = os.path.join(os.path.dirname(__file__), 'config/{language}_aux_be.txt')
@@ -19,6 +24,11 @@ AUX_BE_CONFIG = os.path.join(os.path.dirname(__file__), 'config/{language}_aux_b
 PRESENT = 'present'
 PAST = 'past'
 # FUTURE = 'future'  # TODO: implement this somewhere in the near future
+ALL_TENSES = 'all'  # searches for the Perfects in all of the above tenses in a single pass
+TENSES = [PRESENT, PAST]
+
+# The column in the results that holds the tense of the Perfect (if searching in all tenses)
+TENSE_COLUMN = 3
 
 
 class PerfectExtractor(BaseExtractor, ABC):
@@ -27,6 +37,7 @@ class PerfectExtractor(BaseExtractor, ABC):
                  languages_to: Optional[List[str]] = None,
                  search_in_to: bool = False,
                  tense: str = PRESENT,
+                 lexicon: Optional[Lexicon] = None,
                  **kwargs):
         """
         Initializes the PerfectExtractor for the given source and target language(s).
@@ -35,12 +46,14 @@ class PerfectExtractor(BaseExtractor, ABC):
         :param language_from: the source language
         :param languages_to: the target language(s)
         :param search_in_to: whether to look for perfects in the target language
-        :param tense: whether to search for present, past or future perfects
+        :param tense: whether to search for present, past or future perfects (or all of these)
+        :param lexicon: the Lexicon used to check the translated Perfects (defaults to a cached lookup on Wiktionary)
         """
         super().__init__(language_from, languages_to, **kwargs)
 
         self.search_in_to = search_in_to
         self.tense = tense
+        self.lexicon = lexicon if lexicon is not None else CachedLexicon(WiktionaryLexicon())
 
         languages = [self.l_from]
         if search_in_to:
@@ -53,12 +66,111 @@ class PerfectExtractor(BaseExtractor, ABC):
         # Read the list of verbs that use 'to be' as auxiliary verb per language
         self.aux_be_list = {}
         for language in languages:
-            aux_be_list = []
+            aux_be_list = frozenset()
             if self.config.get(language, 'lexical_bound'):
                 with codecs.open(AUX_BE_CONFIG.format(language=language), 'r', 'utf-8') as lexicon:
-                    aux_be_list = lexicon.read().split()
+                    aux_be_list = frozenset(lexicon.read().split())
             self.aux_be_list[language] = aux_be_list
 
+        # The rules (and prefilters, automata and XPath expressions) per language are compiled on first use
+        self._perfect_rules: Dict[str, PerfectRules] = dict()
+        self._perfect_prefilters: Dict[str, PerfectPrefilter] = dict()
+        self._perfect_automata: Dict[str, PerfectAutomaton] = dict()
+        self._perfect_xpaths: Dict[str, Optional[PerfectXPath]] = dict()
+
+        # The lines and Perfects found in the translations, memoised per translation tree and segment number
+        self._translated_lines: Dict[etree._ElementTree, Dict[str, Tuple[str, str, Optional[Perfect]]]] = dict()
+
+    @property
+    def tenses(self) -> List[str]:
+        """
+        The tenses to search Perfects in.
+        """
+        return TENSES if self.tense == ALL_TENSES else [self.tense]
+
+    def get_tense_option(self, language: str, option: str, tense: str) -> str:
+        """
+        Returns the value of a config option for the given tense (e.g. xpath_past), with a fallback to the option itself.
+        """
+        l_config = self.config[language]
+        return l_config.get(option + ('_{}'.format(tense) if tense != PRESENT else ''), l_config.get(option))
+
+    def get_aux_words(self, language: str, tense: str) -> FrozenSet[str]:
+        """
+        Returns the auxiliaries for the given tense (an empty set if these are not restricted).
+        """
+        return split_nonempty_set(self.get_tense_option(language, 'aux_words', tense))
+
+    def get_aux_xpath(self, language: str) -> str:
+        """
+        Returns the XPath expression to find the auxiliaries for the tense(s) searched in.
+        """
+        xpaths = []
+        for tense in self.tenses:
+            xpath = self.get_tense_option(language, 'xpath', tense)
+            if xpath not in xpaths:
+                xpaths.append(xpath)
+        return ' | '.join(xpaths)
+
+    def get_perfect_tense(self, auxiliary: etree._Element, sentence: etree._Element, language: str) -> str:
+        """
+        Returns the tense of the Perfect that starts with the given auxiliary: the first tense searched in
+        of which the XPath expression finds the auxiliary, and of which the auxiliaries (if restricted) contain it.
+        """
+        text = self.read_token(language, auxiliary).text.lower()
+        found = [t for t in self.tenses if auxiliary in self.xpath(sentence, self.get_tense_option(language, 'xpath', t))]
+        for tense in found:
+            aux_words = self.get_aux_words(language, tense)
+            if not aux_words or text in aux_words:
+                return tense
+        return found[0] if found else self.tenses[0]
+
+    def get_perfect_rules(self, language: str) -> PerfectRules:
+        """
+        Returns the compiled rules to find Perfects for the given language (and the current tense).
+        """
+        if language not in self._perfect_rules:
+            rules = PerfectRules.from_config(self.config, language, aux_be=self.aux_be_list.get(language, ()))
+            # The auxiliaries depend on the tense(s): if these are not restricted in any tense, all are allowed
+            aux_words = [self.get_aux_words(language, tense) for tense in self.tenses]
+            self._perfect_rules[language] = rules._replace(
+                aux_words=frozenset().union(*aux_words) if all(aux_words) else frozenset())
+        return self._perfect_rules[language]
+
+    def generate_header(self) -> List[str]:
+        header = super().generate_header()
+        if self.tense == ALL_TENSES:
+            header.insert(TENSE_COLUMN, 'perfect tense')
+        return header
+
+    def get_perfect_prefilter(self, language: str) -> PerfectPrefilter:
+        """
+        Returns the prefilter for the positions that could start a Perfect in the given language.
+        """
+        if language not in self._perfect_prefilters:
+            self._perfect_prefilters[language] = PerfectPrefilter(self.get_perfect_rules(language))
+        return self._perfect_prefilters[language]
+
+    def get_perfect_candidates(self,
+                               sentence: etree._Element,
+                               candidates: List[etree._Element],
+                               language: str) -> Tuple[List[etree._Element], Optional[SentenceContext]]:
+        """
+        Filters the candidate auxiliaries in a sentence down to those that could start a Perfect.
+        Returns the remaining candidates, as well as the SentenceContext to check them with.
+        """
+        if not candidates:
+            return candidates, None
+
+        if self.engine == XPATH:
+            perfect_xpath = self.get_perfect_xpath(language)
+            if perfect_xpath is not None and perfect_xpath.applies(sentence):
+                return perfect_xpath.filter_candidates(candidates), None
+
+        context = self.get_sentence_context(sentence, language)
+        starts = self.get_perfect_prefilter(language).find_starts(context)
+        return [c for c in candidates if starts[context.positions[c]]], context
+
     @abstractmethod
     def get_line_and_pp(self, tree, language_to, segment_number):
         """
@@ -66,6 +178,22 @@ class PerfectExtractor(BaseExtractor, ABC):
         """
         pass
 
+    def get_translated_line_and_pp(self, tree, language_to, segment_number):
+        """
+        Returns the full line for a segment number in a translation, as well as the Perfect found (see get_line_and_pp).
+        As a translated segment is often aligned with several source sentences (and hits),
+        the results are memoised per translation tree (i.e. per document and language) and segment number.
+        The memo is freed after each file.
+        """
+        memo = self._translated_lines.setdefault(tree, dict())
+        if segment_number not in memo:
+            memo[segment_number] = self.get_line_and_pp(tree, language_to, segment_number)
+        return memo[segment_number]
+
+    def free_memory(self) -> None:
+        super().free_memory()
+        self._translated_lines = dict()
+
     def is_lexically_bound(self,
                            language: str,
                            pp: Perfect,
@@ -76,128 +204,224 @@ class PerfectExtractor(BaseExtractor, ABC):
         Checks if the perfect is lexically bound to the auxiliary verb.
         If not, we are not dealing with a Perfect here.
         """
-        aux_be = self.config.get(language, 'lexical_bound')
+        before = [self.read_token(language, w) for w in w_before] if w_before is not None else None
+        return self.is_token_lexically_bound(language, pp,
+                                             self.read_token(language, aux_verb),
+                                             self.read_token(language, past_participle),
+                                             before)
+
+    def is_token_lexically_bound(self,
+                                 language: str,
+                                 pp: Perfect,
+                                 aux_verb: Token,
+                                 past_participle: Token,
+                                 before: Optional[Sequence[Token]]) -> bool:
+        """
+        Checks if the perfect is lexically bound to the auxiliary verb, given the Tokens of the construction.
+        """
+        rules = self.get_perfect_rules(language)
+        aux_be = rules.lexical_bound
 
         # If lexical bounds do not exist or we're dealing with an auxiliary verb that is unbound, return True
         # Note: we check with "not in", because in French the lemma can be e.g. 'suivre|être'
-        if not aux_be or aux_be not in self.get_lemma(aux_verb):
+        if not aux_be or aux_be not in aux_verb.lemma:
             return True
 
         # Else, check if we are dealing with a reflexive Perfect (in that case, there is no lexical bound)
-        if self.is_reflexive(language, w_before):
-            pp.prepend_word(self.get_text(w_before[0]), self.get_lemma(w_before[0]),
-                            self.get_pos(language, w_before[0]), self.get_id(w_before[0]))
+        if self.is_reflexive(language, before):
+            pp.prepend_word(*before[0])
             pp.is_reflexive = True
             return True
 
         # Finally, check whether the past participle is in the list of bound verbs
-        return self.get_lemma(past_participle) in self.aux_be_list[language]
+        return past_participle.lemma in rules.aux_be
 
-    def is_reflexive(self, language: str, w_before: List[etree._Element]) -> bool:
+    def is_reflexive(self, language: str, before: Optional[Sequence[Token]]) -> bool:
         """
         Check whether we are dealing with a reflexive Perfect
         """
-        reflexive_lemmata = self.config.get(language, 'reflexive_lemmata').split('|')
+        reflexive_lemmata = self.get_perfect_rules(language).reflexive_lemmata
 
-        precondition = any(reflexive_lemmata) and w_before is not None and len(w_before) >= 2
+        precondition = reflexive_lemmata and before is not None and len(before) >= 2
         if precondition:
-            prev_reflexive = self.get_lemma(w_before[0]) in reflexive_lemmata
+            prev_reflexive = before[0].lemma in reflexive_lemmata
             # TODO: below condition is language-specific, and does not yet work for e.g. negation
-            prevprev_pronoun = self.get_lemma(w_before[0]) not in ['nous', 'vous'] \
-                               or self.get_pos(language, w_before[1]) == 'PRO:PER'
+            prevprev_pronoun = before[0].lemma not in ['nous', 'vous'] or before[1].pos == 'PRO:PER'
             return prev_reflexive and prevprev_pronoun
         else:
             return False
 
+    def get_perfect_automaton(self, language: str) -> PerfectAutomaton:
+        """
+        Returns the automaton to find Perfects for the given language.
+        """
+        if language not in self._perfect_automata:
+            self._perfect_automata[language] = PerfectAutomaton(self.get_perfect_rules(language),
+                                                                self.in_lemmata_list)
+        return self._perfect_automata[language]
+
+    def get_perfect_xpath(self, language: str) -> Optional[PerfectXPath]:
+        """
+        Returns the XPath expressions to find Perfects for the given language,
+        or None if the rules (or the siblings in this corpus) cannot be expressed in XPath.
+        """
+        if language not in self._perfect_xpaths:
+            rules = self.get_perfect_rules(language)
+            siblings = self.get_sibling_xpath()
+            perfect_xpath = None
+            if siblings is not None and is_expressible(rules):
+                perfect_xpath = PerfectXPath(rules, self.get_pos_xpath(language), *siblings)
+            self._perfect_xpaths[language] = perfect_xpath
+        return self._perfect_xpaths[language]
+
+    def check_perfect_xpath(self,
+                            perfect_xpath: PerfectXPath,
+                            auxiliary: etree._Element,
+                            sentence: etree._Element,
+                            language: str) -> Optional[Perfect]:
+        """
+        Checks whether this element (i.e. the auxiliary) is the start of a Perfect, cf. check_perfect,
+        but finds the past participle with XPath expressions.
+        Passive Perfects and lexically bound auxiliaries are checked with check_perfect.
+        """
+        rules = self.get_perfect_rules(language)
+        aux_verb = self.read_token(language, auxiliary)
+
+        # Check if the starting auxiliary is actually allowed
+        if rules.aux_words and aux_verb.text.lower() not in rules.aux_words:
+            return None
+
+        for check_preceding in ([False, True] if rules.allow_reversed else [False]):
+            participle = perfect_xpath.find_participle(auxiliary, check_preceding)
+            if participle is None:
+                continue
+
+            past_participle = self.read_token(language, participle)
+            if rules.ppp and (past_participle.lemma == rules.ppp_lemma or
+                              (rules.lexical_bound and rules.lexical_bound in aux_verb.lemma)):
+                return self.check_perfect(auxiliary, language, context=self.get_sentence_context(sentence, language))
+
+            if self.in_lemmata_list(past_participle.lemma):
+                # Only now the sentence is read, so that the Perfect can be marked by the positions of its words
+                context = self.get_sentence_context(sentence, language)
+                pp = Perfect(sentence, context)
+                pp.add_token(context.positions[auxiliary])
+                for w in perfect_xpath.find_gap(auxiliary, participle, check_preceding):
+                    pp.add_token(context.positions[w], in_construction=False)
+                pp.add_token(context.positions[participle])
+                return pp
+
+        return None
+
+    def scan_perfect(self,
+                     context: SentenceContext,
+                     i: int,
+                     language: str,
+                     check_ppc: bool,
+                     check_preceding: bool) -> Tuple[List[int], Optional[int]]:
+        """
+        Scans the siblings of the auxiliary at position i for the token that ends the search for a past participle:
+        a perfect tag, a stop (punctuation or a stop tag) or, if check_ppc is set, a Perfect continuous.
+        Returns the positions of the tokens in between, and the position of that token (or None if there is none).
+        """
+        if self.engine == AUTOMATON:
+            return self.get_perfect_automaton(language).scan_perfect(context, i, check_ppc, check_preceding)
+
+        rules = self.get_perfect_rules(language)
+        texts, lemmata, pos_tags = context.texts, context.lemmata, context.pos_tags
+        gap = []
+        for j in (context.preceding(i) if check_preceding else context.following(i)):
+            pos = pos_tags[j]
+            if pos in rules.perfect_tags or \
+                    (check_ppc and pos in rules.ppc_tags and self.in_lemmata_list(lemmata[j])) or \
+                    texts[j] in string.punctuation or (pos and pos.startswith(rules.stop_tags)):
+                return gap, j
+            gap.append(j)
+        return gap, None
+
     def check_perfect(self,
                       auxiliary: etree._Element,
                       language: str,
                       check_ppp: bool = True,
                       check_ppc: bool = False,
-                      check_preceding: bool = False) -> Optional[Perfect]:
+                      check_preceding: bool = False,
+                      context: Optional[SentenceContext] = None) -> Optional[Perfect]:
         """
         Checks whether this element (i.e. the auxiliary) is the start of a Perfect (pp),
         a Perfect continuous (ppc) or passive Perfect (ppp).
         If it is, the complete construction is returned as a Perfect object.
         If not, None is returned.
+        The SentenceContext of the auxiliary can be passed in to prevent walking the sentence for every candidate.
         """
-        perfect_tags = self.config.get(language, 'perfect_tags').split('|')
-        check_ppp = check_ppp and self.config.getboolean(language, 'ppp')
-        ppp_lemma = self.config.get(language, 'ppp_lemma')
-        check_ppc = check_ppc and self.config.getboolean(language, 'ppc')
-        ppc_tags = self.config.get(language, 'ppc_tags').split('|')
-        stop_tags = tuple(self.config.get(language, 'stop_tags').split('|'))
-        allow_reversed = self.config.getboolean(language, 'allow_reversed')
-
-        # Retrieves the auxiliaries, or a fallback if there are none provided
-        aux_fallback = 'aux_words'
-        aux = aux_fallback + ('_{}'.format(self.tense) if self.tense != PRESENT else '')
-        l_config = self.config[language]
-        aux_words = l_config.get(aux, l_config.get(aux_fallback)).split('|')
+        rules = self.get_perfect_rules(language)
+        check_ppp = check_ppp and rules.ppp
+        ppp_lemma = rules.ppp_lemma
+        check_ppc = check_ppc and rules.ppc
+        aux_words = rules.aux_words
+
+        if context is None:
+            sentence = self.get_sentence(auxiliary)
+            if self.engine == XPATH and check_ppp and not check_ppc and not check_preceding:
+                perfect_xpath = self.get_perfect_xpath(language)
+                if perfect_xpath is not None and perfect_xpath.applies(sentence):
+                    return self.check_perfect_xpath(perfect_xpath, auxiliary, sentence, language)
+            context = self.get_sentence_context(sentence, language)
 
         # Start a potential Perfect
-        s = self.get_sentence(auxiliary)
-        pp = Perfect(s)
-        pp.add_word(self.get_text(auxiliary), self.get_lemma(auxiliary),
-                    self.get_pos(language, auxiliary), self.get_id(auxiliary))
+        i = context.positions[auxiliary]
+        pp = Perfect(context.sentence, context)
+        pp.add_token(i)
         is_pp = False
 
         # Check if the starting auxiliary is actually allowed
         if not check_ppc:
-            if any(aux_words) and self.get_text(auxiliary).lower() not in aux_words:
+            if aux_words and context.texts[i].lower() not in aux_words:
                 return None
 
-        # Loop over the siblings of the current element.
-        siblings = self.get_siblings(auxiliary, self.get_id(s), check_preceding)
-        for sibling in siblings:
-            sibling_text = self.get_text(sibling)
-            sibling_lemma = self.get_lemma(sibling)
-            sibling_pos = self.get_pos(language, sibling)
-            sibling_id = self.get_id(sibling)
-            # If the tag of the sibling is the perfect tag, we found a Perfect!
-            if sibling_pos in perfect_tags:
-                # Check if the sibling is lexically bound to the auxiliary verb
-                # (only if we're not checking for passive Perfect)
-                before = self.get_siblings(auxiliary, self.get_id(s), not check_preceding)
-                if check_ppp and not self.is_lexically_bound(language, pp, auxiliary, sibling, before):
-                    break
-
-                # Check if the lemma is not in the lemmata list, if so break, unless we found a potential ppp
-                if not self.in_lemmata_list(sibling_lemma):
-                    if not(check_ppp and sibling_lemma == ppp_lemma):
-                        break
-
-                pp.add_word(sibling_text, sibling_lemma, sibling_pos, sibling_id)
+        # Find the first sibling that is not a potential non-verb part of the Perfect, add the ones before.
+        gap, j = self.scan_perfect(context, i, language, check_ppc, check_preceding)
+        for k in gap:
+            pp.add_token(k, in_construction=False)
+
+        sibling_lemma = context.lemmata[j] if j is not None else None
+        sibling_pos = context.pos_tags[j] if j is not None else None
+        # If the tag of the sibling is the perfect tag, we found a Perfect!
+        if j is not None and sibling_pos in rules.perfect_tags:
+            # Check if the sibling is lexically bound to the auxiliary verb
+            # (only if we're not checking for passive Perfect)
+            is_bound = True
+            if check_ppp:
+                before = [context.token(k) for k in
+                          (context.following(i) if check_preceding else context.preceding(i))]
+                is_bound = self.is_token_lexically_bound(language, pp, context.token(i), context.token(j), before)
+
+            # Check if the lemma is not in the lemmata list, if so stop, unless we found a potential ppp
+            if is_bound and (self.in_lemmata_list(sibling_lemma) or (check_ppp and sibling_lemma == ppp_lemma)):
+                pp.add_token(j)
                 is_pp = True
 
                 # ... now check whether this is a passive Perfect or Perfect continuous (by recursion)
                 if check_ppp and sibling_lemma == ppp_lemma:
-                    ppp = self.check_perfect(sibling, language,
+                    ppp = self.check_perfect(context.tokens[j], language,
                                              check_ppp=False,
                                              check_ppc=True,
-                                             check_preceding=check_preceding)
+                                             check_preceding=check_preceding,
+                                             context=context)
                     if ppp:
                         pp.extend(ppp)
                     elif not self.in_lemmata_list(sibling_lemma):
                         is_pp = False
-                break
-            # Check if this is a Perfect continuous (in the recursion step)
-            elif check_ppc and sibling_pos in ppc_tags and self.in_lemmata_list(sibling_lemma):
-                pp.add_word(sibling_text, sibling_lemma, sibling_pos, sibling_id)
-                pp.is_continuous = True
-                is_pp = True
-                break
-            # Stop looking at punctuation or stop tags
-            elif (sibling_text in string.punctuation) or (sibling_pos and sibling_pos.startswith(stop_tags)):
-                break
-            # We didn't break yet? Then add this sibling as a potential non-verb part of the Perfect.
-            else:
-                pp.add_word(sibling_text, sibling_lemma, sibling_pos, sibling_id, in_construction=False)
+        # Check if this is a Perfect continuous (in the recursion step)
+        elif j is not None and check_ppc and sibling_pos in rules.ppc_tags and self.in_lemmata_list(sibling_lemma):
+            pp.add_token(j)
+            pp.is_continuous = True
+            is_pp = True
+        # Otherwise, we stopped at punctuation or a stop tag (or at the end of the sentence).
 
         # If we haven't yet found a past participle, and we are allowed to look in the other direction,
         # try to find a past participle by looking backwards in the sentence.
-        if not is_pp and allow_reversed and not check_preceding:
-            pp = self.check_perfect(auxiliary, language, check_ppp=check_ppp, check_preceding=True)
+        if not is_pp and rules.allow_reversed and not check_preceding:
+            pp = self.check_perfect(auxiliary, language, check_ppp=check_ppp, check_preceding=True, context=context)
             if pp:
                 is_pp = True
 
@@ -208,7 +432,7 @@ class PerfectExtractor(BaseExtractor, ABC):
         Returns whether the given element is in the lemmata list.
         Returns True when there is no lemmata list given.
         """
-        return not self.lemmata_list or lemma in self.lemmata_list
+        return not self.lemmata_list or lemma in self.lemmata_set
 
     def find_translated_present_perfects(self, translated_tree, language_to, translated_lines):
         """
@@ -220,7 +444,7 @@ class PerfectExtractor(BaseExtractor, ABC):
 
         if translated_lines and any(translated_lines):
             for t in translated_lines:
-                sentence, translation, translated_pp = self.get_line_and_pp(translated_tree, language_to, t)
+                sentence, translation, translated_pp = self.get_translated_line_and_pp(translated_tree, language_to, t)
                 translated_pps.append(translated_pp)
                 translated_sentences.append(sentence)
                 translated_marked_sentences.append(translation)
@@ -231,12 +455,9 @@ class PerfectExtractor(BaseExtractor, ABC):
         """
         Checks whether the translated Perfects found form an actual translation of the Perfect.
         """
-        results = []
-        for tpp in translated_present_perfects:
-            if tpp:
-                translations = get_translations(pp.perfect_lemma(), self.l_from, language_to)
-                if tpp.perfect_lemma() in translations:
-                    results.append('yes')
-                else:
-                    results.append('unknown')
-        return results
+        if not any(translated_present_perfects):
+            return []
+
+        translations = self.lexicon.get_translations(pp.perfect_lemma(), self.l_from, language_to)
+        return ['yes' if tpp.perfect_lemma() in translations else 'unknown'
+                for tpp in translated_present_perfects if tpp]
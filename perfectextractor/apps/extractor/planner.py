@@ -0,0 +1,67 @@
+from typing import FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from lxml import etree
+
+
+class FilterPlan:
+    """
+    Plans the filters of an extractor, so that the cheapest filters run first,
+    and the expensive work (matching constructions, rendering translations) is skipped
+    for the sentences and words that cannot end up in the results:
+    - file names are filtered before any file is opened (see BaseExtractor.collect_file_names)
+    - sentence ids are looked up in a set while the sentences are parsed,
+      and parsing stops once all sentences have been found
+    - the position is checked on the candidate words before these are matched
+    Token ids are already looked up in a set in the XPath expression that finds the words (see PoSExtractor).
+    """
+    def __init__(self,
+                 id_attr: str,
+                 sentence_ids: Optional[Sequence[str]] = None,
+                 position: Optional[int] = None) -> None:
+        """
+        :param id_attr: the attribute that holds the id of sentences and words
+        :param sentence_ids: the ids of the sentences to search in (if any)
+        :param position: the position of the searched word in the sentence (if any)
+        """
+        self.id_attr = id_attr
+        self.sentence_ids: Optional[FrozenSet[str]] = frozenset(sentence_ids) if sentence_ids else None
+        self.position_suffix: Optional[str] = '.' + str(position) if position else None
+
+    def filter_sentences(self,
+                         s_trees: Iterable[Tuple[str, etree._Element]]) -> Iterator[Tuple[str, etree._Element]]:
+        """
+        Yields the (event, sentence) pairs of the sentences with the given ids.
+        As sentence ids are unique within a document, parsing stops once all given ids have been found.
+        """
+        if self.sentence_ids is None:
+            yield from s_trees
+            return
+
+        remaining = set(self.sentence_ids)
+        for event, s in s_trees:
+            sentence_id = s.get(self.id_attr)
+            if sentence_id in remaining:
+                yield event, s
+                remaining.discard(sentence_id)
+                if not remaining:
+                    break
+
+    def accepts_id(self, word_id: str) -> bool:
+        """
+        Returns whether a word with the given id is in the given position.
+        """
+        return self.position_suffix is None or word_id.endswith(self.position_suffix)
+
+    def accepts_word(self, word: etree._Element) -> bool:
+        """
+        Returns whether the given word is in the given position.
+        """
+        return self.accepts_id(word.get(self.id_attr, '?'))
+
+    def filter_words(self, words: List[etree._Element]) -> List[etree._Element]:
+        """
+        Filters the candidate words down to those in the given position.
+        """
+        if self.position_suffix is None:
+            return words
+        return [w for w in words if self.accepts_word(w)]
@@ -1,11 +1,24 @@
 from abc import ABC
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, FrozenSet, Iterator, List, Optional, Sequence, Tuple
 
 from lxml import etree
 
 from .base import BaseExtractor
+from .batch import BatchDispatcher, BatchQuery
+from .matcher import RegexMatcher
 from .models import MultiWordExpression
 
+# The namespace of the XPath extension functions
+FUNCTIONS_URL = 'https://github.com/UUDigitalHumanitieslab/perfectextractor/functions'
+
+# The attributes of a word the regular expressions can be matched against
+REGEX_WORD = 'word'
+REGEX_LEMMA = 'lemma'
+REGEX_POS = 'pos'
+
+# The column in the results from which the query and the regular expression that matched are added (if given)
+MATCH_COLUMN = 6
+
 
 class PoSExtractor(BaseExtractor, ABC):
     def __init__(self,
@@ -13,6 +26,8 @@ class PoSExtractor(BaseExtractor, ABC):
                  languages_to: Optional[List[str]] = None,
                  pos: Optional[List[str]] = None,
                  regex: Optional[List[str]] = None,
+                 regex_target: str = REGEX_WORD,
+                 queries: Optional[List[BatchQuery]] = None,
                  **kwargs) -> None:
         """
         Initializes the extractor for the given source and target language(s).
@@ -21,35 +36,60 @@ class PoSExtractor(BaseExtractor, ABC):
         :param languages_to: the target language(s)
         :param pos: A list of part-of-speech tags
         :param regex: A list of regular expressions
+        :param regex_target: the attribute the regular expressions are matched against (word, lemma or pos)
+        :param queries: A batch of queries, that are all evaluated in a single pass (see read_queries)
         """
         super().__init__(language_from, languages_to, **kwargs)
 
         self.pos = pos
         self.regex = regex
+        self.regex_target = regex_target
+        self.regex_matcher = RegexMatcher(regex) if regex else None
+        self.queries = queries
+        self.dispatcher = BatchDispatcher(queries) if queries else None
+
+    def get_filter_sets(self) -> Dict[str, FrozenSet[str]]:
+        """
+        Returns the sets of values the attributes of a word are filtered upon, by name.
+        """
+        result = dict(tokens=frozenset(self.tokens or ()),
+                      lemmata=self.lemmata_set,
+                      pos=frozenset(self.pos or ()))
+        if self.dispatcher is not None:
+            result['batch_lemmata'] = frozenset(self.dispatcher.by_lemma)
+            result['batch_pos'] = frozenset(self.dispatcher.by_pos)
+        return result
 
     def prepare_xpath(self) -> Tuple[str, Dict[str, str]]:
+        """
+        Prepares the XPath expression to find words, and the namespaces it uses.
+        Filters on tokens, lemmata and part-of-speech tags are looked up in sets by the extension function
+        pe:in-set (see compile_xpath), so that their cost does not depend on the number of values.
+        """
         id_attr = self.config.get('all', 'id')
         lemma_attr = self.config.get('all', 'lemma_attr')
         pos_attr = self.config.get(self.l_from, 'pos', fallback=self.config.get('all', 'pos'))
 
         ns = {}
-        predicate = 'contains(" {value} ", concat(" ", @{element}, " "))'
+        predicate = 'pe:in-set(@{element}, "{name}")'
         predicates = []
 
         if self.tokens:
-            predicates.append(predicate.format(element=id_attr, value=' '.join(self.tokens.keys())))
+            predicates.append(predicate.format(element=id_attr, name='tokens'))
         if self.lemmata_list:
-            predicates.append(predicate.format(element=lemma_attr, value=' '.join(self.lemmata_list)))
+            predicates.append(predicate.format(element=lemma_attr, name='lemmata'))
         if self.pos:
-            predicates.append(predicate.format(element=pos_attr, value=' '.join(self.pos)))
-        if self.regex:
-            # prepare a pattern that combines multiple regexps using OR operators
-            # and non-capturing groups
-            pattern = '|'.join('(?:{})'.format(r) for r in self.regex)
-
-            # special namespace required for enabling regular expression functions
-            ns = {"re": "http://exslt.org/regular-expressions"}
-            predicates.append('re:test(., "{pattern}", "i")'.format(pattern=pattern))
+            predicates.append(predicate.format(element=pos_attr, name='pos'))
+        if self.dispatcher is not None and self.dispatcher.is_indexed:
+            # Only the words with the lemmata or part-of-speech tags of the queries can match
+            indexed = []
+            if self.dispatcher.by_lemma:
+                indexed.append(predicate.format(element=lemma_attr, name='batch_lemmata'))
+            if self.dispatcher.by_pos:
+                indexed.append(predicate.format(element=pos_attr, name='batch_pos'))
+            predicates.append('({})'.format(' or '.join(indexed)))
+        if predicates:
+            ns['pe'] = FUNCTIONS_URL
 
         xpath = './/' + self.word_tag
         if predicates:
@@ -57,21 +97,104 @@ class PoSExtractor(BaseExtractor, ABC):
 
         return xpath, ns
 
+    def compile_xpath(self) -> etree.XPath:
+        """
+        Compiles the XPath expression to find words, with the namespaces of the corpus and the extension functions.
+        The regular expressions are not part of this expression: these are matched in find_words.
+        """
+        xpath, ns = self.prepare_xpath()
+        ns.update(self.namespaces or {})
+
+        filter_sets = self.get_filter_sets()
+
+        def in_set(_, values: Sequence[str], name: str) -> bool:
+            # The values are the attribute values of the word (i.e. none if the attribute is missing)
+            return any(value in filter_sets[name] for value in values)
+
+        return etree.XPath(xpath, namespaces=ns, extensions={(FUNCTIONS_URL, 'in-set'): in_set})
+
+    def get_regex_value(self, word: etree._Element) -> str:
+        """
+        Returns the value of the word the regular expressions are matched against (i.e. the regex target).
+        """
+        if self.regex_target == REGEX_LEMMA:
+            return self.get_lemma(word)
+        elif self.regex_target == REGEX_POS:
+            return self.get_pos(self.l_from, word)
+        else:
+            return self.get_text(word)
+
+    def match_regex(self, word: etree._Element) -> Optional[str]:
+        """
+        Returns the regular expression that matches the word (on the regex target), or None if none does.
+        """
+        return self.regex_matcher.match(self.get_regex_value(word))
+
+    def dispatch(self, word: etree._Element) -> List[str]:
+        """
+        Returns the ids of the queries in the batch that the word matches.
+        """
+        return self.dispatcher.dispatch(self.get_lemma(word), self.get_pos(self.l_from, word),
+                                        self.get_regex_value(word))
+
+    def find_words(self,
+                   sentence: etree._Element,
+                   find_words: etree.XPath) -> Iterator[Tuple[etree._Element, Optional[str], Optional[str]]]:
+        """
+        Finds the words in a sentence with the compiled XPath expression (see compile_xpath),
+        and filters these on their position and the regular expressions (if given), in that order.
+        Yields the words, with the regular expression that matched and the id of the query.
+        In case of a batch of queries, a word is yielded for every query it matches.
+        """
+        for word in find_words(sentence):
+            if not self.plan.accepts_word(word):
+                continue
+
+            pattern = None
+            if self.regex_matcher is not None:
+                pattern = self.match_regex(word)
+                if pattern is None:
+                    continue
+
+            if self.dispatcher is None:
+                yield word, pattern, None
+            else:
+                for query_id in self.dispatch(word):
+                    yield word, pattern, query_id
+
+    def generate_header(self) -> List[str]:
+        header = super().generate_header()
+        if self.regex:
+            header.insert(MATCH_COLUMN, 'regex')
+        if self.queries:
+            header.insert(MATCH_COLUMN, 'query')
+        return header
+
+    def generate_result_line(self,
+                             filename: str,
+                             sentence: etree._Element,
+                             mwe: MultiWordExpression = None,
+                             pattern: Optional[str] = None,
+                             query_id: Optional[str] = None) -> List[Optional[str]]:
+        """
+        Returns a single result line, with the query and the regular expression that matched (if given).
+        """
+        result = super().generate_result_line(filename, sentence, mwe)
+        if self.regex:
+            result.insert(MATCH_COLUMN, pattern or '')
+        if self.queries:
+            result.insert(MATCH_COLUMN, query_id or '')
+        return result
+
     def preprocess_found(self, word: etree._Element) -> List[etree._Element]:
         """
         Preprocesses the found word:
-        - removes a word if it does not occur in the lemmata list
-        - removes a word if it is not in the correct position in the sentence
         - captures the next element for an extraction of tokens
         Returns the found word as a list, as it might be interesting to include words before and after
         (see e.g. OPUSFrenchArticleExtractor)
         """
         result = [word]
 
-        # TODO: check if this is generic
-        if self.position and not self.get_id(word).endswith('.' + str(self.position)):
-            result = []
-
         if self.tokens:
             end_token = self.tokens.get(self.get_id(word))
             # If the end_token is the same as the start_token, we're done, otherwise continue
@@ -0,0 +1,92 @@
+import string
+from typing import Dict, List
+
+from .models import SentenceContext
+from .rules import PerfectRules
+
+# Classes of tokens: tokens that can end a Perfect, and tokens that stop the search for one
+OTHER = 0
+PERFECT = 1
+STOP = 2
+
+
+class PerfectPrefilter:
+    """
+    Finds the positions in a sentence that could start a Perfect, so that check_perfect only runs on those.
+    A position can start a Perfect if its text is one of the auxiliaries (if these are given for the language),
+    and if a token with a perfect tag is found before a stop (punctuation or a stop tag),
+    following the position or preceding it (if the language allows reversed Perfects).
+    Part-of-speech tags are dictionary-encoded, so that every tag is classified only once.
+    """
+    def __init__(self, rules: PerfectRules) -> None:
+        self.rules = rules
+
+        self._codes: Dict[str, int] = dict()
+        self._classes: List[int] = []
+
+    def encode(self, pos: str) -> int:
+        """
+        Returns the code for a part-of-speech tag, classifying the tag if it has not been seen yet.
+        """
+        code = self._codes.get(pos)
+        if code is None:
+            code = len(self._classes)
+            self._codes[pos] = code
+            if pos in self.rules.perfect_tags:
+                self._classes.append(PERFECT)
+            elif pos and pos.startswith(self.rules.stop_tags):
+                self._classes.append(STOP)
+            else:
+                self._classes.append(OTHER)
+        return code
+
+    def classify(self, context: SentenceContext) -> List[int]:
+        """
+        Returns the class of each token in the sentence.
+        This mirrors the order of the checks in check_perfect: the perfect tag takes precedence over a stop.
+        """
+        classes = [self._classes[self.encode(pos)] for pos in context.pos_tags]
+        for i, text in enumerate(context.texts):
+            if classes[i] == OTHER and text in string.punctuation:
+                classes[i] = STOP
+        return classes
+
+    def find_starts(self, context: SentenceContext) -> List[bool]:
+        """
+        Returns, per position in the sentence, whether a Perfect could start there.
+        """
+        result = self._find_starts(context, self.classify(context))
+
+        aux_words = self.rules.aux_words
+        if aux_words:
+            result = [r and text.lower() in aux_words for r, text in zip(result, context.texts)]
+        return result
+
+    def _find_starts(self, context: SentenceContext, classes: List[int]) -> List[bool]:
+        """
+        Finds the possible starts of Perfects with a single pass over the sentence in both directions.
+        """
+        n = len(classes)
+        forward = [False] * n
+        backward = [False] * n
+
+        # Walking backwards, keep track of the class of the first non-gap token following each position
+        following = OTHER
+        for i in range(n - 1, -1, -1):
+            if i + 1 == context.bounds[i][1]:
+                following = OTHER
+            forward[i] = following == PERFECT
+            if classes[i] != OTHER:
+                following = classes[i]
+
+        if self.rules.allow_reversed:
+            # Walking forwards, keep track of the class of the first non-gap token preceding each position
+            preceding = OTHER
+            for i in range(n):
+                if i == context.bounds[i][0]:
+                    preceding = OTHER
+                backward[i] = preceding == PERFECT
+                if classes[i] != OTHER:
+                    preceding = classes[i]
+
+        return [f or b for f, b in zip(forward, backward)]
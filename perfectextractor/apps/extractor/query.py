@@ -0,0 +1,221 @@
+import re
+from typing import Callable, Dict, List, Optional, Pattern, Sequence, Set, Tuple
+
+from .models import SentenceContext, Token
+
+# The attributes that can be queried, and the field of the Token they refer to
+ATTRIBUTES = {'word': 'text', 'lemma': 'lemma', 'lem': 'lemma', 'pos': 'pos', 'id': 'xml_id'}
+
+# Tokens are encoded as a single character (from BASE onwards) per distinct combination of matching patterns.
+# NONE is never used for a token: it keeps the character class of a pattern that no token matched yet valid.
+BASE = 0x100
+NONE = chr(BASE - 1)
+
+LEXER = re.compile(r'\s*(?:(?P<string>"(?:[^"\\]|\\.)*")|(?P<repeat>\{\s*\d*\s*(?:,\s*\d*\s*)?\})|'
+                   r'(?P<name>\w+)|(?P<symbol>!=|%c|[][=!&|()?*+]))')
+
+# A predicate on a single Token
+Predicate = Callable[[Token], bool]
+
+
+class Parser:
+    """
+    Parses a query in (a subset of) the Corpus Query Language, e.g. [lemma="seit"] [pos="CARD"] [lemma="Jahr|Monat"].
+    A query is a sequence of token patterns, each optionally followed by a quantifier (?, *, +, {n}, {n,m}).
+    A token pattern is either [] (any token), "value" (short for [word="value"])
+    or a condition between square brackets on the attributes word, lemma (or lem), pos and id.
+    Conditions are combined with & (and), | (or), ! (not) and parentheses.
+    Values are regular expressions that have to match the complete attribute, %c makes them case-insensitive.
+    """
+    def __init__(self, query: str) -> None:
+        self.query = query
+        self.tokens: List[Tuple[str, str]] = []
+        self.i = 0
+        self.fields: Set[str] = set()  # the fields of the Token that are queried
+
+        position = 0
+        query = query.rstrip()
+        while position < len(query):
+            m = LEXER.match(query, position)
+            if m is None:
+                raise ValueError('Invalid query {!r}: unexpected {!r}'.format(self.query, query[position:]))
+            self.tokens.append((m.lastgroup, m.group(m.lastgroup)))
+            position = m.end()
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.i][1] if self.i < len(self.tokens) else None
+
+    def next(self, kind: Optional[str] = None) -> str:
+        if self.i >= len(self.tokens) or (kind and self.tokens[self.i][0] != kind):
+            raise ValueError('Invalid query {!r}: expected {}'.format(self.query, kind or 'more input'))
+        self.i += 1
+        return self.tokens[self.i - 1][1]
+
+    def expect(self, symbol: str) -> None:
+        if self.peek() != symbol:
+            raise ValueError('Invalid query {!r}: expected {!r}'.format(self.query, symbol))
+        self.i += 1
+
+    def parse(self) -> List[Tuple[str, Optional[Predicate], str]]:
+        """
+        Returns the token patterns of the query, as tuples of their source, their predicate and their quantifier.
+        The predicate is None for a pattern that matches any token.
+        """
+        result = []
+        while self.i < len(self.tokens):
+            start = self.i
+            if self.peek() == '[':
+                self.next()
+                predicate = None
+                if self.peek() != ']':
+                    predicate = self.parse_or()
+                self.expect(']')
+            else:
+                predicate = self.parse_value('text')
+            source = ' '.join(value for _, value in self.tokens[start:self.i])
+
+            quantifier = ''
+            if self.peek() in ('?', '*', '+') or (self.i < len(self.tokens) and self.tokens[self.i][0] == 'repeat'):
+                quantifier = re.sub(r'\s', '', self.next())
+            result.append((source, predicate, quantifier))
+
+        if not result:
+            raise ValueError('Invalid query {!r}: no token patterns'.format(self.query))
+        return result
+
+    def parse_or(self) -> Predicate:
+        predicates = [self.parse_and()]
+        while self.peek() == '|':
+            self.next()
+            predicates.append(self.parse_and())
+        return predicates[0] if len(predicates) == 1 else lambda token: any(p(token) for p in predicates)
+
+    def parse_and(self) -> Predicate:
+        predicates = [self.parse_not()]
+        while self.peek() == '&':
+            self.next()
+            predicates.append(self.parse_not())
+        return predicates[0] if len(predicates) == 1 else lambda token: all(p(token) for p in predicates)
+
+    def parse_not(self) -> Predicate:
+        if self.peek() == '!':
+            self.next()
+            predicate = self.parse_not()
+            return lambda token: not predicate(token)
+        if self.peek() == '(':
+            self.next()
+            predicate = self.parse_or()
+            self.expect(')')
+            return predicate
+
+        name = self.next('name')
+        if name not in ATTRIBUTES:
+            raise ValueError('Invalid query {!r}: unknown attribute {!r}'.format(self.query, name))
+        operator = self.peek()
+        if operator not in ('=', '!='):
+            raise ValueError('Invalid query {!r}: expected = or != after {!r}'.format(self.query, name))
+        self.next()
+
+        predicate = self.parse_value(ATTRIBUTES[name])
+        if operator == '!=':
+            return lambda token: not predicate(token)
+        return predicate
+
+    def parse_value(self, field: str) -> Predicate:
+        self.fields.add(field)
+        value = self.next('string')[1:-1].replace('\\"', '"')
+        flags = 0
+        if self.peek() == '%c':
+            self.next()
+            flags = re.IGNORECASE
+        try:
+            pattern = re.compile(value, flags)
+        except re.error as e:
+            raise ValueError('Invalid query {!r}: {}'.format(self.query, e))
+        return lambda token: pattern.fullmatch(getattr(token, field)) is not None
+
+
+class Query:
+    """
+    A compiled query over the tokens of a sentence.
+    Every token is encoded as a single character, which stands for the combination of (distinct) token patterns
+    that it matches. The characters are assigned to these combinations as they are found.
+    The sequence of patterns and quantifiers is then compiled into a regular expression over the encoded sentence,
+    which is compiled again once a new combination is found.
+    As the encoding of a token only depends on its attributes, it is kept for subsequent occurrences.
+    """
+    def __init__(self, query: str) -> None:
+        self.query = query
+
+        parser = Parser(query)
+        self.elements = parser.parse()
+        self.sources: Dict[str, int] = dict()
+        self.predicates: List[Predicate] = []
+        for source, predicate, _ in self.elements:
+            if predicate is not None and source not in self.sources:
+                self.sources[source] = len(self.predicates)
+                self.predicates.append(predicate)
+
+        self._masks: List[int] = []  # the combination of matching patterns (as a bitmask) per character
+        self._mask_codes: Dict[int, str] = dict()
+        try:
+            self._pattern: Optional[Pattern] = self.compile()
+        except re.error as e:
+            raise ValueError('Invalid query {!r}: {}'.format(query, e))
+
+        self.uses_id = 'xml_id' in parser.fields
+        self._codes: Dict[Tuple[str, ...], str] = dict()
+
+    def compile(self) -> Pattern:
+        """
+        Compiles the regular expression over the encoded sentence, for the combinations of patterns found so far.
+        """
+        parts = []
+        for source, predicate, quantifier in self.elements:
+            if predicate is None:
+                parts.append('.' + quantifier)
+            else:
+                bit = 1 << self.sources[source]
+                codes = ''.join(chr(BASE + i) for i, mask in enumerate(self._masks) if mask & bit)
+                parts.append('[{}{}]{}'.format(NONE, codes, quantifier))
+        return re.compile(''.join(parts), re.DOTALL)
+
+    @property
+    def pattern(self) -> Pattern:
+        if self._pattern is None:
+            self._pattern = self.compile()
+        return self._pattern
+
+    def encode_token(self, token: Token) -> str:
+        """
+        Returns the character that encodes which token patterns match the given Token.
+        """
+        key = token if self.uses_id else token[:3]
+        code = self._codes.get(key)
+        if code is None:
+            mask = 0
+            for i, predicate in enumerate(self.predicates):
+                if predicate(token):
+                    mask |= 1 << i
+            code = self._mask_codes.get(mask)
+            if code is None:
+                code = chr(BASE + len(self._masks))
+                self._masks.append(mask)
+                self._mask_codes[mask] = code
+                self._pattern = None
+            if not self.uses_id:
+                self._codes[key] = code
+        return code
+
+    def encode(self, tokens: Sequence[Token]) -> str:
+        """
+        Encodes a sequence of Tokens.
+        """
+        return ''.join([self.encode_token(token) for token in tokens])
+
+    def find(self, context: SentenceContext) -> List[Tuple[int, int]]:
+        """
+        Returns the start and end positions of the (non-overlapping, non-empty) matches of the query in a sentence.
+        """
+        encoded = self.encode([context.token(i) for i in range(len(context))])
+        return [m.span() for m in self.pattern.finditer(encoded) if m.end() > m.start()]
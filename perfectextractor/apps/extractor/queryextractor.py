@@ -0,0 +1,51 @@
+from abc import ABC
+from functools import partial
+from typing import List, Optional
+
+from lxml import etree
+
+from .base import BaseExtractor
+from .models import MultiWordExpression, SentenceContext
+from .query import Query
+
+
+class QueryExtractor(BaseExtractor, ABC):
+    def __init__(self,
+                 language_from: str,
+                 languages_to: Optional[List[str]] = None,
+                 query: Optional[str] = None,
+                 **kwargs) -> None:
+        """
+        Initializes the extractor for the given source and target language(s).
+        Compiles the query to search for.
+        :param language_from: the source language
+        :param languages_to: the target language(s)
+        :param query: a query in (a subset of) the Corpus Query Language, e.g. [lemma="seit"] [pos="CARD"]
+        """
+        super().__init__(language_from, languages_to, **kwargs)
+
+        if not query:
+            raise ValueError('No query given')
+        self.query = Query(query)
+
+    def find_matches(self, sentence: etree._Element, words: List[etree._Element]) -> List[MultiWordExpression]:
+        """
+        Returns the matches of the query in a sentence, given its words (in reading order).
+        Matches that do not start at the given position (if any) are skipped.
+        """
+        # If no word is in the given position, there is no need to match the query
+        if not any(self.plan.accepts_word(w) for w in words):
+            return []
+
+        context = SentenceContext(sentence, [words], partial(self.read_token, self.l_from))
+
+        result = []
+        for start, end in self.query.find(context):
+            if not self.plan.accepts_id(context.ids[start]):
+                continue
+
+            mwe = MultiWordExpression(sentence, context)
+            for i in range(start, end):
+                mwe.add_token(i)
+            result.append(mwe)
+        return result
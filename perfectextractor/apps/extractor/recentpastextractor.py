@@ -1,11 +1,12 @@
 from abc import ABC
 import string
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from lxml import etree
 
 from .base import BaseExtractor
-from .models import MultiWordExpression
+from .models import MultiWordExpression, SentenceContext
+from .rules import RecentPastRules
 
 
 class RecentPastExtractor(BaseExtractor, ABC):
@@ -23,55 +24,77 @@ class RecentPastExtractor(BaseExtractor, ABC):
 
         self.check_language_in_config(language_from)
 
-    def check_recent_past(self, w: etree._Element, language: str) -> Optional[MultiWordExpression]:
+        # The rules per language are compiled on first use
+        self._recent_past_rules: Dict[str, RecentPastRules] = dict()
+
+    def get_recent_past_rules(self, language: str) -> RecentPastRules:
+        """
+        Returns the compiled rules to find recent pasts for the given language.
+        """
+        if language not in self._recent_past_rules:
+            self._recent_past_rules[language] = RecentPastRules.from_config(self.config, language)
+        return self._recent_past_rules[language]
+
+    def check_recent_past(self,
+                          w: etree._Element,
+                          language: str,
+                          context: Optional[SentenceContext] = None) -> Optional[MultiWordExpression]:
         """
         Checks if the element w is the start of a recent past construction
         :param w: the starting element
         :param language: the language
+        :param context: the SentenceContext of w (built from the sentence if not given)
         :return: if found, the recent past construction as a MultiWordExpression, otherwise None
         """
         is_recent_past = False
 
-        # Retrieve the configuration variables
-        rp_pre_pos = self.config.get(language, 'rp_pre_pos').split('|')
-        rp_pre_lem = self.config.get(language, 'rp_pre_lem')
-        rp_inf_pos = self.config.get(language, 'rp_inf_pos')
-        check_ppp = self.config.get(language, 'ppp')
-        ppp_lemma = self.config.get(language, 'ppp_lemma')
-        perfect_tags = self.config.get(language, 'perfect_tags').split('|')
-        stop_tags = tuple(self.config.get(language, 'stop_tags').split('|'))
+        # Retrieve the compiled rules
+        rules = self.get_recent_past_rules(language)
+        rp_pre_pos = rules.rp_pre_pos
+        rp_pre_lem = rules.rp_pre_lem
+        rp_inf_pos = rules.rp_inf_pos
+        check_ppp = rules.ppp
+        ppp_lemma = rules.ppp_lemma
+        perfect_tags = rules.perfect_tags
+        stop_tags = rules.stop_tags
 
-        sentence = self.get_sentence(w)
+        if context is None:
+            context = self.get_sentence_context(self.get_sentence(w), language)
+        texts, lemmata, pos_tags = context.texts, context.lemmata, context.pos_tags
 
         # Start a new MWE at the first word
-        mwe = MultiWordExpression(sentence)
-        mwe.add_word(self.get_text(w), self.get_lemma(w), self.get_pos(language, w), self.get_id(w))
+        i = context.positions[w]
+        mwe = MultiWordExpression(context.sentence, context)
+        mwe.add_token(i)
 
         # Check the siblings for the preposition of the recent past construction
-        for pre in self.get_siblings(w, self.get_id(sentence), False):
-            pre_text = self.get_text(pre)
-            pre_lem = self.get_lemma(pre)
-            pre_pos = self.get_pos(language, pre)
-            pre_id = self.get_id(pre)
+        for j in context.following(i):
+            pre_text = texts[j]
+            pre_lem = lemmata[j]
+            pre_pos = pos_tags[j]
             if pre_pos in rp_pre_pos and pre_lem == rp_pre_lem:
-                mwe.add_word(pre_text, pre_lem, pre_pos, pre_id)
+                mwe.add_token(j)
 
                 # Now look at the siblings to find an infinitive
-                for inf in self.get_siblings(pre, self.get_id(sentence), False):
-                    inf_text = self.get_text(inf)
-                    inf_lem = self.get_lemma(inf)
-                    inf_pos = self.get_pos(language, inf)
-                    inf_id = self.get_id(inf)
+                for k in context.following(j):
+                    inf_text = texts[k]
+                    inf_lem = lemmata[k]
+                    inf_pos = pos_tags[k]
                     if inf_pos == rp_inf_pos:
                         is_recent_past = True
-                        mwe.add_word(inf_text, inf_lem, inf_pos, inf_id)
+                        mwe.add_token(k)
 
                         # If the language has passive recent pasts, check if this is followed by a perfect
                         if check_ppp and inf_lem == ppp_lemma:
-                            s_next = inf.getnext()
-                            if s_next is not None and self.get_pos(language, s_next) in perfect_tags:
-                                mwe.add_word(self.get_text(s_next), self.get_lemma(s_next),
-                                             self.get_pos(language, s_next), self.get_id(s_next))
+                            s_next = context.tokens[k].getnext()
+                            if s_next is not None:
+                                next_position = context.positions.get(s_next)
+                                if next_position is not None:
+                                    next_token = context.token(next_position)
+                                else:
+                                    next_token = self.read_token(language, s_next)
+                                if next_token.pos in perfect_tags:
+                                    mwe.add_word(*next_token, position=next_position)
 
                         # Break out of the loop: we found our recent past construction
                         break
@@ -80,7 +103,7 @@ class RecentPastExtractor(BaseExtractor, ABC):
                         break
                     # Otherwise: add the word to the MWE
                     else:
-                        mwe.add_word(inf_text, inf_lem, inf_pos, inf_id, in_construction=False)
+                        mwe.add_token(k, in_construction=False)
 
                 # If we found our recent past construction: break out of the loop
                 if is_recent_past:
@@ -90,6 +113,6 @@ class RecentPastExtractor(BaseExtractor, ABC):
                 break
             # Otherwise: add the word to the MWE
             else:
-                mwe.add_word(pre_text, pre_lem, pre_pos, pre_id, in_construction=False)
+                mwe.add_token(j, in_construction=False)
 
         return mwe if is_recent_past else None
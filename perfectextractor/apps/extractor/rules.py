@@ -0,0 +1,128 @@
+from typing import Dict, FrozenSet, Iterable, NamedTuple, Tuple
+
+from .utils import CachedConfig
+
+
+def split_set(value: str) -> FrozenSet[str]:
+    """
+    Splits a |-separated config value into a frozenset.
+    """
+    return frozenset(value.split('|'))
+
+
+def split_nonempty_set(value: str) -> FrozenSet[str]:
+    """
+    Splits a |-separated config value into a frozenset, ignoring empty values.
+    """
+    return frozenset(v for v in value.split('|') if v)
+
+
+def split_prefixes(value: str) -> Tuple[str, ...]:
+    """
+    Splits a |-separated config value into a tuple, to be used in str.startswith.
+    """
+    return tuple(value.split('|'))
+
+
+def get_attributes(config: CachedConfig, language: str) -> Dict[str, str]:
+    """
+    Returns the names of the id, lemma and part-of-speech attributes for a language.
+    """
+    return dict(id_attr=config.get('all', 'id'),
+                lemma_attr=config.get('all', 'lemma_attr'),
+                pos_attr=config.get(language, 'pos', fallback=config.get('all', 'pos')))
+
+
+class PerfectRules(NamedTuple):
+    """
+    The rules to find Perfects in a language, compiled once from the config.
+    Rule objects are immutable (and can thus be shared and pickled).
+    """
+    perfect_tags: FrozenSet[str]
+    stop_tags: Tuple[str, ...]
+    ppp: bool
+    ppp_lemma: str
+    ppc: bool
+    ppc_tags: FrozenSet[str]
+    allow_reversed: bool
+    aux_words: FrozenSet[str]
+    lexical_bound: str
+    aux_be: FrozenSet[str]
+    reflexive_lemmata: FrozenSet[str]
+    id_attr: str
+    lemma_attr: str
+    pos_attr: str
+
+    @classmethod
+    def from_config(cls,
+                    config: CachedConfig,
+                    language: str,
+                    aux_words_option: str = 'aux_words',
+                    aux_be: Iterable[str] = ()) -> 'PerfectRules':
+        """
+        Compiles the rules for a language.
+        :param config: the config
+        :param language: the language
+        :param aux_words_option: the option for the auxiliaries (this depends on the tense), falls back to aux_words
+        :param aux_be: the verbs that use 'to be' as auxiliary verb
+        """
+        l_config = config[language]
+        return cls(
+            perfect_tags=split_set(config.get(language, 'perfect_tags')),
+            stop_tags=split_prefixes(config.get(language, 'stop_tags')),
+            ppp=config.getboolean(language, 'ppp'),
+            ppp_lemma=config.get(language, 'ppp_lemma'),
+            ppc=config.getboolean(language, 'ppc'),
+            ppc_tags=split_set(config.get(language, 'ppc_tags')),
+            allow_reversed=config.getboolean(language, 'allow_reversed'),
+            aux_words=split_nonempty_set(l_config.get(aux_words_option, l_config.get('aux_words'))),
+            lexical_bound=config.get(language, 'lexical_bound'),
+            aux_be=frozenset(aux_be),
+            reflexive_lemmata=split_nonempty_set(config.get(language, 'reflexive_lemmata')),
+            **get_attributes(config, language))
+
+
+class RecentPastRules(NamedTuple):
+    """
+    The rules to find recent pasts in a language, compiled once from the config.
+    """
+    rp_pre_pos: FrozenSet[str]
+    rp_pre_lem: str
+    rp_inf_pos: str
+    ppp: bool
+    ppp_lemma: str
+    perfect_tags: FrozenSet[str]
+    stop_tags: Tuple[str, ...]
+    id_attr: str
+    lemma_attr: str
+    pos_attr: str
+
+    @classmethod
+    def from_config(cls, config: CachedConfig, language: str) -> 'RecentPastRules':
+        return cls(
+            rp_pre_pos=split_set(config.get(language, 'rp_pre_pos')),
+            rp_pre_lem=config.get(language, 'rp_pre_lem'),
+            rp_inf_pos=config.get(language, 'rp_inf_pos'),
+            ppp=config.getboolean(language, 'ppp'),
+            ppp_lemma=config.get(language, 'ppp_lemma'),
+            perfect_tags=split_set(config.get(language, 'perfect_tags')),
+            stop_tags=split_prefixes(config.get(language, 'stop_tags')),
+            **get_attributes(config, language))
+
+
+class ContinuousRules(NamedTuple):
+    """
+    The rules to find (present/past) continuous forms in a language, compiled once from the config.
+    """
+    cont_gerund_pos: FrozenSet[str]
+    stop_tags: Tuple[str, ...]
+    id_attr: str
+    lemma_attr: str
+    pos_attr: str
+
+    @classmethod
+    def from_config(cls, config: CachedConfig, language: str) -> 'ContinuousRules':
+        return cls(
+            cont_gerund_pos=split_set(config.get(language, 'cont_gerund_pos')),
+            stop_tags=split_prefixes(config.get(language, 'stop_tags')),
+            **get_attributes(config, language))
@@ -0,0 +1,56 @@
+from functools import lru_cache
+from typing import FrozenSet, Optional
+
+# The labels for sentences without verbs and for sentences with a combination of tenses
+NO_TENSE = 'none'
+OTHER_TENSE = 'other'
+
+# The combinations of tenses that are labeled with a single tense
+TENSE_COMBINATIONS = {
+    frozenset({'present', 'infinitive'}): 'present',
+    frozenset({'present', 'gerund'}): 'present',
+    frozenset({'present', 'gerund', 'infinitive'}): 'present',
+    frozenset({'past', 'infinitive'}): 'past',
+    frozenset({'past', 'gerund'}): 'past',
+    frozenset({'past', 'gerund', 'infinitive'}): 'past',
+    frozenset({'modal', 'infinitive'}): 'modal',
+}
+
+
+def get_pos_tense(pos: str) -> Optional[str]:
+    """
+    Returns the "tense" of a verb with the given part-of-speech tag, or None if the tag is not a verb tag (with a tense).
+    This should work for the tagsets of both the Penn Treebank Project and the BNC (see BaseExtractor.get_tenses).
+    """
+    if pos.startswith('V') and len(pos) == 3:
+        if pos.endswith('B') or pos.endswith('P') or pos.endswith('Z'):
+            return 'present'
+        elif pos.endswith('D'):
+            return 'past'
+        elif pos.endswith('N'):
+            return 'participle'
+        elif pos.endswith('G'):
+            return 'gerund'
+        elif pos.endswith('I'):
+            return 'infinitive'
+        elif pos == 'VM0':
+            return 'modal'
+    elif pos == 'MD':
+        return 'modal'
+    elif pos == 'BES':
+        return 'present'
+    elif pos == 'VB':
+        return 'infinitive'
+    return None
+
+
+@lru_cache(maxsize=None)
+def label_tenses(tenses: FrozenSet[str]) -> str:
+    """
+    Returns the label for a sentence in which verbs with the given tenses appear.
+    """
+    if not tenses:
+        return NO_TENSE
+    if len(tenses) == 1:
+        return next(iter(tenses))
+    return TENSE_COMBINATIONS.get(tenses, OTHER_TENSE)
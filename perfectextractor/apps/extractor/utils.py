@@ -13,6 +13,11 @@ XML = 'xml'
 CSV = 'csv'
 XLSX = 'xlsx'
 
+# Engines to match constructions
+PYTHON = 'python'
+AUTOMATON = 'automaton'
+XPATH = 'xpath'
+
 
 class ExcelWriter:
     """
@@ -1,3 +1,6 @@
+from .xpath import XPATHS
+
+
 def get_original_language(element):
     """
     Returns the original language for a document.
@@ -8,7 +11,7 @@ def get_original_language(element):
 
 def get_sentence_from_element(element):
     s = []
-    for w in element.xpath('ancestor::s')[0].xpath('.//w'):
+    for w in XPATHS.evaluate(XPATHS.evaluate(element, 'ancestor::s')[0], './/w'):
         s.append(w.text)
     return ' '.join(s)
 
@@ -0,0 +1,148 @@
+import string
+from typing import Any, Dict, List, Optional
+
+from lxml import etree
+
+from .rules import PerfectRules
+
+
+class XPathRegistry:
+    """
+    Compiles XPath expressions (with the given namespaces bound) on first use, and keeps them for reuse:
+    evaluating a string with element.xpath() compiles the expression on every call.
+    """
+    def __init__(self, namespaces: Optional[Dict[str, str]] = None) -> None:
+        self.namespaces = namespaces
+        self._compiled: Dict[str, etree.XPath] = dict()
+
+    def compile(self, path: str) -> etree.XPath:
+        """
+        Returns the compiled XPath expression for the given path.
+        """
+        compiled = self._compiled.get(path)
+        if compiled is None:
+            compiled = etree.XPath(path, namespaces=self.namespaces)
+            self._compiled[path] = compiled
+        return compiled
+
+    def evaluate(self, element: etree._Element, path: str, **variables: Any) -> Any:
+        """
+        Evaluates the given path on an element, the variables are bound to $name in the expression.
+        """
+        return self.compile(path)(element, **variables)
+
+
+# The registry for the expressions that do not depend on a corpus
+XPATHS = XPathRegistry()
+
+
+def xpath_literal(value: str) -> str:
+    """
+    Returns the given value as an XPath (1.0) string literal.
+    XPath does not allow to escape quotes, so values with both quote characters are composed with concat().
+    """
+    if "'" not in value:
+        return "'{}'".format(value)
+    if '"' not in value:
+        return '"{}"'.format(value)
+    parts = []
+    for i, part in enumerate(value.split("'")):
+        if i:
+            parts.append('"\'"')
+        if part:
+            parts.append("'{}'".format(part))
+    return 'concat({})'.format(', '.join(parts))
+
+
+def is_expressible(rules: PerfectRules) -> bool:
+    """
+    Returns whether the search for a past participle with the given rules can be expressed in XPath.
+    A missing part-of-speech tag is read as '?' in Python, but as an empty string in XPath:
+    this only gives the same results if neither is a perfect tag or a stop tag.
+    """
+    return not any(tag in ('', '?') for tag in rules.perfect_tags) and \
+        not any(tag == '' or tag.startswith('?') for tag in rules.stop_tags)
+
+
+class PerfectXPath:
+    """
+    Finds the past participle of a Perfect with XPath expressions, compiled from the rules of a language.
+    The search for the first sibling that is a perfect tag, punctuation or a stop tag then runs in libxml2.
+    Only the plain Perfect is expressed: the callers should fall back to check_perfect for passive Perfects,
+    Perfect continuous, lexical bounds and reflexives.
+    """
+    def __init__(self,
+                 rules: PerfectRules,
+                 pos: str,
+                 siblings: str,
+                 condition: str) -> None:
+        """
+        :param rules: the rules to find Perfects
+        :param pos: the XPath expression for the part-of-speech tag of a token
+        :param siblings: the node test for the siblings of a token (e.g. 'w')
+        :param condition: the XPath expression that holds for a sentence in which the sibling axes
+        select the same tokens as the SentenceContext
+        """
+        self.rules = rules
+
+        # element.text is the text before the first child node, the empty string if there is none
+        text = 'string(node()[1][self::text()])'
+        is_perfect = ' or '.join('{} = {}'.format(pos, xpath_literal(tag)) for tag in sorted(rules.perfect_tags))
+        is_stop = ' or '.join('starts-with({}, {})'.format(pos, xpath_literal(tag)) for tag in rules.stop_tags)
+        is_punctuation = 'contains({}, {})'.format(xpath_literal(string.punctuation), text)
+        is_terminal = '({}) or ({}) or ({})'.format(is_perfect, is_punctuation, is_stop)
+
+        # The first terminal sibling on an axis, if it has a perfect tag
+        participle = '{axis}::{siblings}[{terminal}][1][{perfect}]'
+        self._following = etree.XPath(participle.format(axis='following-sibling', siblings=siblings,
+                                                        terminal=is_terminal, perfect=is_perfect))
+        self._preceding = etree.XPath(participle.format(axis='preceding-sibling', siblings=siblings,
+                                                        terminal=is_terminal, perfect=is_perfect))
+
+        starts = [self._following.path]
+        if rules.allow_reversed:
+            starts.append(self._preceding.path)
+        self._starts = etree.XPath('boolean({})'.format(' | '.join(starts)))
+
+        # The siblings of the auxiliary before the past participle ($p), in document order
+        gap = '{axis}::{siblings}[count({axis}::{siblings} | $p) = count({axis}::{siblings})]'
+        self._following_gap = etree.XPath(gap.format(axis='following-sibling', siblings=siblings))
+        self._preceding_gap = etree.XPath(gap.format(axis='preceding-sibling', siblings=siblings))
+
+        self._condition = etree.XPath('boolean({})'.format(condition))
+        self._sentence: Optional[etree._Element] = None
+        self._applies = False
+
+    def applies(self, sentence: etree._Element) -> bool:
+        """
+        Returns whether the sibling axes select the same tokens as the SentenceContext for the given sentence.
+        The result for the sentence checked last is kept, as all candidates in a sentence are checked in turn.
+        """
+        if sentence is not self._sentence:
+            self._applies = self._condition(sentence)
+            self._sentence = sentence
+        return self._applies
+
+    def filter_candidates(self, candidates: List[etree._Element]) -> List[etree._Element]:
+        """
+        Filters the candidate auxiliaries down to those that are followed (or preceded) by a past participle.
+        """
+        return [c for c in candidates if self._starts(c)]
+
+    def find_participle(self, auxiliary: etree._Element, preceding: bool = False) -> Optional[etree._Element]:
+        """
+        Returns the past participle that follows (or precedes) the auxiliary, or None if there is none.
+        """
+        result = (self._preceding if preceding else self._following)(auxiliary)
+        return result[0] if result else None
+
+    def find_gap(self,
+                 auxiliary: etree._Element,
+                 participle: etree._Element,
+                 preceding: bool = False) -> List[etree._Element]:
+        """
+        Returns the siblings between the auxiliary and the past participle, in the order of the search.
+        """
+        if preceding:
+            return self._preceding_gap(auxiliary, p=participle)[::-1]
+        return self._following_gap(auxiliary, p=participle)
@@ -1,10 +1,21 @@
 import glob
 import os
 
+from lxml import etree
+
 BASE_CONFIG = os.path.join(os.path.dirname(__file__), 'base.cfg')
 
 
 class BaseBNC(object):
+    def __init__(self, *args, genres=None, **kwargs):
+        """
+        Allows to limit the processing to certain genres.
+        :param genres: the genres (or genre prefixes, e.g. 'S' for all spoken genres) to limit the search to
+        """
+        super().__init__(*args, **kwargs)
+
+        self.genres = tuple(genres) if genres else None
+
     def get_config(self):
         return BASE_CONFIG
 
@@ -12,4 +23,41 @@ class BaseBNC(object):
         return sorted(glob.glob(os.path.join(dir_name, '*.xml')))
 
     def get_genre(self, tree):
-        return tree.xpath('.//classCode')[0].text
+        return self.xpath(tree, './/classCode')[0].text
+
+    def read_genre(self, filename):
+        """
+        Reads the genre from the teiHeader of a BNC file, without parsing the remainder of the file.
+        """
+        for _, element in etree.iterparse(filename, tag=('classCode', 'teiHeader')):
+            return element.text if element.tag == 'classCode' else None
+
+    def in_genres(self, filename):
+        """
+        Returns whether the genre of a BNC file is in the selected genres.
+        Returns True when no genres are selected.
+        """
+        if not self.genres:
+            return True
+        genre = self.read_genre(filename)
+        return genre is not None and genre.startswith(self.genres)
+
+    def iterparse_with_genre(self, filename, tag='s'):
+        """
+        Streams over the elements with the given tag in a BNC file, while capturing the genre from the teiHeader.
+        This allows to process a file in a single pass. Processed elements are cleared to free memory.
+        :param filename: the current BNC file
+        :param tag: the tag of the elements to stream over
+        :return: an iterator over tuples of (genre, element)
+        """
+        genre = None
+        for _, element in etree.iterparse(filename, tag=('classCode', tag)):
+            if element.tag == 'classCode':
+                genre = element.text
+                continue
+
+            yield genre, element
+
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
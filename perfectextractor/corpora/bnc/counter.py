@@ -1,8 +1,6 @@
 from collections import Counter
 import os
 
-from lxml import etree
-
 from perfectextractor.apps.counter.base import BaseCounter
 from .base import BaseBNC
 
@@ -17,14 +15,17 @@ class BNCCounter(BaseBNC, BaseCounter):
         Processes a single file.
         """
         results = []
+        genre = None
 
-        # Parse the current tree
-        tree = etree.parse(filename)
-        genre = self.get_genre(tree)
+        # Skip files that are not in the selected genres
+        if not self.in_genres(filename):
+            return results
 
+        # Parse the current tree in a single pass (per sentence, retrieving the genre on the go)
         c = Counter()
-        for w in tree.xpath(self.config.get(self.l_from, 'xpath')):
-            c[self.get_lemma(w)] += 1
+        for genre, s in self.iterparse_with_genre(filename):
+            for w in self.xpath(s, self.config.get(self.l_from, 'xpath')):
+                c[self.get_lemma(w)] += 1
 
         for k, v in c.most_common():
             results.append([os.path.basename(filename), genre, k, str(v)])
@@ -3,18 +3,37 @@
 from perfectextractor.apps.extractor.base import BaseExtractor
 from .base import BaseBNC
 
+# The words of a sentence: in the BNC, punctuation is in c rather than w elements
+SENTENCE_WORDS = './/w | .//c'
+
 
 class BNCExtractor(BaseBNC, BaseExtractor):
     def fetch_results(self, filename, s_trees, alignment_trees, translation_trees):
         # TODO: implement
         raise NotImplementedError
 
+    def process_file(self, filename):
+        """
+        Processes a single file, if it is in the selected genres.
+        """
+        if not self.in_genres(filename):
+            return []
+        return super().process_file(filename)
+
     def get_sentence(self, element):
-        return element.xpath('ancestor::s')[0]
+        return self.xpath(element, 'ancestor::s')[0]
 
     def get_siblings(self, element, sentence_id, check_preceding):
         return element.itersiblings(tag='w', preceding=check_preceding)
 
+    def get_token_groups(self, sentence):
+        # Words within e.g. a multi-word unit (mw) are only siblings of each other, hence group them by their parent
+        parents = dict.fromkeys(w.getparent() for w in sentence.iter('w'))
+        return [list(parent.iterchildren(tag='w')) for parent in parents]
+
+    def get_sibling_xpath(self):
+        return 'w', 'true()'
+
     def get_sentence_words(self, sentence):
         """
         Returns all words in the sentence.
@@ -23,7 +42,7 @@ class BNCExtractor(BaseBNC, BaseExtractor):
         :return: all w and c texts, joined with a space.
         """
         s = []
-        for w in sentence.xpath('.//w | .//c'):
+        for w in self.xpath(sentence, SENTENCE_WORDS):
             s.append(w.text.strip() if w.text else ' ')
         return ' '.join(s)
 
@@ -1,10 +1,9 @@
 import os
 
-from lxml import etree
+from perfectextractor.apps.extractor.models import format_offsets
+from perfectextractor.apps.extractor.perfectextractor import PerfectExtractor, ALL_TENSES
 
-from perfectextractor.apps.extractor.perfectextractor import PerfectExtractor
-
-from .extractor import BNCExtractor
+from .extractor import BNCExtractor, SENTENCE_WORDS
 
 
 class BNCPerfectExtractor(BNCExtractor, PerfectExtractor):
@@ -25,6 +24,10 @@ class BNCPerfectExtractor(BNCExtractor, PerfectExtractor):
             'lemma',
             'is-question',
             'text']
+        if self.tense == ALL_TENSES:
+            header.insert(4, 'perfect-tense')
+        if self.offsets:
+            header.append('offsets')
         return header
 
     def process_file(self, filename):
@@ -33,23 +36,24 @@ class BNCPerfectExtractor(BNCExtractor, PerfectExtractor):
         """
         results = []
 
-        # Retrieve the genre
-        tree = etree.parse(filename)
-        genre = self.get_genre(tree)
-
-        # if not genre.startswith('S'):  # Only spoken genre for the moment
-        #    return results
+        # Skip files that are not in the selected genres
+        if not self.in_genres(filename):
+            return results
 
-        # Parse the current tree (create a iterator over 's' elements)
-        s_trees = etree.iterparse(filename, tag='s')
+        # Parse the current tree in a single pass (create a iterator over 's' elements, retrieving the genre on the go)
+        s_trees = self.iterparse_with_genre(filename)
 
-        # Find potential Perfects
-        for _, s in s_trees:
+        # Find potential Perfects (in the given tense(s))
+        aux_xpath = self.get_aux_xpath(self.l_from)
+        for genre, s in s_trees:
             sentence = self.get_sentence_words(s)
+            sentence_words = self.xpath(s, SENTENCE_WORDS) if self.offsets else None
             is_question = self.is_question(sentence)
 
-            for e in s.xpath(self.config.get(self.l_from, 'xpath')):
-                pp = self.check_perfect(e, self.l_from)
+            candidates = self.xpath(s, aux_xpath)
+            candidates, context = self.get_perfect_candidates(s, candidates, self.l_from)
+            for e in candidates:
+                pp = self.check_perfect(e, self.l_from, context=context)
 
                 # If this is really a Perfect, add it to the result
                 if pp:
@@ -58,10 +62,14 @@ class BNCPerfectExtractor(BNCExtractor, PerfectExtractor):
                     result.append(genre)
                     result.append('1')
                     result.append(pp.perfect_type())
+                    if self.tense == ALL_TENSES:
+                        result.append(self.get_perfect_tense(e, s, self.l_from))
                     result.append(pp.construction_to_string())
                     result.append(pp.perfect_lemma())
                     result.append('1' if is_question else '0')
                     result.append(sentence)
+                    if self.offsets:
+                        result.append(format_offsets(pp.construction_offsets(sentence_words)))
                     results.append(result)
 
                     # If we want (only) one classification per sentence, break the for loop here.
@@ -77,10 +85,14 @@ class BNCPerfectExtractor(BNCExtractor, PerfectExtractor):
                     result.append(genre)
                     result.append('0')
                     result.append(tense)
+                    if self.tense == ALL_TENSES:
+                        result.append('')
                     result.append(','.join(tenses))
                     result.append('')
                     result.append('1' if is_question else '0')
                     result.append(sentence)
+                    if self.offsets:
+                        result.append('')
                     results.append(result)
 
         return results
@@ -103,3 +115,6 @@ class BNCPerfectExtractor(BNCExtractor, PerfectExtractor):
         :return: the (most likely) part-of-speech tag
         """
         return super().get_pos(language, element).split('-')[0]
+
+    def get_pos_xpath(self, language):
+        return "substring-before(concat({}, '-'), '-')".format(super().get_pos_xpath(language))
@@ -11,16 +11,17 @@ class BNCPoSExtractor(BNCExtractor, PoSExtractor):
         results = []
 
         # Prepare the search predicates
-        xpath, ns = self.prepare_xpath()
+        find_words = self.compile_xpath()
 
         for _, s in s_trees:
-            for w in s.xpath(xpath, namespaces=ns):
+            for w, pattern, query_id in self.find_words(s, find_words):
                 words = self.preprocess_found(w)
 
                 if not words:
                     continue
 
-                result = self.generate_result_line(filename, s, self.words2mwe(words, s))
+                result = self.generate_result_line(filename, s, self.words2mwe(words, s),
+                                                   pattern=pattern, query_id=query_id)
                 result.extend(self.generate_translations(alignment_trees, translation_trees, s))
                 results.append(result)
 
@@ -0,0 +1,28 @@
+from perfectextractor.apps.extractor.queryextractor import QueryExtractor
+
+from .extractor import BNCExtractor
+
+
+class BNCQueryExtractor(BNCExtractor, QueryExtractor):
+    def fetch_results(self, filename, s_trees, alignment_trees, translation_trees):
+        """
+        Processes a single file.
+        """
+        results = []
+
+        for _, s in s_trees:
+            for mwe in self.find_matches(s, self.xpath(s, './/w')):
+                result = self.generate_result_line(filename, s, mwe)
+                result.extend(self.generate_translations(alignment_trees, translation_trees, s))
+                results.append(result)
+
+        return results
+
+    def generate_translations(self, alignment_trees, translation_trees, sentence):
+        return [''] * 2
+
+    def get_type(self, sentence, mwe=None):
+        """
+        Return the type for the found word(s). A sensible default is the part-of-speech of the first found word.
+        """
+        return mwe.words[0].pos
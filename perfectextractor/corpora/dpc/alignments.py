@@ -0,0 +1,90 @@
+from typing import Dict, List, Set, Tuple
+
+from lxml import etree
+
+from .base import TEI_NS
+from .utils import is_nl, NL
+
+# A translation: the translated segment numbers and the alignment type
+Translation = Tuple[List[str], str]
+
+LINKS = etree.XPath('//ns:link', namespaces=TEI_NS)
+
+
+class DPCAlignments(dict):
+    """
+    The alignment trees for a single DPC document, keyed by the non-Dutch language.
+    On creation, the trees are turned into lookup tables from segment numbers to their translation, in both directions.
+    Translations between two non-Dutch languages (e.g. EN to FR) are composed via Dutch (NL).
+    """
+    def __init__(self, alignment_trees: Dict[str, etree._ElementTree]) -> None:
+        super().__init__(alignment_trees)
+
+        self._translations: Dict[Tuple[str, str], Dict[str, Translation]] = dict()
+        for not_nl, alignment_tree in self.items():
+            self._translations[(not_nl, NL)] = self._read_links(alignment_tree, not_nl, NL)
+            self._translations[(NL, not_nl)] = self._read_links(alignment_tree, NL, not_nl)
+
+        for language_from in self.keys():
+            for language_to in self.keys():
+                if language_from != language_to:
+                    self._translations[(language_from, language_to)] = self._compose(language_from, language_to)
+
+    @staticmethod
+    def _read_links(alignment_tree: etree._ElementTree,
+                    language_from: str,
+                    language_to: str) -> Dict[str, Translation]:
+        """
+        Reads the links from an alignment tree between NL and another language.
+
+        Alignment lines look like this:
+            <link type="A: 1-1" targets="p1.s1; p1.s1"/>
+            <link type="A: 1-2" targets="p1.s9; p1.s9 p1.s10"/>
+            <link type="B: 2-1" targets="p1.s24 p1.s25; p1.s25"/>
+
+        To get from NL to EN/FR, we have to find the segment number in the targets attribute BEFORE the semicolon.
+        For the reverse pattern, we have to find the segment number in the targets attribute AFTER the semicolon.
+        If a segment number occurs in multiple links, the first link is used.
+        """
+        result: Dict[str, Translation] = dict()
+        for link in LINKS(alignment_tree):
+            alignment_type = link.get('type').split(': ')[1]
+            if is_nl(language_to):
+                alignment_type = alignment_type[::-1]  # reverse the alignment type
+            alignment_type = alignment_type.replace('-', '=>')
+
+            targets = link.get('targets').split('; ')
+            translated_lines = targets[is_nl(language_from)].split(' ')
+            for segment_number in targets[1 - is_nl(language_from)].split(' '):
+                result.setdefault(segment_number, (translated_lines, alignment_type))
+        return result
+
+    def _compose(self, language_from: str, language_to: str) -> Dict[str, Translation]:
+        """
+        Composes the translations between two non-Dutch languages, by using NL as an in between language.
+        The alignment type is the number of lines on the source side to the number of distinct lines on the target side.
+        """
+        result: Dict[str, Translation] = dict()
+        to_nl = self._translations[(language_from, NL)]
+        from_nl = self._translations[(NL, language_to)]
+        for segment_number, (nl_lines, nl_alignment_type) in to_nl.items():
+            translated_lines: List[str] = []
+            for nl_line in nl_lines:
+                translated_lines.extend(from_nl.get(nl_line, ([], ''))[0])
+
+            if translated_lines:
+                alignment_type = nl_alignment_type.split('=>')[0] + '=>' + str(len(set(translated_lines)))
+                result[segment_number] = (translated_lines, alignment_type)
+        return result
+
+    def get_translated_lines(self, language_from: str, language_to: str, segment_number: str) -> Tuple[Set[str], str]:
+        """
+        Returns the translated segment numbers and the alignment type for a segment number in the original text.
+        If no translation is available, an empty set and an empty alignment type are returned.
+        Raises a KeyError if the alignments between the languages have not been read.
+        """
+        translations = self._translations.get((language_from, language_to))
+        if translations is None:
+            raise KeyError('No alignments from {} to {}'.format(language_from, language_to))
+        translated_lines, alignment_type = translations.get(segment_number, ([], ''))
+        return set(translated_lines), alignment_type
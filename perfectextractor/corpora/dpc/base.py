@@ -10,6 +10,10 @@ class BaseDPC(object):
     def get_config(self):
         return BASE_CONFIG
 
+    @property
+    def namespaces(self):
+        return TEI_NS
+
     @property
     def sentence_tag(self):
         return '{{{}}}s'.format(TEI_URL)
@@ -1,16 +1,24 @@
 # -*- encoding: utf-8 -*-
 
 import glob
+from functools import partial
 import os
 
 from lxml import etree
 
-from perfectextractor.apps.extractor.base import BaseExtractor
-from .base import BaseDPC, TEI_NS
-from .utils import is_nl, NL
+from perfectextractor.apps.extractor.base import BaseExtractor, RENDER_TRANSLATIONS
+from perfectextractor.apps.extractor.models import get_word_texts
+from .alignments import DPCAlignments
+from .base import BaseDPC
+from .utils import NL
 
 
 class DPCExtractor(BaseDPC, BaseExtractor):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._metadata = dict()  # save metadata records by document
+
     def list_filenames(self, dir_name):
         return sorted(glob.glob(os.path.join(dir_name, '*[0-9]-' + self.l_from + '-tei.xml')))
 
@@ -18,6 +26,13 @@ class DPCExtractor(BaseDPC, BaseExtractor):
         raise NotImplementedError
 
     def generate_translations(self, alignment_trees, translation_trees, sentence):
+        return list(self.render(RENDER_TRANSLATIONS, self.l_from, sentence,
+                                partial(self.render_translations, alignment_trees, translation_trees, sentence)))
+
+    def render_translations(self, alignment_trees, translation_trees, sentence):
+        """
+        Returns the alignment type and the translated sentence(s) for each target language.
+        """
         result = []
 
         for language_to in self.l_to:
@@ -33,88 +48,68 @@ class DPCExtractor(BaseDPC, BaseExtractor):
         return result
 
     def get_line_as_xml(self, tree, segment_number):
-        return tree.xpath('//ns:s[@n="' + segment_number + '"]', namespaces=TEI_NS)[0]
+        return self._segment_by_id(tree, segment_number)
+
+    def get_metadata(self, document):
+        """
+        Returns the metadata record for a document. The -mtd.xml file is only parsed once per document.
+        """
+        if document not in self._metadata:
+            metadata_tree = etree.parse(document + self.l_from + '-mtd.xml')
+            original = metadata_tree.getroot().find('metaTrans').find('Original')
+            self._metadata[document] = {'original_language': original.get('lang')}
+        return self._metadata[document]
 
     def mark_sentence(self, sentence, match=None):
-        # TODO: this is copied from apps/models.py. Consider refactoring!
-        s = []
-        # TODO: this xPath-expression is specific for a corpus
-        for w in sentence.xpath('.//ns:w', namespaces=TEI_NS):
-            s.append(w.text.strip() if w.text else ' ')
-        return ' '.join(s)
+        return ' '.join(get_word_texts(self.xpath(sentence, './/ns:w')))
 
     def parse_alignment_trees(self, filename):
         document = filename.split(self.l_from + '-tei.xml')[0]
         translation_trees = dict()
         alignment_trees = dict()
+        not_nls = set()
         for language_to in self.l_to:
             translation_file = document + language_to + '-tei.xml'
             if os.path.exists(translation_file):
                 translation_trees[language_to] = etree.parse(translation_file)
 
-            not_nl = language_to if language_to != NL else self.l_from
+            not_nls.add(language_to if language_to != NL else self.l_from)
+            # Translations between two non-Dutch languages are composed via NL, so these require both alignments
+            if language_to != NL and self.l_from != NL:
+                not_nls.add(self.l_from)
+
+        for not_nl in sorted(not_nls):
             alignment_file = document + NL + '-' + not_nl + '-tei.xml'
             if os.path.isfile(alignment_file):
                 alignment_trees[not_nl] = etree.parse(alignment_file)
 
-        return alignment_trees, translation_trees
+        return DPCAlignments(alignment_trees), translation_trees
 
     def get_translated_lines(self, alignment_trees, language_from, language_to, segment_number):
         """
         Returns the translated segment numbers (could be multiple) for a segment number in the original text.
 
         The translation document file format either ends with nl-en-tei.xml or nl-fr-tei.xml.
-
-        Alignment lines look like this:
-            <link type="A: 1-1" targets="p1.s1; p1.s1"/>
-            <link type="A: 1-2" targets="p1.s9; p1.s9 p1.s10"/>
-            <link type="B: 2-1" targets="p1.s24 p1.s25; p1.s25"/>
-
-        To get from NL to EN/FR, we have to find the segment number in the targets attribute BEFORE the semicolon.
-        For the reverse pattern, we have to find the segment number in the targets attribute AFTER the semicolon.
-
-        To get from EN to FR or from FR to EN, we have to use NL as an in between language.
-
-        This function supports 1-to-2 alignments, as it will return the translated lines as a list.
-
-        TODO: deal with 2-to-2 and 2-to-1 alignments as well here.
+        The alignments of these files are turned into lookup tables once per document (see DPCAlignments).
+        To get from EN to FR or from FR to EN, NL is used as an in between language.
         """
-        result = []
-        alignment_type = ''
-
-        if NL in [language_from, language_to]:
-            not_nl = language_to if language_to != NL else language_from
-            for link in alignment_trees[not_nl].xpath('//ns:link', namespaces=TEI_NS):  # TODO: simplify this
-                alignment_type = link.get('type').split(': ')[1]
-                if is_nl(language_to):
-                    alignment_type = alignment_type[::-1]  # reverse the alignment type
-                alignment_type = alignment_type.replace('-', '=>')
-                targets = link.get('targets').split('; ')
-                if segment_number in targets[1 - is_nl(language_from)].split(' '):
-                    result = targets[is_nl(language_from)].split(' ')
-                    break
-        else:
-            lookup, t = self.get_translated_lines(alignment_trees, language_from, NL, segment_number)
-            alignment_type = t.split('=>')[0]
-            for lookup_number in lookup:
-                lines, _ = self.get_translated_lines(alignment_trees, NL, language_to, lookup_number)
-                result.extend(lines)
-
-            if result:
-                alignment_type += '=>' + str(len(set(result)))
-            else:
-                alignment_type = ''
-
-        if not result:
-            alignment_type = ''
-
-        return set(result), alignment_type
+        if not isinstance(alignment_trees, DPCAlignments):
+            alignment_trees = DPCAlignments(alignment_trees)
+        return alignment_trees.get_translated_lines(language_from, language_to, segment_number)
 
     def get_sentence(self, element):
-        return element.xpath('ancestor::ns:s', namespaces=TEI_NS)[0]
+        return self.xpath(element, 'ancestor::ns:s')[0]
 
     def get_siblings(self, element, sentence_id, check_preceding):
-        return element.itersiblings(preceding=check_preceding)
+        return element.itersiblings(tag=etree.Element, preceding=check_preceding)
+
+    def get_token_groups(self, sentence):
+        parents = dict.fromkeys(w.getparent() for w in self.xpath(sentence, './/ns:w'))
+        # Comments and processing instructions are not tokens, hence only take the elements
+        return [list(parent.iterchildren(tag=etree.Element)) for parent in parents]
+
+    def get_sibling_xpath(self):
+        return '*', 'true()'
 
     def sort_by_alignment_certainty(self, file_names):
         raise NotImplementedError
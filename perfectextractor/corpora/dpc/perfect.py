@@ -2,9 +2,9 @@ import os
 
 from lxml import etree
 
-from perfectextractor.apps.extractor.perfectextractor import PerfectExtractor
+from perfectextractor.apps.extractor.models import format_offsets
+from perfectextractor.apps.extractor.perfectextractor import PerfectExtractor, ALL_TENSES
 
-from .base import TEI_NS
 from .extractor import DPCExtractor
 
 
@@ -21,14 +21,15 @@ class DPCPerfectExtractor(DPCExtractor, PerfectExtractor):
         sentence = '-'
         pp = None
 
-        line = tree.xpath('//ns:s[@n="' + segment_number + '"]', namespaces=TEI_NS)
-        if line:
-            s = line[0]
+        s = self.get_line_as_xml(tree, segment_number)
+        if s is not None:
             sentence = s.getprevious().text
 
             if self.search_in_to:
-                for e in s.xpath(self.config.get(language_to, 'xpath'), namespaces=TEI_NS):
-                    pp = self.check_perfect(e, language_to)
+                candidates = self.xpath(s, self.config.get(language_to, 'xpath'))
+                candidates, context = self.get_perfect_candidates(s, candidates, language_to)
+                for e in candidates:
+                    pp = self.check_perfect(e, language_to, context=context)
                     if pp:
                         sentence = pp.mark_sentence()
                         break
@@ -39,8 +40,7 @@ class DPCPerfectExtractor(DPCExtractor, PerfectExtractor):
         """
         Returns the original language for a document.
         """
-        metadata_tree = etree.parse(document + self.l_from + '-mtd.xml')
-        return metadata_tree.getroot().find('metaTrans').find('Original').get('lang')
+        return self.get_metadata(document)['original_language']
 
     def fetch_results(self, filename, s_trees, alignment_trees, translation_trees):
         """
@@ -50,10 +50,13 @@ class DPCPerfectExtractor(DPCExtractor, PerfectExtractor):
 
         document = filename.split(self.l_from + '-tei.xml')[0]
 
-        # Find potential Perfects
+        # Find potential Perfects (in the given tense(s))
+        aux_xpath = self.get_aux_xpath(self.l_from)
         for _, s in s_trees:
-            for e in s.xpath(self.config.get(self.l_from, 'xpath'), namespaces=TEI_NS):
-                pp = self.check_perfect(e, self.l_from)
+            candidates = self.xpath(s, aux_xpath)
+            candidates, context = self.get_perfect_candidates(s, candidates, self.l_from)
+            for e in candidates:
+                pp = self.check_perfect(e, self.l_from, context=context)
 
                 # If this is really a Perfect, add it to the result
                 if pp:
@@ -61,10 +64,16 @@ class DPCPerfectExtractor(DPCExtractor, PerfectExtractor):
                     result.append(document[:-1])
                     result.append(self.get_original_language(document))
                     result.append(pp.perfect_type())
+                    if self.tense == ALL_TENSES:
+                        result.append(self.get_perfect_tense(e, s, self.l_from))
                     result.append(pp.construction_to_string())
 
-                    # Write the complete segment with mark-up
-                    result.append(pp.mark_sentence())
+                    # Write the complete segment with mark-up (or with the character offsets of the Perfect)
+                    if self.offsets:
+                        result.append(pp.get_sentence_words())
+                        result.append(format_offsets(pp.construction_offsets()))
+                    else:
+                        result.append(pp.mark_sentence())
 
                     # Find the translated lines
                     segment_number = e.getparent().getparent().get('n')[4:]
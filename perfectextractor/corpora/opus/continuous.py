@@ -16,8 +16,10 @@ class OPUSContinuousExtractor(OPUSExtractor, ContinuousExtractor):
         results = []
         # Find potential (present/past) continuous (per sentence)
         for _, s in s_trees:
-            for w in s.xpath(self.config.get(self.l_from, 'cont_xpath')):
-                continuous = self.check_continuous(w, self.l_from)
+            candidates = self.xpath(s, self.config.get(self.l_from, 'cont_xpath'))
+            context = self.get_sentence_context(s, self.l_from) if candidates else None
+            for w in candidates:
+                continuous = self.check_continuous(w, self.l_from, context=context)
 
                 if continuous:
                     result = self.generate_result_line(filename, s, mwe=continuous)
@@ -22,7 +22,7 @@ class OPUSCounter(BaseOPUS, BaseCounter):
         tree = etree.parse(filename)
 
         c = Counter()
-        for w in tree.xpath(self.config.get(self.l_from, 'xpath')):
+        for w in self.xpath(tree, self.config.get(self.l_from, 'xpath')):
             c[self.get_lemma(w)] += 1
 
         for k, v in c.most_common():
@@ -1,14 +1,16 @@
 # -*- encoding: utf-8 -*-
 
+from functools import partial
 import os
 
 import click
 from lxml import etree
 
-from perfectextractor.apps.extractor.base import BaseExtractor
-from perfectextractor.apps.extractor.models import Alignment, MARKUP
+from perfectextractor.apps.extractor.base import BaseExtractor, RENDER_TRANSLATIONS
+from perfectextractor.apps.extractor.models import Alignment, Alignments, get_word_texts, mark_words
 from perfectextractor.apps.extractor.utils import XML
 from .base import BaseOPUS
+from .index import AlignmentIndex, IndexedAlignments, get_index_file, has_current_index
 
 
 class OPUSExtractor(BaseOPUS, BaseExtractor):
@@ -30,6 +32,13 @@ class OPUSExtractor(BaseOPUS, BaseExtractor):
         return results
 
     def generate_translations(self, alignment_trees, translation_trees, sentence):
+        return list(self.render(RENDER_TRANSLATIONS, self.l_from, sentence,
+                                partial(self.render_translations, alignment_trees, translation_trees, sentence)))
+
+    def render_translations(self, alignment_trees, translation_trees, sentence):
+        """
+        Returns the alignment type and the translated sentence(s) for each target language.
+        """
         result = []
 
         for language_to in self.l_to:
@@ -53,15 +62,9 @@ class OPUSExtractor(BaseOPUS, BaseExtractor):
         raise NotImplementedError
 
     def mark_sentence(self, sentence, match=None):
-        # TODO: this is copied from apps/models.py. Consider refactoring!
-        s = []
-        # TODO: this xPath-expression is specific for a corpus
-        for w in sentence.xpath('.//w'):
-            if match is not None and w.get('id') == match.get('id'):
-                s.append(MARKUP.format(w.text.strip()))
-            else:
-                s.append(w.text.strip() if w.text else ' ')
-        return ' '.join(s)
+        words = self.xpath(sentence, './/w')
+        marked = [i for i, w in enumerate(words) if match is not None and w.get('id') == match.get('id')]
+        return mark_words(get_word_texts(words), marked)
 
     def get_line_by_number(self, tree, segment_number):
         """
@@ -70,17 +73,17 @@ class OPUSExtractor(BaseOPUS, BaseExtractor):
         """
         result = None
 
-        line = tree.xpath('//s[@id="' + segment_number + '"]')
+        line = self.xpath(tree, '//s[@id=$id]', id=segment_number)
         if line is not None:
             result = line[0]
 
         return result
 
     def get_sentence(self, element):
-        return element.xpath('ancestor::s')[0]
+        return self.xpath(element, 'ancestor::s')[0]
 
     def get_siblings(self, element, sentence_id, check_preceding):
-        siblings = element.xpath('ancestor::s//w')
+        siblings = self.xpath(element, 'ancestor::s//w')
         if check_preceding:
             siblings = siblings[:siblings.index(element)]
             siblings = siblings[::-1]
@@ -88,12 +91,12 @@ class OPUSExtractor(BaseOPUS, BaseExtractor):
             siblings = siblings[siblings.index(element) + 1:]
         return siblings
 
-    def _segment_by_id(self, tree, id):
-        if tree not in self._index:
-            self._index[tree] = dict()
-            for segment in tree.xpath('//s'):
-                self._index[tree][segment.get('id')] = segment
-        return self._index[tree].get(id)
+    def get_token_groups(self, sentence):
+        return [self.xpath(sentence, './/w')]
+
+    def get_sibling_xpath(self):
+        # All words in the sentence are siblings, which the sibling axes only select if there are no nested words
+        return 'w', 'not(*//w)'
 
     def get_line_as_xml(self, tree, segment_number):
         return self._segment_by_id(tree, segment_number)
@@ -119,25 +122,17 @@ class OPUSExtractor(BaseOPUS, BaseExtractor):
         To get from language A to B, we should order the languages.
 
         This function supports n-to-n alignments, as it will return both the source and translated lines as a list.
+        The lookup is done in the per-document Alignments (or in the sidecar index, if available).
         """
         from_lines = []
         to_lines = []
-        certainty = None
 
         sl = self.languages_ordered(language_from, language_to)
-        for alignment in alignment_trees[language_to]:
-            if sl[0] == language_from:
-                if segment_number in alignment.sources:
-                    from_lines = alignment.sources
-                    to_lines = alignment.targets
-                    certainty = alignment.certainty
-                    break
-            else:
-                if segment_number in alignment.targets:
-                    from_lines = alignment.targets
-                    to_lines = alignment.sources
-                    certainty = alignment.certainty
-                    break
+        reverse = sl[0] != language_from
+        alignment = alignment_trees[language_to].find(segment_number, reverse)
+        if alignment:
+            from_lines = alignment.targets if reverse else alignment.sources
+            to_lines = alignment.sources if reverse else alignment.targets
 
         if not any(to_lines):
             to_lines = []
@@ -149,12 +144,14 @@ class OPUSExtractor(BaseOPUS, BaseExtractor):
     def parse_alignment_trees(self, filename, include_translations=True):
         data_folder = os.path.dirname(os.path.dirname(filename))
 
-        # Cache the alignment XMLs on the first run
+        # Cache the alignment XMLs (or their indexes, if available) on the first run
         if not self.alignment_xmls:
             for language_to in self.l_to:
                 sl = self.languages_ordered(self.l_from, language_to)
                 alignment_file = os.path.join(data_folder, '-'.join(sl) + '.xml')
-                if os.path.isfile(alignment_file):
+                if has_current_index(alignment_file):
+                    self.alignment_xmls[language_to] = AlignmentIndex(get_index_file(alignment_file))
+                elif os.path.isfile(alignment_file):
                     alignment_tree = etree.parse(alignment_file)
                     self.alignment_xmls[language_to] = alignment_tree
                 elif include_translations:
@@ -168,31 +165,42 @@ class OPUSExtractor(BaseOPUS, BaseExtractor):
             base_filename = os.path.basename(filename)
             doc = '{}/{}'.format(self.l_from, base_filename)
             doc_gz = doc + '.gz'  # OPUS uses .gz natively, deal with both options
-            path = '@fromDoc="{}"' if sl[0] == self.l_from else '@toDoc="{}"'
-            linkGrps = alignment_tree.xpath('//linkGrp[{} or {}]'.format(path.format(doc), path.format(doc_gz)))
+            if isinstance(alignment_tree, AlignmentIndex):
+                linkGrps = alignment_tree.find_documents([doc, doc_gz], from_doc=sl[0] == self.l_from)
+            else:
+                path = '//linkGrp[@fromDoc=$doc or @fromDoc=$doc_gz]' if sl[0] == self.l_from \
+                    else '//linkGrp[@toDoc=$doc or @toDoc=$doc_gz]'
+                linkGrps = self.xpath(alignment_tree, path, doc=doc, doc_gz=doc_gz)
 
             if not linkGrps:
                 if include_translations:
                     click.echo('No translation found for {} to {}'.format(filename, language_to))
             elif len(linkGrps) == 1:
                 linkGrp = linkGrps[0]
+                indexed = isinstance(linkGrp, IndexedAlignments)
 
                 if include_translations:
-                    translation_link = linkGrp.get('toDoc') if sl[0] == self.l_from else linkGrp.get('fromDoc')
+                    if indexed:
+                        translation_link = linkGrp.to_doc if sl[0] == self.l_from else linkGrp.from_doc
+                    else:
+                        translation_link = linkGrp.get('toDoc') if sl[0] == self.l_from else linkGrp.get('fromDoc')
                     if translation_link.endswith('.gz'):   # See comment above: OPUS uses .gz as extension
                         translation_link = translation_link[:-3]
                     translation_file = os.path.join(data_folder, translation_link)
                     translation_trees[language_to] = etree.parse(translation_file)
 
-                alignments = []
-                for link in linkGrp.xpath('./link'):
-                    xtargets = link.get('xtargets').split(';')
-                    sources = xtargets[0].split(' ')
-                    targets = xtargets[1].split(' ')
-                    certainty = link.get('certainty', None)
-                    alignments.append(Alignment(sources, targets, certainty))
-
-                alignment_trees[language_to] = alignments
+                if indexed:
+                    alignment_trees[language_to] = linkGrp
+                else:
+                    alignments = []
+                    for link in self.xpath(linkGrp, './link'):
+                        xtargets = link.get('xtargets').split(';')
+                        sources = xtargets[0].split(' ')
+                        targets = xtargets[1].split(' ')
+                        certainty = link.get('certainty', None)
+                        alignments.append(Alignment(sources, targets, certainty))
+
+                    alignment_trees[language_to] = Alignments(alignments)
             else:
                 click.echo('Multiple translations found for {} to {}'.format(filename, language_to))
 
@@ -221,7 +229,7 @@ class OPUSExtractor(BaseOPUS, BaseExtractor):
     def filter_by_file_size(self, file_names):
         results = []
         for file_name in file_names:
-            file_size = etree.parse(file_name).xpath('count(//s)')
+            file_size = self.xpath(etree.parse(file_name), 'count(//s)')
             if self.min_file_size <= file_size <= self.max_file_size:
                 results.append(file_name)
 
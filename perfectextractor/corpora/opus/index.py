@@ -0,0 +1,158 @@
+import os
+import sqlite3
+from typing import Iterator, List, Optional
+
+from lxml import etree
+
+from perfectextractor.apps.extractor.models import Alignment
+
+INDEX_EXTENSION = '.sqlite'
+
+# Sides of an alignment link
+SOURCES = 0
+TARGETS = 1
+
+SCHEMA = '''
+CREATE TABLE documents (id INTEGER PRIMARY KEY, from_doc TEXT, to_doc TEXT);
+CREATE INDEX documents_from_doc ON documents (from_doc);
+CREATE INDEX documents_to_doc ON documents (to_doc);
+CREATE TABLE links (id INTEGER PRIMARY KEY, document INTEGER, sources TEXT, targets TEXT, certainty TEXT);
+CREATE INDEX links_document ON links (document);
+CREATE TABLE segments (document INTEGER, side INTEGER, segment TEXT, link INTEGER,
+                       PRIMARY KEY (document, side, segment)) WITHOUT ROWID;
+'''
+
+
+def get_index_file(alignment_file: str) -> str:
+    """
+    Returns the location of the sidecar index for an alignment file, e.g. en-nl.xml => en-nl.sqlite
+    """
+    return os.path.splitext(alignment_file)[0] + INDEX_EXTENSION
+
+
+def has_current_index(alignment_file: str) -> bool:
+    """
+    Returns whether a usable index exists for the alignment file:
+    the index should exist and should not be older than the alignment file (if that still exists).
+    """
+    index_file = get_index_file(alignment_file)
+    if not os.path.isfile(index_file):
+        return False
+    return not os.path.isfile(alignment_file) or os.path.getmtime(index_file) >= os.path.getmtime(alignment_file)
+
+
+def build_index(alignment_file: str, index_file: Optional[str] = None) -> str:
+    """
+    Builds the sidecar index for an OPUS alignment file.
+    The alignment file is streamed, so that multi-GB files do not have to be kept in memory.
+    The index is first written to a temporary file, so that an interrupted run never leaves a broken index.
+    :param alignment_file: the alignment file (e.g. en-nl.xml)
+    :param index_file: the location of the index, defaults to the alignment file with a .sqlite extension
+    :return: the location of the index
+    """
+    index_file = index_file or get_index_file(alignment_file)
+    tmp_file = index_file + '.tmp'
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+
+    connection = sqlite3.connect(tmp_file)
+    try:
+        connection.executescript(SCHEMA)
+        for _, link_grp in etree.iterparse(alignment_file, tag='linkGrp'):
+            cursor = connection.execute('INSERT INTO documents (from_doc, to_doc) VALUES (?, ?)',
+                                        (link_grp.get('fromDoc'), link_grp.get('toDoc')))
+            document = cursor.lastrowid
+
+            for link in link_grp.iterchildren('link'):
+                sources, targets = link.get('xtargets').split(';')
+                cursor = connection.execute('INSERT INTO links (document, sources, targets, certainty) '
+                                            'VALUES (?, ?, ?, ?)',
+                                            (document, sources, targets, link.get('certainty', None)))
+                # Only the first link for a segment is kept, as is the case when searching the XML
+                segments = [(document, side, segment, cursor.lastrowid)
+                            for side, segment_numbers in enumerate([sources, targets])
+                            for segment in segment_numbers.split(' ') if segment]
+                connection.executemany('INSERT OR IGNORE INTO segments VALUES (?, ?, ?, ?)', segments)
+
+            # Free the memory of the processed linkGrp
+            link_grp.clear()
+            while link_grp.getprevious() is not None:
+                del link_grp.getparent()[0]
+        connection.commit()
+    finally:
+        connection.close()
+
+    os.replace(tmp_file, index_file)
+    return index_file
+
+
+class AlignmentIndex:
+    """
+    Provides access to the sidecar index of an alignment file.
+    """
+    def __init__(self, index_file: str) -> None:
+        self.index_file = index_file
+        self.connection = sqlite3.connect(index_file)
+
+    def find_documents(self, doc_names: List[str], from_doc: bool = True) -> List['IndexedAlignments']:
+        """
+        Returns the documents (i.e. linkGrps) that match one of the given document names.
+        :param doc_names: the document names to look for
+        :param from_doc: whether to look in the fromDoc or in the toDoc attribute
+        """
+        column = 'from_doc' if from_doc else 'to_doc'
+        query = 'SELECT id, from_doc, to_doc FROM documents WHERE {} IN ({})'.format(
+            column, ', '.join('?' * len(doc_names)))
+        return [IndexedAlignments(self, *row) for row in self.connection.execute(query, doc_names)]
+
+    def get_alignments(self, document: int) -> List[Alignment]:
+        """
+        Returns all Alignments for a document, in document order.
+        """
+        rows = self.connection.execute('SELECT sources, targets, certainty FROM links '
+                                       'WHERE document = ? ORDER BY id', (document, ))
+        return [Alignment(sources.split(' '), targets.split(' '), certainty) for sources, targets, certainty in rows]
+
+    def find_alignment(self, document: int, side: int, segment_number: str) -> Optional[Alignment]:
+        """
+        Returns the Alignment for a segment number on the given side of the links, or None if there is none.
+        """
+        row = self.connection.execute('SELECT l.sources, l.targets, l.certainty FROM segments s '
+                                      'JOIN links l ON l.id = s.link '
+                                      'WHERE s.document = ? AND s.side = ? AND s.segment = ?',
+                                      (document, side, segment_number)).fetchone()
+        if row is None:
+            return None
+        sources, targets, certainty = row
+        return Alignment(sources.split(' '), targets.split(' '), certainty)
+
+
+class IndexedAlignments:
+    """
+    The Alignments for a single document, retrieved from an AlignmentIndex.
+    Behaves like a list of Alignments, but allows for direct lookup of segment numbers.
+    """
+    def __init__(self, index: AlignmentIndex, document: int, from_doc: str, to_doc: str) -> None:
+        self.index = index
+        self.document = document
+        self.from_doc = from_doc
+        self.to_doc = to_doc
+        self._alignments: Optional[List[Alignment]] = None
+
+    def find(self, segment_number: str, reverse: bool = False) -> Optional[Alignment]:
+        """
+        Returns the Alignment that contains the segment number in its sources (or targets, if reverse is set).
+        """
+        return self.index.find_alignment(self.document, TARGETS if reverse else SOURCES, segment_number)
+
+    @property
+    def alignments(self) -> List[Alignment]:
+        if self._alignments is None:
+            self._alignments = self.index.get_alignments(self.document)
+        return self._alignments
+
+    def __iter__(self) -> Iterator[Alignment]:
+        return iter(self.alignments)
+
+    def __len__(self) -> int:
+        return len(self.alignments)
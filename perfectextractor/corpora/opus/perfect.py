@@ -2,8 +2,7 @@ import os
 
 from lxml import etree
 
-from perfectextractor.apps.extractor.perfectextractor import PerfectExtractor, PRESENT
-from perfectextractor.apps.extractor.xml_utils import get_sentence_from_element
+from perfectextractor.apps.extractor.perfectextractor import PerfectExtractor, ALL_TENSES, TENSE_COLUMN
 
 from .extractor import OPUSExtractor
 
@@ -24,12 +23,14 @@ class OPUSPerfectExtractor(OPUSExtractor, PerfectExtractor):
         line = self.get_line_as_xml(tree, segment_number)
         if line is not None:
             s = line
-            first_w = s.xpath('.//w')[0]
-            sentence = get_sentence_from_element(first_w)
+            # The words are those of the segment itself: no need to look up their ancestor sentence
+            sentence = ' '.join(w.text for w in self.xpath(s, './/w'))
 
             if self.search_in_to:
-                for e in s.xpath(self.config.get(language_to, 'xpath')):
-                    pp = self.check_perfect(e, language_to)
+                candidates = self.xpath(s, self.config.get(language_to, 'xpath'))
+                candidates, context = self.get_perfect_candidates(s, candidates, language_to)
+                for e in candidates:
+                    pp = self.check_perfect(e, language_to, context=context)
                     if pp:
                         sentence = pp.mark_sentence()
                         break
@@ -42,23 +43,21 @@ class OPUSPerfectExtractor(OPUSExtractor, PerfectExtractor):
         """
         results = []
         # Find potential present/past perfects (per sentence)
-        for _, s in s_trees:
-            # Retrieves the xpath expression for the auxiliary in the given tense or a fallback
-            xpath_fallback = 'xpath'
-            xpath = xpath_fallback + ('_{}'.format(self.tense) if self.tense != PRESENT else '')
-            l_config = self.config[self.l_from]
-            aux_xpath = l_config.get(xpath, l_config.get(xpath_fallback))
-
-            for e in s.xpath(aux_xpath):
-                pp = self.check_perfect(e, self.l_from)
+        # Retrieves the xpath expression for the auxiliary in the given tense(s)
+        aux_xpath = self.get_aux_xpath(self.l_from)
 
-                # apply position filter
-                if self.position and not e.get('id').endswith('.' + str(self.position)):
-                    continue
+        for _, s in s_trees:
+            # Apply the position filter before checking the candidates
+            candidates = self.plan.filter_words(self.xpath(s, aux_xpath))
+            candidates, context = self.get_perfect_candidates(s, candidates, self.l_from)
+            for e in candidates:
+                pp = self.check_perfect(e, self.l_from, context=context)
 
                 # If this is really a present/past perfect, add it to the result
                 if pp:
                     result = self.generate_result_line(filename, s, mwe=pp)
+                    if self.tense == ALL_TENSES:
+                        result.insert(TENSE_COLUMN, self.get_perfect_tense(e, s, self.l_from))
                     result.extend(self.generate_translations(alignment_trees, translation_trees, s))
                     results.append(result)
 
@@ -74,9 +73,13 @@ class OPUSPerfectExtractor(OPUSExtractor, PerfectExtractor):
                     result.append(os.path.basename(filename))
                     result.append(s.get('id'))
                     result.append(tense)
+                    if self.tense == ALL_TENSES:
+                        result.append('')
                     result.append(','.join(tenses))
                     result.append('')
                     result.append(self.mark_sentence(s))
+                    if self.offsets:
+                        result.append('')
                     self.append_metadata(s, result)
                     results.append(result)
 
@@ -17,8 +17,10 @@ class OPUSRecentPastExtractor(OPUSExtractor, RecentPastExtractor):
         results = []
         # Find potential recent pasts (per sentence)
         for _, s in s_trees:
-            for w in s.xpath(self.config.get(self.l_from, 'rp_xpath')):
-                rp = self.check_recent_past(w, self.l_from)
+            candidates = self.xpath(s, self.config.get(self.l_from, 'rp_xpath'))
+            context = self.get_sentence_context(s, self.l_from) if candidates else None
+            for w in candidates:
+                rp = self.check_recent_past(w, self.l_from, context=context)
 
                 if rp:
                     result = self.generate_result_line(filename, s, mwe=rp)
@@ -25,14 +25,21 @@ def process_data_folders(counter, path):
 @click.argument('language')
 @click.option('--corpus', default=OPUS, type=click.Choice([OPUS, DPC, BNC]),
               help='Which type of corpus to use')
+@click.option('--genre', '-g', 'genres', multiple=True,
+              help='Limits the genres counted in (or genre prefixes, e.g. S for spoken genres, BNC only)')
 @click.option('--outfile', '-o',
               help='Output file')
 @click.option('--format', 'format_', default=CSV, type=click.Choice([CSV, XLSX]),
               help='Output file in .csv or .xlsx format')
-def count(folder, language, corpus=OPUS, outfile=None, format_=CSV):
+def count(folder, language, corpus=OPUS, genres=None, outfile=None, format_=CSV):
     # Set the default arguments
     kwargs = dict(outfile=outfile, format_=format_)
 
+    if genres:
+        if corpus != BNC:
+            raise click.ClickException('Filtering on genre is only implemented for the BNC!')
+        kwargs['genres'] = genres
+
     # Determine the counter to be used
     resulting_counter = None
     if corpus == OPUS:
@@ -1,3 +1,4 @@
+import os
 import time
 
 import click
@@ -5,17 +6,23 @@ import click
 from perfectextractor.corpora.bnc.extractor import BNCExtractor
 from perfectextractor.corpora.bnc.perfect import BNCPerfectExtractor
 from perfectextractor.corpora.bnc.pos import BNCPoSExtractor
+from perfectextractor.corpora.bnc.query import BNCQueryExtractor
 from perfectextractor.corpora.dpc.extractor import DPCExtractor
 from perfectextractor.corpora.dpc.perfect import DPCPerfectExtractor
 from perfectextractor.corpora.dpc.pos import DPCPoSExtractor
+from perfectextractor.corpora.dpc.query import DPCQueryExtractor
 from perfectextractor.corpora.opus.extractor import OPUSExtractor
 from perfectextractor.corpora.opus.perfect import OPUSPerfectExtractor
 from perfectextractor.corpora.opus.pos import OPUSPoSExtractor
+from perfectextractor.corpora.opus.query import OPUSQueryExtractor
 from perfectextractor.corpora.opus.recentpast import OPUSRecentPastExtractor
 from perfectextractor.corpora.opus.since import OPUSSinceDurationExtractor
 from perfectextractor.corpora.opus.continuous import OPUSContinuousExtractor
-from perfectextractor.apps.extractor.utils import TXT, XML, CSV, XLSX
-from perfectextractor.apps.extractor.perfectextractor import PRESENT, PAST
+from perfectextractor.apps.extractor.utils import TXT, XML, CSV, XLSX, PYTHON, AUTOMATON, XPATH
+from perfectextractor.apps.extractor.perfectextractor import PRESENT, PAST, ALL_TENSES
+from perfectextractor.apps.extractor.batch import read_queries
+from perfectextractor.apps.extractor.lexicon import CachedLexicon, LexiconStore, WiktionaryLexicon
+from perfectextractor.apps.extractor.posextractor import REGEX_WORD, REGEX_LEMMA, REGEX_POS
 
 # Corpora
 BNC = 'bnc'
@@ -29,6 +36,62 @@ PERFECT = 'perfect'
 RECENT_PAST = 'recent_past'
 SINCE_DURATION = 'since_duration'
 CONTINUOUS = 'continuous'
+QUERY = 'query'
+
+
+def get_extractor_class(corpus, extractor):
+    """
+    Returns the class of the extractor for the given corpus and extractor type (None if it is unknown).
+    """
+    # TODO: add more varieties
+    resulting_extractor = None
+    if corpus == OPUS:
+        if extractor == POS:
+            resulting_extractor = OPUSPoSExtractor
+        elif extractor == PERFECT:
+            resulting_extractor = OPUSPerfectExtractor
+        elif extractor == RECENT_PAST:
+            resulting_extractor = OPUSRecentPastExtractor
+        elif extractor == SINCE_DURATION:
+            resulting_extractor = OPUSSinceDurationExtractor
+        elif extractor == CONTINUOUS:
+            resulting_extractor = OPUSContinuousExtractor
+        elif extractor == QUERY:
+            resulting_extractor = OPUSQueryExtractor
+        else:
+            resulting_extractor = OPUSExtractor
+    elif corpus == DPC:
+        if extractor == POS:
+            resulting_extractor = DPCPoSExtractor
+        elif extractor == PERFECT:
+            resulting_extractor = DPCPerfectExtractor
+        elif extractor == RECENT_PAST:
+            raise click.ClickException('Corpus or extractor type not implemented!')
+        elif extractor == SINCE_DURATION:
+            raise click.ClickException('Corpus or extractor type not implemented!')
+        elif extractor == CONTINUOUS:
+            raise click.ClickException('Corpus or extractor type not implemented!')
+        elif extractor == QUERY:
+            resulting_extractor = DPCQueryExtractor
+        else:
+            resulting_extractor = DPCExtractor
+    elif corpus == BNC:
+        if extractor == POS:
+            resulting_extractor = BNCPoSExtractor
+        elif extractor == PERFECT:
+            resulting_extractor = BNCPerfectExtractor
+        elif extractor == RECENT_PAST:
+            raise click.ClickException('Corpus or extractor type not implemented!')
+        elif extractor == SINCE_DURATION:
+            raise click.ClickException('Corpus or extractor type not implemented!')
+        elif extractor == CONTINUOUS:
+            raise click.ClickException('Corpus or extractor type not implemented!')
+        elif extractor == QUERY:
+            resulting_extractor = BNCQueryExtractor
+        else:
+            resulting_extractor = BNCExtractor
+
+    return resulting_extractor
 
 
 def process_data_folders(extractor, path):
@@ -46,8 +109,12 @@ def process_data_folders(extractor, path):
 @click.option('--corpus', default=OPUS, type=click.Choice([OPUS, DPC, BNC]),
               help='Which type of corpus to use')
 @click.option('--extractor', default=BASE, type=click.Choice([BASE, POS, PERFECT, RECENT_PAST,
-                                                              SINCE_DURATION, CONTINUOUS]),
+                                                              SINCE_DURATION, CONTINUOUS, QUERY]),
               help='Which kind of extractor to use')
+@click.option('--also', multiple=True, type=click.Choice([BASE, POS, PERFECT, RECENT_PAST,
+                                                         SINCE_DURATION, CONTINUOUS, QUERY]),
+              help='Other kinds of extractors to run in the same pass, each with its own result file '
+                   '(--lemmata, --regex and --position only apply to the primary extractor)')
 @click.option('--file_names', '-f', multiple=True,
               help='Limits the file names searched into')
 @click.option('--sentence_ids', '-s', multiple=True,
@@ -56,26 +123,42 @@ def process_data_folders(extractor, path):
               help='Limits the lemmata searched for')
 @click.option('--regex', '-r', multiple=True,
               help='Use regular expression to match words')
+@click.option('--regex_target', default=REGEX_WORD, type=click.Choice([REGEX_WORD, REGEX_LEMMA, REGEX_POS]),
+              help='The attribute of the words the regular expressions are matched against (pos extractor only)')
 @click.option('--pos', '-p', multiple=True,
               help='Limits the POS-tags searched for')
+@click.option('--batch', type=click.Path(exists=True, dir_okay=False),
+              help='A file with a batch of queries on lemmata, POS-tags and/or regexes, evaluated in a single pass '
+                   '(pos extractor only)')
+@click.option('--query', '-q',
+              help='The query to search for (query extractor only), e.g. [lemma="seit"] [pos="CARD"]')
 @click.option('--tokens', '-t', multiple=True, type=click.Tuple([str, str]),
               help='Limits the tokens searched for. Format: -t [start_token] [end_token]')
 @click.option('--metadata', '-m', multiple=True, type=click.Tuple([str, str]),
               help='Adds additional metadata. Format: -m [tag] [level]')
+@click.option('--genre', '-g', 'genres', multiple=True,
+              help='Limits the genres searched into (or genre prefixes, e.g. S for spoken genres, BNC only)')
 @click.option('--outfile', '-o',
               help='Output file')
 @click.option('--position', default=0,
               help='The position of the searched item')
 @click.option('--search_in_to', is_flag=True,
               help='Also search for perfects in the to language(s)?')
-@click.option('--tense', default=PRESENT, type=click.Choice([PRESENT, PAST]),
-              help='The tense of perfect (present, past, future)')
+@click.option('--tense', default=PRESENT, type=click.Choice([PRESENT, PAST, ALL_TENSES]),
+              help='The tense of perfect (present, past, or all of these in a single pass)')
+@click.option('--lexicon', type=click.Path(dir_okay=False),
+              help='An SQLite lexicon store (see scripts/import_lexicon.py) used to check the translated perfects; '
+                   'translations looked up on Wiktionary are added to it (perfect extractor only)')
+@click.option('--offline', is_flag=True,
+              help='Do not look up translations on Wiktionary, only use the lexicon store (perfect extractor only)')
 @click.option('--output', default=TXT, type=click.Choice([TXT, XML]),
               help='Output results in text or XML format')
 @click.option('--format', 'format_', default=CSV, type=click.Choice([CSV, XLSX]),
               help='Output file in .csv or .xlsx format')
 @click.option('--one_per_sentence', is_flag=True,
               help='Output all sentences, and only one classification per sentence')
+@click.option('--offsets', is_flag=True,
+              help='Output the character offsets of the match instead of marking it in the sentence (text output only)')
 @click.option('--sort_by_certainty', is_flag=True,
               help='Sort by certainty?')
 @click.option('--no_order_languages', is_flag=True,
@@ -86,75 +169,92 @@ def process_data_folders(extractor, path):
               help='Limits the minimal size of the files searched')
 @click.option('--max_file_size', default=0,
               help='Limits the maximal size of the files searched')
-def extract(folder, language_from, languages_to, corpus='opus', extractor='base',
-            pos=None, search_in_to=False, tense=PRESENT,
-            output=TXT, format_=CSV, file_names=None, sentence_ids=None,
-            lemmata=None, regex=None, position=None, tokens=None, metadata=None,
-            outfile=None, one_per_sentence=False, sort_by_certainty=False,
+@click.option('--engine', default=PYTHON, type=click.Choice([PYTHON, AUTOMATON, XPATH]),
+              help="Match constructions with Python loops, compiled automata or compiled XPath (same results)")
+def extract(folder, language_from, languages_to, corpus='opus', extractor='base', also=(),
+            pos=None, batch=None, query=None, regex_target=REGEX_WORD, search_in_to=False, tense=PRESENT,
+            lexicon=None, offline=False, output=TXT, format_=CSV, file_names=None, sentence_ids=None,
+            lemmata=None, regex=None, position=None, tokens=None, metadata=None, genres=None,
+            outfile=None, one_per_sentence=False, offsets=False, sort_by_certainty=False,
             no_order_languages=False,
-            file_limit=0, min_file_size=0, max_file_size=0):
+            file_limit=0, min_file_size=0, max_file_size=0, engine=PYTHON):
     # Set the default arguments
     kwargs = dict(output=output, file_names=file_names, sentence_ids=sentence_ids,
                   lemmata=lemmata, regex=regex, position=position, tokens=tokens, metadata=metadata,
-                  outfile=outfile, format_=format_, one_per_sentence=one_per_sentence,
+                  outfile=outfile, format_=format_, one_per_sentence=one_per_sentence, offsets=offsets,
                   sort_by_certainty=sort_by_certainty, no_order_languages=no_order_languages,
-                  file_limit=file_limit, min_file_size=min_file_size, max_file_size=max_file_size)
+                  file_limit=file_limit, min_file_size=min_file_size, max_file_size=max_file_size,
+                  engine=engine)
 
-    # Determine the extractor to be used
-    # TODO: add more varieties
-    resulting_extractor = None
-    if corpus == OPUS:
-        if extractor == POS:
-            resulting_extractor = OPUSPoSExtractor
-        elif extractor == PERFECT:
-            resulting_extractor = OPUSPerfectExtractor
-        elif extractor == RECENT_PAST:
-            resulting_extractor = OPUSRecentPastExtractor
-        elif extractor == SINCE_DURATION:
-            resulting_extractor = OPUSSinceDurationExtractor
-        elif extractor == CONTINUOUS:
-            resulting_extractor = OPUSContinuousExtractor
-        else:
-            resulting_extractor = OPUSExtractor
-    elif corpus == DPC:
-        if extractor == POS:
-            resulting_extractor = DPCPoSExtractor
-        elif extractor == PERFECT:
-            resulting_extractor = DPCPerfectExtractor
-        elif extractor == RECENT_PAST:
-            raise click.ClickException('Corpus or extractor type not implemented!')
-        elif extractor == SINCE_DURATION:
-            raise click.ClickException('Corpus or extractor type not implemented!')
-        elif extractor == CONTINUOUS:
-            raise click.ClickException('Corpus or extractor type not implemented!')
-        else:
-            resulting_extractor = DPCExtractor
-    elif corpus == BNC:
-        if extractor == POS:
-            resulting_extractor = BNCPoSExtractor
-        elif extractor == PERFECT:
-            resulting_extractor = BNCPerfectExtractor
-        elif extractor == RECENT_PAST:
-            raise click.ClickException('Corpus or extractor type not implemented!')
-        elif extractor == SINCE_DURATION:
-            raise click.ClickException('Corpus or extractor type not implemented!')
-        elif extractor == CONTINUOUS:
-            raise click.ClickException('Corpus or extractor type not implemented!')
-        else:
-            resulting_extractor = BNCExtractor
+    if offsets and output == XML:
+        raise click.ClickException('Character offsets can only be output for results in text format!')
+
+    if genres:
+        if corpus != BNC:
+            raise click.ClickException('Filtering on genre is only implemented for the BNC!')
+        kwargs['genres'] = genres
+
+    translation_lexicon = None
+    if offline and not lexicon:
+        raise click.ClickException('Working offline requires a lexicon store!')
+    if lexicon:
+        fallback = None if offline else WiktionaryLexicon()
+        translation_lexicon = CachedLexicon(LexiconStore(lexicon, fallback=fallback))
+
+    queries = None
+    if batch:
+        try:
+            queries = read_queries(batch)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+    # Determine the extractor(s) to be used: the extractors in --also process the same files in a single pass
+    extractors = []
+    for extractor_type in (extractor,) + tuple(also):
+        extractor_kwargs = dict(kwargs)
+
+        # The limits on lemmata, regular expressions and position only apply to the primary extractor
+        if extractors:
+            extractor_kwargs.update(lemmata=None, regex=None, position=None)
+
+        if extractor_type == PERFECT:
+            extractor_kwargs['search_in_to'] = search_in_to
+            extractor_kwargs['tense'] = tense
+            extractor_kwargs['lexicon'] = translation_lexicon
+
+        if extractor_type == POS:
+            extractor_kwargs['pos'] = pos
+            extractor_kwargs['regex_target'] = regex_target
+            extractor_kwargs['queries'] = queries
+
+        if extractor_type == QUERY:
+            if not query:
+                raise click.ClickException('The query extractor requires a query!')
+            extractor_kwargs['query'] = query
 
-    if extractor == PERFECT:
-        kwargs['search_in_to'] = search_in_to
-        kwargs['tense'] = tense
+        # The other extractors write to their own result file
+        if extractors and outfile:
+            root, ext = os.path.splitext(outfile)
+            extractor_kwargs['outfile'] = '{}-{}{}'.format(root, extractor_type, ext)
 
-    if extractor == POS:
-        kwargs['pos'] = pos
+        extractor_class = get_extractor_class(corpus, extractor_type)
+        if not extractor_class:
+            raise click.ClickException('Unknown value for either corpus or extractor type')
+        extractors.append((extractor_type, extractor_class(language_from, languages_to, **extractor_kwargs)))
 
-    if not resulting_extractor:
-        raise click.ClickException('Unknown value for either corpus or extractor type')
+    resulting_extractor = extractors[0][1]
+    for name, other_extractor in extractors[1:]:
+        try:
+            resulting_extractor.add_extractor(other_extractor, name)
+        except ValueError as e:
+            raise click.ClickException(str(e))
 
     # Start the extraction!
-    process_data_folders(resulting_extractor(language_from, languages_to, **kwargs), folder)
+    try:
+        process_data_folders(resulting_extractor, folder)
+    finally:
+        if translation_lexicon is not None:
+            translation_lexicon.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,25 @@
+import argparse
+
+from perfectextractor.apps.extractor.lexicon import LexiconStore, WiktionaryLexicon
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('store_file', help='The SQLite lexicon store, e.g. lexicon.sqlite (created if not present)')
+    parser.add_argument('language_from', help='The language of the words, e.g. en')
+    parser.add_argument('language_to', help='The language of the translations, e.g. nl')
+    parser.add_argument('dictionaries', nargs='*',
+                        help='Bilingual dictionary file(s), with a word and a translation per line, separated by a tab')
+    parser.add_argument('--prefetch', help='A file with words (one per line) to look up on Wiktionary')
+    args = parser.parse_args()
+
+    with LexiconStore(args.store_file, fallback=WiktionaryLexicon()) as store:
+        for dictionary in args.dictionaries:
+            print('Importing {}...'.format(dictionary))
+            store.import_dictionary(dictionary, args.language_from, args.language_to)
+
+        if args.prefetch:
+            print('Looking up the words in {}...'.format(args.prefetch))
+            with open(args.prefetch, encoding='utf-8') as f:
+                words = [line.strip() for line in f if line.strip()]
+            store.prefetch(words, args.language_from, args.language_to)
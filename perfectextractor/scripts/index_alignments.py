@@ -0,0 +1,13 @@
+import argparse
+
+from perfectextractor.corpora.opus.index import build_index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('alignment_files', nargs='+', help='OPUS alignment file(s), e.g. en-nl.xml')
+    args = parser.parse_args()
+
+    for alignment_file in args.alignment_files:
+        print('Indexing {}...'.format(alignment_file))
+        print('Created {}'.format(build_index(alignment_file)))
@@ -3,6 +3,7 @@
 import os
 import unittest
 
+from perfectextractor.corpora.bnc.counter import BNCCounter
 from perfectextractor.corpora.bnc.perfect import BNCPerfectExtractor
 from perfectextractor.corpora.bnc.pos import BNCPoSExtractor
 
@@ -30,12 +31,29 @@ class TestBNCExtractor(unittest.TestCase):
     def test_process(self):
         results = self.extractor.process_file(self.filename)
         self.assertEqual(len(results), 60)
+        self.assertEqual(results[0][1], 'W ac:soc science')
         self.assertEqual(results[0][VERBS_COLUMN], 'has been presented')
         self.assertEqual(results[1][VERBS_COLUMN], 'has pointed')
         self.assertEqual(results[2][VERBS_COLUMN], 'has shown')
         self.assertEqual(results[3][VERBS_COLUMN], 'has been running')
         self.assertEqual(results[4][VERBS_COLUMN], 'has devoted')
 
+    def test_offsets(self):
+        extractor = BNCPerfectExtractor(self.language, offsets=True, one_per_sentence=True)
+        self.assertEqual(extractor.generate_header()[-1], 'offsets')
+        results = extractor.process_file(self.filename)
+        self.assertEqual(len(results), len(BNCPerfectExtractor(self.language, one_per_sentence=True)
+                                           .process_file(self.filename)))
+
+        # The offsets give the words of the Perfect in the sentence, which also contains punctuation
+        perfects = [result for result in results if result[2] == '1']
+        self.assertEqual(len(perfects), 52)
+        for result in perfects:
+            sentence, offsets = result[-2], result[-1]
+            words = [sentence[int(start):int(end)] for start, end in (o.split('-') for o in offsets.split())]
+            self.assertEqual(words, result[VERBS_COLUMN].split())
+        self.assertTrue(all(result[-1] == '' for result in results if result[2] == '0'))
+
     def test_ppc(self):
         # Test whether a Perfect continuous is ignored when check_ppc is set to False
         # Only works on Python 3 for some reason...
@@ -63,6 +81,29 @@ class TestBNCExtractor(unittest.TestCase):
         results = extractor.process_file(self.filename)
         self.assertEqual(len(results), 74)
 
+    def test_counter(self):
+        counter = BNCCounter(self.language, None)
+        results = counter.process_file(self.filename)
+        self.assertEqual(len(results), 541)
+        self.assertEqual(results[0], ['ALP-formatted.xml', 'W ac:soc science', 'be', '1119'])
+        self.assertEqual(results[1], ['ALP-formatted.xml', 'W ac:soc science', 'have', '308'])
+
+    def test_genres(self):
+        self.assertEqual(self.extractor.read_genre(self.filename), 'W ac:soc science')
+
+        extractor = BNCPerfectExtractor(self.language, genres=['S'])
+        self.assertEqual(extractor.process_file(self.filename), [])
+        extractor = BNCPerfectExtractor(self.language, genres=['S', 'W ac'])
+        self.assertEqual(len(extractor.process_file(self.filename)), 60)
+
+        extractor = BNCPoSExtractor(self.language, [], pos=['AJ0'], genres=['S'])
+        self.assertEqual(extractor.process_file(self.filename), [])
+        extractor = BNCPoSExtractor(self.language, [], pos=['AJ0'], genres=['W'])
+        self.assertEqual(len(extractor.process_file(self.filename)), 1805)
+
+        counter = BNCCounter(self.language, None, genres=['S'])
+        self.assertEqual(counter.process_file(self.filename), [])
+
     def test_not_implemented(self):
         self.assertRaises(NotImplementedError, self.extractor.get_line_and_pp, None, None, None)
         self.assertRaises(NotImplementedError, self.extractor.get_translated_lines, None, None, None, None)
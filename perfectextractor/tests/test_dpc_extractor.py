@@ -5,7 +5,10 @@ import unittest
 
 from lxml import etree
 
+from perfectextractor.apps.extractor.lexicon import LexiconStore
 from perfectextractor.apps.extractor.models import Perfect
+from perfectextractor.apps.extractor.utils import AUTOMATON, PYTHON, XPATH
+from perfectextractor.corpora.dpc.alignments import DPCAlignments
 from perfectextractor.corpora.dpc.perfect import DPCPerfectExtractor
 from perfectextractor.corpora.dpc.pos import DPCPoSExtractor
 
@@ -14,15 +17,23 @@ DATA_FOLDER = os.path.join(os.path.dirname(__file__), 'data/dpc')
 
 class TestDPCExtractor(unittest.TestCase):
     def setUp(self):
-        self.en_extractor = DPCPerfectExtractor('en', ['nl', 'fr'], search_in_to=True)
-        self.nl_extractor = DPCPerfectExtractor('nl', ['en', 'fr'], search_in_to=True)
-        self.fr_extractor = DPCPerfectExtractor('fr', ['en', 'nl'], search_in_to=True)
+        # Check the translated Perfects offline, against a lexicon without fallback
+        self.lexicon = LexiconStore(':memory:')
+        self.lexicon.import_pairs([('attain', 'bereiken')], 'en', 'nl')
+        self.lexicon.import_pairs([('bereiken', 'attain')], 'nl', 'en')
+
+        self.en_extractor = DPCPerfectExtractor('en', ['nl', 'fr'], search_in_to=True, lexicon=self.lexicon)
+        self.nl_extractor = DPCPerfectExtractor('nl', ['en', 'fr'], search_in_to=True, lexicon=self.lexicon)
+        self.fr_extractor = DPCPerfectExtractor('fr', ['en', 'nl'], search_in_to=True, lexicon=self.lexicon)
 
         self.document = os.path.join(DATA_FOLDER, 'dpc-bmm-001071-')
         align_fr = etree.parse(os.path.join(DATA_FOLDER, 'dpc-bmm-001071-nl-fr-tei.xml'))
         align_en = etree.parse(os.path.join(DATA_FOLDER, 'dpc-bmm-001071-nl-en-tei.xml'))
         self.alignmenttrees = {'en': align_en, 'fr': align_fr}
 
+    def tearDown(self):
+        self.lexicon.close()
+
     def merge_results(self, generator):
         return sum(list(generator), [])
 
@@ -50,6 +61,27 @@ class TestDPCExtractor(unittest.TestCase):
         self.assertEqual(lines, {'p1.s3', 'p1.s4'})
         self.assertEqual(alignment, '2=>2')
 
+    def test_parse_alignment_trees(self):
+        alignment_trees, translation_trees = self.en_extractor.parse_alignment_trees(self.document + 'en-tei.xml')
+        self.assertIsInstance(alignment_trees, DPCAlignments)
+        self.assertEqual(set(translation_trees.keys()), {'nl', 'fr'})
+        self.assertEqual(alignment_trees.get_translated_lines('fr', 'en', 'p1.s4'), ({'p1.s3', 'p1.s4'}, '2=>2'))
+        self.assertEqual(alignment_trees.get_translated_lines('en', 'fr', 'p1.s99'), (set(), ''))
+
+        # Without NL in the target languages, the alignments to NL are still read to compose EN to FR
+        extractor = DPCPerfectExtractor('en', ['fr'])
+        alignment_trees, translation_trees = extractor.parse_alignment_trees(self.document + 'en-tei.xml')
+        self.assertEqual(set(translation_trees.keys()), {'fr'})
+        self.assertEqual(alignment_trees.get_translated_lines('en', 'fr', 'p1.s16'), ({'p1.s16'}, '1=>1'))
+        self.assertRaises(KeyError, alignment_trees.get_translated_lines, 'en', 'de', 'p1.s16')
+
+    def test_en_fr_extractor(self):
+        extractor = DPCPerfectExtractor('en', ['fr'], search_in_to=True, lexicon=self.lexicon)
+        results = self.merge_results(extractor.generate_results(os.path.join(DATA_FOLDER)))
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0][3], u'have attained')
+        self.assertEqual(results[0][5:8], ['ont atteint', 'unknown', '1=>1'])
+
     def test_get_line_by_number(self):
         tree = etree.parse(self.document + 'en-tei.xml')
         line = self.en_extractor.get_line_and_pp(tree, 'en', 'p1.s16')
@@ -63,6 +95,8 @@ class TestDPCExtractor(unittest.TestCase):
     def test_get_original_language(self):
         orig_lang = self.en_extractor.get_original_language(self.document)
         self.assertEqual(orig_lang, 'unknown')
+        # The metadata record should be cached per document
+        self.assertIs(self.en_extractor.get_metadata(self.document), self.en_extractor.get_metadata(self.document))
 
     def test_en_extractor(self):
         results = self.merge_results(self.en_extractor.generate_results(os.path.join(DATA_FOLDER)))
@@ -71,6 +105,11 @@ class TestDPCExtractor(unittest.TestCase):
         self.assertEqual(results[0][3], u'have attained')
         self.assertEqual(results[1][3], u'have been provided')
 
+        # The translations are checked in the lexicon: attain => bereiken is known, attain => atteindre is not
+        self.assertEqual(sorted(results[0][5].split('\n')), ['', 'hebben bereikt'])
+        self.assertEqual(results[0][6], 'yes')
+        self.assertEqual(results[0][9:11], ['ont atteint', 'unknown'])
+
     def test_fr_extractor(self):
         results = self.merge_results(self.fr_extractor.generate_results(os.path.join(DATA_FOLDER)))
         self.assertEqual(len(results), 2)
@@ -82,6 +121,22 @@ class TestDPCExtractor(unittest.TestCase):
         self.assertEqual(len(results), 2)
         self.assertEqual(results[0][3], u'zijn verbonden')
         self.assertEqual(results[1][3], u'hebben bereikt')
+        self.assertEqual(results[1][5:7], ['have attained', 'yes'])
+
+    def test_offsets(self):
+        extractor = DPCPerfectExtractor('en', ['nl', 'fr'], search_in_to=True, offsets=True,
+                                        lexicon=self.lexicon)
+        results = self.merge_results(extractor.generate_results(os.path.join(DATA_FOLDER)))
+        marked = self.merge_results(self.en_extractor.generate_results(os.path.join(DATA_FOLDER)))
+        self.assertEqual(len(results), len(marked))
+
+        # The sentence is not marked, but the offsets give the words that are marked otherwise
+        for result, expected in zip(results, marked):
+            sentence, offsets = result[4], result[5]
+            words = [sentence[int(start):int(end)] for start, end in (o.split('-') for o in offsets.split())]
+            self.assertEqual(words, result[3].split())
+            self.assertEqual(sentence, expected[4].replace('**', ''))
+            self.assertEqual(result[:4] + result[6:], expected[:4] + expected[5:])
 
     def test_sentence_filtering(self):
         extractor = DPCPerfectExtractor('fr', ['nl'], sentence_ids=['p1.s3'])
@@ -89,6 +144,20 @@ class TestDPCExtractor(unittest.TestCase):
         self.assertEqual(len(results), 1)
         self.assertEqual(results[0][3], u'avez dit')
 
+    def test_comments(self):
+        sentence = etree.fromstring('<s xmlns="http://www.tei-c.org/ns/1.0" n="p1.s1">'
+                                    '<w ana="PRP" lemma="he">He</w><!-- c --><w ana="VBZ" lemma="have">has</w>'
+                                    '<?pi x?><w ana="RB" lemma="never">never</w><w ana="VBN" lemma="see">seen</w>'
+                                    '</s>')
+        aux = sentence[2]
+        for engine in [PYTHON, AUTOMATON, XPATH]:
+            extractor = DPCPerfectExtractor('en', [], engine=engine)
+            context = extractor.get_sentence_context(sentence, 'en')
+            self.assertEqual(context.get_word_texts(), ['He', 'has', 'never', 'seen'])
+            pp = extractor.check_perfect(aux, 'en', context=context)
+            self.assertEqual(pp.construction_to_string(), 'has seen')
+            self.assertEqual(pp.mark_sentence(), 'He **has** never **seen**')
+
     def test_pos_extractor(self):
         extractor = DPCPoSExtractor('en', ['nl'], pos=['JJ'])
         results = self.merge_results(extractor.generate_results(os.path.join(DATA_FOLDER)))
@@ -1,12 +1,15 @@
+import csv
 import os
 import shutil
 import unittest
 
 from click.testing import CliRunner
 
+from perfectextractor.apps.extractor.lexicon import LexiconStore
 from perfectextractor.extract import extract
 
 EUROPARL_DATA = os.path.join(os.path.dirname(__file__), 'data/europarl')
+DPC_DATA = os.path.join(os.path.dirname(__file__), 'data/dpc')
 
 
 class TestCLI(unittest.TestCase):
@@ -68,6 +71,64 @@ class TestCLI(unittest.TestCase):
             with open(cmp_file) as cmp:
                 self.assertListEqual(tmp.readlines(), cmp.readlines())
 
+    def test_also(self):
+        os.mkdir(self.folder_out)
+
+        filename = 'fr-nl-recentpast.csv'
+        out_file = os.path.join(self.folder_out, filename)
+        result = self.runner.invoke(extract, [EUROPARL_DATA, 'fr', 'nl',
+                                              '--extractor', 'recent_past',
+                                              '--also', 'perfect',
+                                              '--outfile', out_file])
+        self.assertEqual(result.exit_code, 0)
+
+        cmp_file = os.path.join(self.folder_cmp, filename)
+
+        with open(out_file) as tmp:
+            with open(cmp_file) as cmp:
+                self.assertListEqual(tmp.readlines(), cmp.readlines())
+
+        # The Perfects found in the same pass are the same as those found separately
+        perfect_file = os.path.join(self.folder_out, 'fr-nl-perfect.csv')
+        result = self.runner.invoke(extract, [EUROPARL_DATA, 'fr', 'nl',
+                                              '--extractor', 'perfect',
+                                              '--outfile', perfect_file])
+        self.assertEqual(result.exit_code, 0)
+
+        with open(os.path.join(self.folder_out, 'fr-nl-recentpast-perfect.csv')) as tmp:
+            with open(perfect_file) as cmp:
+                lines = tmp.readlines()
+                self.assertGreater(len(lines), 1)
+                self.assertListEqual(lines, cmp.readlines())
+
+    def test_lexicon(self):
+        # The extraction runs over the subfolders of the given folder
+        shutil.copytree(DPC_DATA, os.path.join(self.folder_out, 'dpc'))
+
+        lexicon_file = os.path.join(self.folder_out, 'lexicon.sqlite')
+        with LexiconStore(lexicon_file) as store:
+            store.import_pairs([('attain', 'bereiken')], 'en', 'nl')
+
+        out_file = os.path.join(self.folder_out, 'en-nl-perfect.csv')
+        result = self.runner.invoke(extract, [self.folder_out, 'en', 'nl',
+                                              '--corpus', 'dpc',
+                                              '--extractor', 'perfect',
+                                              '--search_in_to',
+                                              '--lexicon', lexicon_file,
+                                              '--offline',
+                                              '--outfile', out_file])
+        self.assertEqual(result.exit_code, 0)
+
+        # The translated Perfect is checked against the lexicon
+        with open(out_file, encoding='utf-8') as tmp:
+            rows = list(csv.reader(tmp, delimiter=';'))
+        self.assertEqual(rows[1][3], 'have attained')
+        self.assertEqual(rows[1][6], 'yes')
+
+        result = self.runner.invoke(extract, [self.folder_out, 'en', 'nl', '--corpus', 'dpc', '--extractor', 'perfect',
+                                              '--offline'])
+        self.assertNotEqual(result.exit_code, 0)
+
     def tearDown(self):
         if os.path.isdir(self.folder_out):
             shutil.rmtree(self.folder_out)
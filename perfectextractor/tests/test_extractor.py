@@ -1,10 +1,21 @@
 # -*- coding: utf-8 -*-
 
+import pickle
 import unittest
 
 from lxml import etree
 
-from perfectextractor.apps.extractor.models import Perfect
+from perfectextractor.apps.extractor.batch import BatchDispatcher, BatchQuery
+from perfectextractor.apps.extractor.matcher import RegexMatcher, required_literal
+from perfectextractor.apps.extractor.models import Perfect, SentenceContext, Token
+from perfectextractor.apps.extractor.perfectextractor import PAST
+from perfectextractor.apps.extractor.planner import FilterPlan
+from perfectextractor.apps.extractor.query import Query
+from perfectextractor.apps.extractor.rules import PerfectRules
+from perfectextractor.apps.extractor.tenses import get_pos_tense
+from perfectextractor.apps.extractor.xpath import XPathRegistry
+from perfectextractor.corpora.dpc.base import TEI_URL
+from perfectextractor.corpora.dpc.extractor import DPCExtractor
 from perfectextractor.corpora.opus.perfect import OPUSPerfectExtractor
 
 
@@ -105,3 +116,199 @@ class TestPerfectExtractor(unittest.TestCase):
         self.assertEqual(mock_pp.construction_to_string(), 'sommes')
         self.assertEqual(len(mock_pp.words), 1)
         self.assertFalse(mock_pp.is_reflexive)
+
+    def test_rules(self):
+        de_ex = OPUSPerfectExtractor('de', ['en'], search_in_to=True)
+        rules = de_ex.get_perfect_rules('de')
+        self.assertIsInstance(rules, PerfectRules)
+        self.assertIs(rules, de_ex.get_perfect_rules('de'))
+        self.assertEqual(rules.perfect_tags, frozenset(['VAPP', 'VVPP']))
+        self.assertEqual(rules.stop_tags, ('V', 'KON', 'KOKOM'))
+        self.assertIn('hat', rules.aux_words)
+        self.assertIn('kommen', rules.aux_be)
+        self.assertTrue(rules.allow_reversed)
+        self.assertEqual(rules.pos_attr, 'tree')
+        self.assertEqual(pickle.loads(pickle.dumps(rules)), rules)
+
+        # Empty config values should result in empty sets
+        en_rules = de_ex.get_perfect_rules('en')
+        self.assertEqual(en_rules.aux_words, frozenset())
+        self.assertEqual(en_rules.reflexive_lemmata, frozenset())
+
+        # The auxiliaries depend on the tense
+        de_past_ex = OPUSPerfectExtractor('de', [], tense=PAST)
+        self.assertIn('hatte', de_past_ex.get_perfect_rules('de').aux_words)
+        self.assertNotIn('hat', de_past_ex.get_perfect_rules('de').aux_words)
+
+    def test_prefilter(self):
+        en_ex = OPUSPerfectExtractor('en', [])
+        pos_attr = en_ex.config.get('en', 'pos', fallback=en_ex.config.get('all', 'pos'))
+        lemma_attr = en_ex.config.get('all', 'lemma_attr')
+        s = etree.Element('s')
+        for text, pos in [('I', 'PP'), ('have', 'VHP'), ('often', 'RB'), ('seen', 'VVN'), (',', ','),
+                          ('but', 'CC'), ('has', 'VHZ'), ('he', 'PP'), ('?', 'SENT')]:
+            w = etree.SubElement(s, 'w')
+            w.text = text
+            w.set(pos_attr, pos)
+            w.set(lemma_attr, 'have' if pos.startswith('VH') else text)
+
+        context = en_ex.get_sentence_context(s, 'en')
+        prefilter = en_ex.get_perfect_prefilter('en')
+        # Only the words directly before 'seen' (without a stop in between) could start a Perfect
+        self.assertEqual(prefilter.find_starts(context),
+                         [False, True, True, False, False, False, False, False, False])
+
+        # Both 'have' and 'has' are candidates, but only 'have' passes the prefilter
+        candidates = s.xpath(en_ex.config.get('en', 'xpath'))
+        self.assertEqual(len(candidates), 2)
+        candidates, _ = en_ex.get_perfect_candidates(s, candidates, 'en')
+        self.assertEqual([w.text for w in candidates], ['have'])
+
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        self.sentence = etree.Element('s')
+        self.tokens = [Token('Seit', 'seit', 'APPR', 'w1'), Token('drei', 'drei', 'CARD', 'w2'),
+                       Token('langen', 'lang', 'ADJA', 'w3'), Token('Jahren', 'Jahr', 'NN', 'w4'),
+                       Token('seit', 'seit', 'APPR', 'w5'), Token('Montag', 'Montag', 'NN', 'w6')]
+        words = [etree.SubElement(self.sentence, 'w') for _ in self.tokens]
+        self.context = SentenceContext(self.sentence, [words], lambda w: self.tokens[words.index(w)])
+
+    def test_find(self):
+        self.assertEqual(Query('[lemma="seit"] [pos="CARD"] [lemma="Jahr|Monat"]').find(self.context), [])
+        self.assertEqual(Query('[lemma="seit"] [pos="CARD"] []? [lemma="Jahr|Monat"]').find(self.context), [(0, 4)])
+        self.assertEqual(Query('[lem="seit"] [pos="N.*"]').find(self.context), [(4, 6)])
+        self.assertEqual(Query('"seit"%c [pos!="CARD" & !word="[A-Z].*"]* [pos="NN"]').find(self.context),
+                         [(4, 6)])
+        self.assertEqual(Query('[pos="NN" | (lemma="lang" & id="w3")]+').find(self.context), [(2, 4), (5, 6)])
+        self.assertEqual(Query('[]{2}').find(self.context), [(0, 2), (2, 4), (4, 6)])
+
+    def test_encode(self):
+        query = Query('[pos="APPR"] [pos="CARD"] [pos="APPR"]')
+        self.assertEqual(len(query.predicates), 2)
+        self.assertEqual(query.encode(self.tokens[:3]), query.encode(self.tokens[4:5] + self.tokens[1:3]))
+        self.assertFalse(query.uses_id)
+        self.assertTrue(Query('[id="w1"]').uses_id)
+
+    def test_many_patterns(self):
+        # Any number of distinct token patterns is allowed
+        words = [chr(c) for c in range(ord('a'), ord('n'))]
+        tokens = [Token(w, w, 'NN', 'w{}'.format(i)) for i, w in enumerate(words * 2)]
+        sentence = etree.Element('s')
+        elements = [etree.SubElement(sentence, 'w') for _ in tokens]
+        context = SentenceContext(sentence, [elements], lambda w: tokens[elements.index(w)])
+        query = Query(' '.join('"{}"'.format(w) for w in words))
+        self.assertEqual(len(query.predicates), 13)
+        self.assertEqual(query.find(context), [(0, 13), (13, 26)])
+        self.assertEqual(Query(' '.join('"{}"'.format(w) for w in reversed(words))).find(context), [])
+
+    def test_invalid(self):
+        for query in ['', '[lemma="seit"', '[foo="seit"]', '[lemma "seit"]', '[lemma="("]', '[]{3,2}', 'seit']:
+            with self.assertRaises(ValueError):
+                Query(query)
+
+
+class TestRegexMatcher(unittest.TestCase):
+    def test_required_literal(self):
+        self.assertEqual(required_literal('^wh.*'), 'wh')
+        self.assertEqual(required_literal(r'cal\s?$'), 'cal')
+        self.assertEqual(required_literal('colou?r'), 'colo')
+        self.assertEqual(required_literal('ab{0,2}cde'), 'cde')
+        self.assertEqual(required_literal(r'[a-z]+\.com'), '.com')
+        self.assertIsNone(required_literal('^how|^why'))
+        self.assertIsNone(required_literal('.*'))
+        self.assertIsNone(required_literal(r'\x41b'))
+        self.assertIsNone(required_literal(r'\101b'))
+        self.assertIsNone(required_literal(r'\u0041b'))
+        self.assertIsNone(required_literal(r'\N{LATIN SMALL LETTER A}b'))
+        self.assertIsNone(required_literal(r'(a)bc\1'))
+
+    def test_match(self):
+        matcher = RegexMatcher(['^wh.*', '^how$'])
+        self.assertEqual([matcher.match(v) for v in ['What', 'How', 'however', 'Show', 'nowhere']],
+                         ['^wh.*', '^how$', None, None, None])
+        self.assertEqual(matcher.literals, ['wh', 'how'])
+
+        matcher = RegexMatcher(['^[A-Z]', 'ing$'], flags=0)
+        self.assertIsNone(matcher.literals)
+        self.assertEqual([matcher.match(v) for v in ['Reading', 'reading', 'read']], ['^[A-Z]', 'ing$', None])
+
+        for pattern in [r'\x41b', r'\101b', r'\N{LATIN CAPITAL LETTER A}b']:
+            self.assertEqual(RegexMatcher([pattern]).match('Ab'), pattern)
+
+        # The literals ignore case in the same way as the regular expressions do
+        self.assertEqual(RegexMatcher(['^ı']).match('I'), '^ı')
+        self.assertEqual(RegexMatcher(['^İ']).match('i'), '^İ')
+        self.assertEqual(RegexMatcher(['straße']).match('STRASSE'), None)
+
+
+class TestBatchDispatcher(unittest.TestCase):
+    def test_dispatch(self):
+        dispatcher = BatchDispatcher([BatchQuery('have', lemmata=['have']),
+                                      BatchQuery('vbn', pos=['VBN', 'VVN']),
+                                      BatchQuery('had', lemmata=['have'], pos=['VHD']),
+                                      BatchQuery('ed', regex=['ed$'])])
+        self.assertFalse(dispatcher.is_indexed)
+        self.assertEqual(dispatcher.dispatch('have', 'VHD', 'had'), ['have', 'had'])
+        self.assertEqual(dispatcher.dispatch('see', 'VVN', 'seen'), ['vbn'])
+        self.assertEqual(dispatcher.dispatch('finish', 'VVN', 'finished'), ['vbn', 'ed'])
+        self.assertEqual(dispatcher.dispatch('the', 'DT', 'the'), [])
+
+        self.assertTrue(BatchDispatcher([BatchQuery('have', lemmata=['have'])]).is_indexed)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, BatchQuery, 'empty')
+        self.assertRaises(ValueError, BatchDispatcher, [BatchQuery('a', pos=['NN']), BatchQuery('a', pos=['NNS'])])
+
+
+class TestFilterPlan(unittest.TestCase):
+    def test_filter_sentences(self):
+        sentences = [('end', etree.Element('s', id=str(i))) for i in range(1, 6)]
+        s_trees = iter(sentences)
+        plan = FilterPlan('id', sentence_ids=['4', '2'])
+        self.assertEqual([s.get('id') for _, s in plan.filter_sentences(s_trees)], ['2', '4'])
+        # Parsing stops once all sentences have been found
+        self.assertEqual(next(s_trees)[1].get('id'), '5')
+
+        self.assertEqual(len(list(FilterPlan('id').filter_sentences(sentences))), 5)
+
+    def test_filter_words(self):
+        words = [etree.Element('w', id='w1.{}'.format(i)) for i in range(1, 13)]
+        self.assertEqual([w.get('id') for w in FilterPlan('id', position=1).filter_words(words)], ['w1.1'])
+        self.assertIs(FilterPlan('id').filter_words(words), words)
+        self.assertTrue(FilterPlan('id', position=12).accepts_id('w1.12'))
+        self.assertFalse(FilterPlan('id', position=2).accepts_id('w1.12'))
+
+
+class TestXPathRegistry(unittest.TestCase):
+    def test_compile(self):
+        registry = XPathRegistry()
+        s = etree.fromstring('<s id="s1"><w id="w1.1">A</w><w id="w1.2">test</w></s>')
+        self.assertIs(registry.compile('.//w'), registry.compile('.//w'))
+        self.assertEqual(len(registry.evaluate(s, './/w')), 2)
+        self.assertEqual(registry.evaluate(s, 'string(w[@id=$id])', id='w1.2'), 'test')
+
+    def test_namespaces(self):
+        extractor = DPCExtractor('en', [])
+        s = etree.fromstring('<s xmlns="{}"><w>A</w><w>test</w></s>'.format(TEI_URL))
+        self.assertEqual(len(extractor.xpath(s, './/ns:w')), 2)
+        self.assertIs(extractor.xpaths.compile('.//ns:w'), extractor.xpaths.compile('.//ns:w'))
+
+
+class TestTenses(unittest.TestCase):
+    def test_get_pos_tense(self):
+        self.assertEqual(get_pos_tense('VBZ'), 'present')
+        self.assertEqual(get_pos_tense('VVD'), 'past')
+        self.assertEqual(get_pos_tense('VM0'), 'modal')
+        self.assertEqual(get_pos_tense('VB'), 'infinitive')
+        self.assertIsNone(get_pos_tense('NN'))
+
+    def test_get_tenses(self):
+        extractor = OPUSPerfectExtractor('en', [])
+        s = etree.fromstring('<s id="1"><w tree="PP">He</w><w tree="VBZ">has</w><w tree="VBN">been</w>'
+                             '<w tree="VBG">waiting</w><w>.</w></s>')
+        self.assertEqual(extractor.get_tenses(s), ('other', ['present', 'participle', 'gerund']))
+
+        s = etree.fromstring('<s id="2"><w tree="PP">He</w><w tree="VBD">was</w><w tree="VBG">waiting</w></s>')
+        self.assertEqual(extractor.get_tenses(s), ('past', ['past', 'gerund']))
+        self.assertEqual(extractor.get_tenses(etree.fromstring('<s id="3"><w tree="UH">Yes</w></s>')), ('none', []))
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from perfectextractor.apps.extractor.lexicon import CachedLexicon, Lexicon, LexiconStore
+
+
+class CountingLexicon(Lexicon):
+    def __init__(self, translations):
+        self.translations = translations
+        self.lookups = []
+
+    def get_translations(self, word, language_from, language_to):
+        self.lookups.append(word)
+        return frozenset(self.translations.get(word, []))
+
+
+class TestLexicon(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.store_file = os.path.join(self.folder, 'lexicon.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_import_dictionary(self):
+        dictionary = os.path.join(self.folder, 'nl-en.tsv')
+        with open(dictionary, 'w', encoding='utf-8') as f:
+            f.write('# aantonen\naantonen\tprove\naantonen\tdemonstrate\n\nblijken\tprove\n')
+
+        with LexiconStore(self.store_file) as store:
+            store.import_dictionary(dictionary, 'nl', 'en')
+            self.assertEqual(store.get_translations('aantonen', 'nl', 'en'), {'prove', 'demonstrate'})
+            self.assertEqual(store.get_translations('aantonen', 'nl', 'fr'), frozenset())
+            self.assertEqual(store.get_translations('arriveren', 'nl', 'en'), frozenset())
+
+            with open(dictionary, 'w', encoding='utf-8') as f:
+                f.write('aantonen prove\n')
+            self.assertRaises(ValueError, store.import_dictionary, dictionary, 'nl', 'en')
+
+    def test_fallback(self):
+        fallback = CountingLexicon({'aantonen': ['prove']})
+        with LexiconStore(self.store_file, fallback=fallback) as store:
+            store.prefetch(['aantonen', 'arriveren', 'aantonen'], 'nl', 'en')
+            self.assertEqual(sorted(fallback.lookups), ['aantonen', 'arriveren'])
+
+            # Words (also without translations) are looked up once
+            self.assertEqual(store.get_translations('aantonen', 'nl', 'en'), {'prove'})
+            self.assertEqual(store.get_translations('arriveren', 'nl', 'en'), frozenset())
+            self.assertEqual(len(fallback.lookups), 2)
+
+        # ... and persist in the store
+        with LexiconStore(self.store_file) as store:
+            self.assertEqual(store.get_translations('aantonen', 'nl', 'en'), {'prove'})
+
+    def test_cached(self):
+        lexicon = CountingLexicon({'aantonen': ['prove']})
+        cached = CachedLexicon(lexicon)
+        self.assertEqual(cached.get_translations('aantonen', 'nl', 'en'), {'prove'})
+        self.assertEqual(cached.get_translations('aantonen', 'nl', 'en'), {'prove'})
+        self.assertEqual(lexicon.lookups, ['aantonen'])
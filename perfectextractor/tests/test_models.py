@@ -2,7 +2,7 @@ import unittest
 
 from lxml import etree
 
-from perfectextractor.apps.extractor.models import Perfect
+from perfectextractor.apps.extractor.models import Alignment, Alignments, Perfect, SentenceContext, Token
 
 XML_ID = 'test_id'
 
@@ -35,3 +35,92 @@ class TestPerfect(unittest.TestCase):
         self.assertEqual(ppp.construction(), ['has', 'been', 'created'])
         self.assertEqual(ppp.construction_to_string(), 'has been created')
         self.assertEqual(ppp.words_between(), 0)
+
+
+class TestAlignments(unittest.TestCase):
+    def setUp(self):
+        self.alignments = Alignments([Alignment(['1'], ['1', '2']),
+                                      Alignment([''], ['3']),
+                                      Alignment(['2', '3'], ['4']),
+                                      Alignment(['3'], ['5'])])
+
+    def test_find(self):
+        self.assertEqual(len(self.alignments), 4)
+        self.assertEqual(self.alignments.find('1').targets, ['1', '2'])
+        self.assertEqual(self.alignments.find('2', reverse=True).sources, ['1'])
+        self.assertEqual(self.alignments.find('3').targets, ['4'])  # the first Alignment is kept
+        self.assertEqual(self.alignments.find('3', reverse=True).sources, [''])
+        self.assertIsNone(self.alignments.find('4'))
+
+
+class TestSentenceContext(unittest.TestCase):
+    def test_siblings(self):
+        s = etree.fromstring('<s><w>I</w><mw><w>have</w><w>to</w></mw><w>go</w><w>now</w></s>')
+        w_i, w_have, w_to, w_go, w_now = s.iter('w')
+        context = SentenceContext(s, [[w_i, w_go, w_now], [w_have, w_to]])
+
+        self.assertEqual(len(context), 5)
+        self.assertIs(context.sentence, s)
+        self.assertEqual(context.siblings(w_go), [w_now])
+        self.assertEqual(context.siblings(w_go, preceding=True), [w_i])
+        self.assertEqual(context.siblings(w_now, preceding=True), [w_go, w_i])
+        self.assertEqual(context.siblings(w_i, preceding=True), [])
+        self.assertEqual(context.siblings(w_have), [w_to])
+        self.assertEqual(context.siblings(w_to), [])
+        self.assertEqual(context.siblings(w_to, preceding=True), [w_have])
+
+    def test_columns(self):
+        s = etree.fromstring('<s><w lem="I" pos="PP">I</w><w lem="have" pos="VHP">have</w> '
+                             '<w lem="be" pos="VBN">been</w></s>')
+        words = list(s.iter('w'))
+        context = SentenceContext(s, [words], lambda w: Token(w.text, w.get('lem'), w.get('pos'), '?'))
+
+        self.assertEqual(context.texts, ['I', 'have', 'been'])
+        self.assertEqual(context.lemmata, ['I', 'have', 'be'])
+        self.assertEqual(context.pos_tags, ['PP', 'VHP', 'VBN'])
+        self.assertEqual(context.token(2), Token('been', 'be', 'VBN', '?'))
+        self.assertEqual(list(context.following(0)), [1, 2])
+        self.assertEqual(list(context.preceding(2)), [1, 0])
+
+        # The sentence words are rendered once, and shared by the MultiWordExpressions in the sentence
+        pp = Perfect(s, context)
+        pp.add_word(*context.token(1))
+        pp.add_word(*context.token(2))
+        self.assertEqual(pp.mark_sentence(), 'I **have been**')
+        self.assertIs(context.get_sentence_words(), context.get_sentence_words())
+        with self.assertRaises(AttributeError):
+            pp.words[0].unknown = True
+
+    def test_mark_sentence(self):
+        s = etree.fromstring('<s><w pos="PP">We</w><w pos="VHP">have</w><w pos="VVN">tried</w><w pos="CC">and</w>'
+                             '<w pos="PP">I</w><w pos="VHP">have</w><w pos="RB">also</w><w pos="VVN">tried</w></s>')
+        words = list(s.iter('w'))
+        context = SentenceContext(s, [words], lambda w: Token(w.text, w.text, w.get('pos'), '?'))
+
+        # Only the occurrence at the positions of the words is marked
+        pp = Perfect(s, context)
+        pp.add_token(1)
+        pp.add_token(2)
+        self.assertEqual(pp.mark_sentence(), 'We **have tried** and I have also tried')
+        self.assertEqual(pp.construction_offsets(), [(3, 7), (8, 13)])
+
+        pp = Perfect(s, context)
+        pp.add_token(5)
+        pp.add_token(6, in_construction=False)
+        pp.add_token(7)
+        self.assertEqual(pp.mark_sentence(), 'We have tried and I **have** also **tried**')
+        self.assertEqual(pp.construction_offsets(), [(20, 24), (30, 35)])
+
+    def test_mark_sentence_order(self):
+        # Tokens in groups that are not in the order of the sentence, and a Perfect found in reverse order
+        s = etree.fromstring('<s><w>dat</w><mw><w>hij</w><w>gewoond</w></mw><w>heeft</w></s>')
+        w_dat, w_hij, w_gewoond, w_heeft = s.iter('w')
+        context = SentenceContext(s, [[w_dat, w_heeft], [w_hij, w_gewoond]],
+                                  lambda w: Token(w.text, w.text, '?', '?'))
+        self.assertEqual(context.get_sentence_words(), 'dat hij gewoond heeft')
+
+        pp = Perfect(s, context)
+        pp.add_token(context.positions[w_heeft])
+        pp.add_token(context.positions[w_gewoond])
+        self.assertEqual(pp.mark_sentence(), 'dat hij **gewoond heeft**')
+        self.assertEqual(pp.construction_offsets(), [(8, 15), (16, 21)])
@@ -1,15 +1,23 @@
 # -*- coding: utf-8 -*-
 
 import os
+import shutil
+import tempfile
 import unittest
 
 from lxml import etree
 
-from perfectextractor.apps.extractor.perfectextractor import PAST
+from perfectextractor.apps.extractor.base import RENDER_TEXT, RENDER_XML
+from perfectextractor.apps.extractor.batch import read_queries
+from perfectextractor.apps.extractor.models import Alignments
+from perfectextractor.apps.extractor.perfectextractor import ALL_TENSES, PAST, PRESENT
+from perfectextractor.apps.extractor.utils import AUTOMATON, XPATH
 from perfectextractor.corpora.opus.article import OPUSFrenchArticleExtractor
 from perfectextractor.corpora.opus.extractor import OPUSExtractor
+from perfectextractor.corpora.opus.index import AlignmentIndex, IndexedAlignments, build_index, get_index_file
 from perfectextractor.corpora.opus.perfect import OPUSPerfectExtractor
 from perfectextractor.corpora.opus.pos import OPUSPoSExtractor
+from perfectextractor.corpora.opus.query import OPUSQueryExtractor
 from perfectextractor.corpora.opus.recentpast import OPUSRecentPastExtractor
 from perfectextractor.corpora.opus.since import OPUSSinceDurationExtractor
 from perfectextractor.corpora.opus.continuous import OPUSContinuousExtractor
@@ -122,6 +130,39 @@ class TestEuroparlPerfectExtractor(unittest.TestCase):
         self.assertFalse(pp.is_passive)
         self.assertFalse(pp.is_continuous)
 
+    def test_get_translated_line_and_pp(self):
+        en_tree = self.nl_translationtrees['en']
+        line = self.nl_extractor.get_translated_line_and_pp(en_tree, 'en', '6')
+        self.assertEqual(line[:2], self.nl_extractor.get_line_and_pp(en_tree, 'en', '6')[:2])
+        self.assertEqual(line[2].construction(), ['has', 'said'])
+
+        # The translated segment is only checked once, and freed after the file
+        self.assertIs(self.nl_extractor.get_translated_line_and_pp(en_tree, 'en', '6'), line)
+        self.nl_extractor.free_memory()
+        self.assertIsNot(self.nl_extractor.get_translated_line_and_pp(en_tree, 'en', '6'), line)
+
+    def test_render(self):
+        s = self.nl_extractor.get_line_as_xml(self.nl_tree, '17')
+        translations = self.nl_extractor.generate_translations(self.nl_alignmenttrees, self.nl_translationtrees, s)
+        self.assertEqual(translations,
+                         self.nl_extractor.render_translations(self.nl_alignmenttrees, self.nl_translationtrees, s))
+        self.assertEqual(translations[0], '1 => 1')
+
+        # A sentence is rendered once per kind and language, until the memory is freed
+        rendered = []
+
+        def render():
+            rendered.append(s)
+            return 'sentence'
+
+        self.assertEqual(self.nl_extractor.render(RENDER_TEXT, 'nl', s, render), 'sentence')
+        self.assertEqual(self.nl_extractor.render(RENDER_TEXT, 'nl', s, render), 'sentence')
+        self.assertEqual(len(rendered), 1)
+        self.nl_extractor.render(RENDER_XML, 'nl', s, render)
+        self.nl_extractor.free_memory()
+        self.nl_extractor.render(RENDER_TEXT, 'nl', s, render)
+        self.assertEqual(len(rendered), 3)
+
     def test_list_filenames(self):
         files = self.nl_extractor.list_filenames(os.path.join(EUROPARL_DATA, 'nl'))
         self.assertEqual([os.path.basename(f) for f in files], ['ep-00-12-15.xml'])
@@ -137,11 +178,45 @@ class TestEuroparlPerfectExtractor(unittest.TestCase):
         self.assertEqual(results[2][3], u'viens d\' évoquer')
         self.assertEqual(results[3][3], u'vient d\' être dit')
 
+    def test_automaton(self):
+        for language, filename in [('nl', self.nl_filename), ('en', self.en_filename), ('fr', self.fr_filename)]:
+            results = self.merge_results(OPUSPerfectExtractor(language, ['en']).generate_results(
+                None, [filename]))
+            automaton_results = self.merge_results(OPUSPerfectExtractor(language, ['en'], engine=AUTOMATON)
+                                                   .generate_results(None, [filename]))
+            self.assertTrue(results)
+            self.assertEqual(results, automaton_results)
+
+        results = list(OPUSContinuousExtractor('en', ['nl']).process_file(self.en_filename))
+        automaton_results = list(OPUSContinuousExtractor('en', ['nl'], engine=AUTOMATON).process_file(self.en_filename))
+        self.assertTrue(results)
+        self.assertEqual(results, automaton_results)
+
+    def test_xpath(self):
+        for language, filename in [('nl', self.nl_filename), ('en', self.en_filename), ('fr', self.fr_filename)]:
+            extractor = OPUSPerfectExtractor(language, ['en'], engine=XPATH)
+            self.assertIsNotNone(extractor.get_perfect_xpath(language))
+
+            results = self.merge_results(OPUSPerfectExtractor(language, ['en']).generate_results(
+                None, [filename]))
+            xpath_results = self.merge_results(extractor.generate_results(None, [filename]))
+            self.assertTrue(results)
+            self.assertEqual(results, xpath_results)
+
     def test_position(self):
         when_extractor = OPUSPoSExtractor('en', ['nl'], lemmata=['when'], position=1)
         results = self.merge_results(when_extractor.generate_results(os.path.join(EUROPARL_DATA, 'en')))
         self.assertEqual(len(results), 3)
 
+    def test_filter_sets(self):
+        # The number of lemmata should not influence the results
+        lemmata = ['when'] + ['lemma{}'.format(i) for i in range(10000)]
+        when_extractor = OPUSPoSExtractor('en', ['nl'], lemmata=lemmata, pos=['WRB'], position=1)
+        xpath, ns = when_extractor.prepare_xpath()
+        self.assertNotIn('lemma1', xpath)
+        results = self.merge_results(when_extractor.generate_results(os.path.join(EUROPARL_DATA, 'en')))
+        self.assertEqual(len(results), 3)
+
     def test_average_alignment_certainty(self):
         extractor = OPUSExtractor('en', ['nl', 'de'])
 
@@ -192,6 +267,8 @@ class TestEuroparlPerfectExtractor(unittest.TestCase):
         self.assertEqual(results[1][3], u'How')
         self.assertEqual(results[2][3], u'What')
         self.assertEqual(results[3][3], u'When')
+        self.assertEqual(results[0][6], u'^how$')
+        self.assertEqual(results[2][6], u'^wh.*')
 
     def test_regex_and_pos(self):
         # Primitive search for wh-questions
@@ -204,6 +281,42 @@ class TestEuroparlPerfectExtractor(unittest.TestCase):
         self.assertEqual(results[2][3], u'What')
         self.assertEqual(results[3][3], u'What')
 
+    def test_regex_target(self):
+        lemma_extractor = OPUSPoSExtractor('en', ['nl'], regex=['^be$'], regex_target='lemma')
+        results = self.merge_results(lemma_extractor.generate_results(os.path.join(EUROPARL_DATA, 'en')))
+        lemmata_extractor = OPUSPoSExtractor('en', ['nl'], lemmata=['be'])
+        self.assertEqual(len(results),
+                         len(self.merge_results(lemmata_extractor.generate_results(os.path.join(EUROPARL_DATA, 'en')))))
+        self.assertEqual(results[0][6], u'^be$')
+
+        pos_extractor = OPUSPoSExtractor('en', ['nl'], regex=['^W'], regex_target='pos', position=1)
+        results = self.merge_results(pos_extractor.generate_results(os.path.join(EUROPARL_DATA, 'en')))
+        self.assertTrue(results)
+        self.assertTrue(all(result[2].startswith('W') for result in results))
+
+    def test_batch(self):
+        batch_file = os.path.join(tempfile.mkdtemp(), 'queries.cfg')
+        with open(batch_file, 'w') as f:
+            f.write('[be]\nlemmata: be\n\n[modal]\npos: MD\n\n[wh]\nregex:\n  ^wh.*\n  ^how$\n')
+        queries = read_queries(batch_file)
+        shutil.rmtree(os.path.dirname(batch_file))
+        self.assertEqual([q.query_id for q in queries], ['be', 'modal', 'wh'])
+
+        batch_extractor = OPUSPoSExtractor('en', ['nl'], queries=queries)
+        self.assertEqual(batch_extractor.generate_header()[6], 'query')
+        results = self.merge_results(batch_extractor.generate_results(os.path.join(EUROPARL_DATA, 'en')))
+
+        # Every query gives the same results as a separate run, tagged with the query id
+        for query_id, kwargs in [('be', dict(lemmata=['be'])), ('modal', dict(pos=['MD'])),
+                                 ('wh', dict(regex=['^wh.*', '^how$']))]:
+            extractor = OPUSPoSExtractor('en', ['nl'], **kwargs)
+            expected = self.merge_results(extractor.generate_results(os.path.join(EUROPARL_DATA, 'en')))
+            if 'regex' in kwargs:
+                expected = [r[:6] + r[7:] for r in expected]
+            found = [r[:6] + r[7:] for r in results if r[6] == query_id]
+            self.assertTrue(found)
+            self.assertEqual(found, expected)
+
     def test_tokens(self):
         tokens_extractor = OPUSPoSExtractor('en', ['nl'], tokens=[('w1.13', 'w1.15'), ('w2.5', 'w2.8')])
         results = self.merge_results(tokens_extractor.generate_results(os.path.join(EUROPARL_DATA, 'en')))
@@ -231,6 +344,43 @@ class TestEuroparlPerfectExtractor(unittest.TestCase):
         self.assertEqual(results[0][2], u'prep')
         self.assertEqual(results[0][3], u'sinds tien jaar')
 
+    def test_query(self):
+        query = '[lemma="sinds"] [pos="num__card"] [lemma="minuut|uur|dag|week|maand|jaar|decennium|eeuw|millenium"]'
+        query_extractor = OPUSQueryExtractor('nl', [], query=query)
+        results = self.merge_results(query_extractor.generate_results(os.path.join(EUROPARL_DATA, 'nl')))
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0][2], u'prep')
+        self.assertEqual(results[0][3], u'sinds tien jaar')
+
+        # Quantifiers: an auxiliary, optionally followed by a non-verb, then a past participle
+        query_extractor = OPUSQueryExtractor('en', [], query='[lemma="have"] [pos!="V.*"]? [pos="VVN"]')
+        results = self.merge_results(query_extractor.generate_results(None, [self.en_filename]))
+        self.assertTrue(results)
+        self.assertTrue(all(len(r[3].split()) in (2, 3) for r in results))
+
+        with self.assertRaises(ValueError):
+            OPUSQueryExtractor('en', [], query='[lemma="have"')
+
+    def test_add_extractor(self):
+        perfect_extractor = OPUSPerfectExtractor('en', ['nl'])
+        continuous_extractor = OPUSContinuousExtractor('en', ['nl'])
+        pos_extractor = OPUSPoSExtractor('en', ['nl'], pos=['WP'], sentence_ids=['2', '3'])
+        perfect_extractor.add_extractor(continuous_extractor, 'continuous')
+        perfect_extractor.add_extractor(pos_extractor, 'pos')
+
+        parts = list(perfect_extractor.generate_all_results(os.path.join(EUROPARL_DATA, 'en')))
+        for i, extractor in enumerate([OPUSPerfectExtractor('en', ['nl']),
+                                       OPUSContinuousExtractor('en', ['nl']),
+                                       OPUSPoSExtractor('en', ['nl'], pos=['WP'], sentence_ids=['2', '3'])]):
+            results = self.merge_results(extractor.generate_results(os.path.join(EUROPARL_DATA, 'en')))
+            self.assertEqual(sum([part[i] for part in parts], []), results)
+
+        self.assertEqual(perfect_extractor.get_result_file('europarl'), 'europarl-en.csv')
+        self.assertEqual(pos_extractor.get_result_file('europarl', 'pos'), 'europarl-en-pos.csv')
+
+        self.assertRaises(ValueError, perfect_extractor.add_extractor, OPUSPoSExtractor('en', ['fr']), 'other')
+        self.assertRaises(ValueError, perfect_extractor.add_extractor, OPUSPoSExtractor('en', ['nl']), 'pos')
+
     def test_articles(self):
         article_extractor = OPUSFrenchArticleExtractor('fr', [])
         results = self.merge_results(article_extractor.generate_results(os.path.join(EUROPARL_DATA, 'fr')))
@@ -276,6 +426,36 @@ class TestEuroparlPerfectExtractor(unittest.TestCase):
         self.assertEqual(len(results), 7)
         self.assertEqual(results[0][3], u'hade kunnat')
 
+    def test_all_tenses(self):
+        for language, data in [('en', EUROPARL_DATA), ('fr', EUROPARL_DATA), ('de', DCEP_DATA)]:
+            extractor = OPUSPerfectExtractor(language, [], tense=ALL_TENSES)
+            self.assertEqual(extractor.generate_header()[3], 'perfect tense')
+            results = self.merge_results(extractor.generate_results(os.path.join(data, language)))
+
+            # The results are those of the present and past perfects, with their tense in a separate column
+            for tense in [PRESENT, PAST]:
+                tense_extractor = OPUSPerfectExtractor(language, [], tense=tense)
+                expected = self.merge_results(tense_extractor.generate_results(os.path.join(data, language)))
+                self.assertEqual([r[:3] + r[4:] for r in results if r[3] == tense], expected)
+            self.assertEqual(set(r[3] for r in results), {PRESENT, PAST})
+
+    def test_offsets(self):
+        extractor = OPUSPerfectExtractor('en', ['nl'], offsets=True)
+        self.assertEqual(extractor.generate_header()[6], 'offsets en')
+        results = self.merge_results(extractor.generate_results(os.path.join(EUROPARL_DATA, 'en')))
+        marked = self.merge_results(OPUSPerfectExtractor('en', ['nl']).generate_results(os.path.join(EUROPARL_DATA, 'en')))
+        self.assertEqual(len(results), len(marked))
+
+        # The sentence is not marked, but the offsets give the words that are marked otherwise
+        for result, expected in zip(results, marked):
+            sentence, offsets = result[5], result[6]
+            words = [sentence[int(start):int(end)] for start, end in (o.split('-') for o in offsets.split())]
+            self.assertEqual(words, result[3].split())
+            self.assertEqual(result[:5] + result[7:], expected[:5] + expected[6:])
+            self.assertEqual(sentence, expected[5].replace('**', ''))
+
+        self.assertRaises(ValueError, OPUSPerfectExtractor, 'en', ['nl'], offsets=True, output='xml')
+
     def test_languages(self):
         sv_extractor = OPUSPerfectExtractor('sv', [])
         results = self.merge_results(sv_extractor.generate_results(os.path.join(EUROPARL_DATA, 'sv')))
@@ -286,3 +466,56 @@ class TestEuroparlPerfectExtractor(unittest.TestCase):
         self.assertRaises(Exception, OPUSPerfectExtractor, 'it', [])
         OPUSPerfectExtractor('en', ['it'])  # should not raise a ValueError
         self.assertRaises(Exception, OPUSPerfectExtractor, 'en', ['it'], {'search_in_to': True})
+
+
+class TestAlignmentIndex(unittest.TestCase):
+    def setUp(self):
+        self.data_folder = os.path.join(tempfile.mkdtemp(), 'europarl')
+        shutil.copytree(EUROPARL_DATA, self.data_folder)
+        self.index_file = build_index(os.path.join(self.data_folder, 'en-nl.xml'))
+
+    def merge_results(self, generator):
+        return sum(list(generator), [])
+
+    def test_build_index(self):
+        self.assertEqual(self.index_file, get_index_file(os.path.join(self.data_folder, 'en-nl.xml')))
+
+        index = AlignmentIndex(self.index_file)
+        documents = index.find_documents(['en/ep-00-12-15.xml', 'en/ep-00-12-15.xml.gz'])
+        self.assertEqual(len(documents), 1)
+        self.assertEqual(documents[0].to_doc, 'nl/ep-00-12-15.xml.gz')
+        self.assertEqual(documents[0].find('8').targets, ['13', '14'])
+        self.assertEqual(documents[0].find('290', reverse=True).sources, ['234', '235'])
+        self.assertEqual(documents[0].find('9', reverse=True).sources, [''])
+        self.assertIsNone(documents[0].find('unknown'))
+
+    def test_get_translated_lines(self):
+        for language_from, language_to in [('en', 'nl'), ('nl', 'en')]:
+            filename = os.path.join(self.data_folder, language_from, 'ep-00-12-15.xml')
+            indexed_extractor = OPUSExtractor(language_from, [language_to])
+            indexed_trees, _ = indexed_extractor.parse_alignment_trees(filename)
+            self.assertIsInstance(indexed_trees[language_to], IndexedAlignments)
+
+            os.rename(self.index_file, self.index_file + '.bak')
+            xml_extractor = OPUSExtractor(language_from, [language_to])
+            xml_trees, _ = xml_extractor.parse_alignment_trees(filename)
+            os.rename(self.index_file + '.bak', self.index_file)
+            self.assertIsInstance(xml_trees[language_to], Alignments)
+
+            for segment_number in ['8', '9', '17', '18', '57', '234', '290']:
+                self.assertEqual(
+                    indexed_extractor.get_translated_lines(indexed_trees, language_from, language_to, segment_number),
+                    xml_extractor.get_translated_lines(xml_trees, language_from, language_to, segment_number))
+
+    def test_extraction(self):
+        extractor = OPUSPerfectExtractor('en', ['nl'])
+        indexed_results = self.merge_results(extractor.generate_results(os.path.join(self.data_folder, 'en')))
+
+        os.remove(self.index_file)
+        extractor = OPUSPerfectExtractor('en', ['nl'])
+        xml_results = self.merge_results(extractor.generate_results(os.path.join(self.data_folder, 'en')))
+
+        self.assertEqual(indexed_results, xml_results)
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.data_folder))